@@ -4,15 +4,29 @@ let currentLogId = null
 let currentQuestId = null
 let templates = []
 let saveTimeout = null
+let pendingOps = [] // Patch operations for the current log that have not been saved yet
+const responseCache = new Map() // URL -> { etag, data } for conditional GETs
+let logsCursor = null // Cursor for the next page of quest logs, null when all are loaded
+let loadingMoreLogs = false
+let logsObserver = null
+const LOG_LIST_FIELDS = "name,questCount,objectiveCount,completedCount,completedQuestCount,updated"
+let questFilter = null // Ids of the quests matching the quest search, null when not searching
+let searchTimeout = null
+let changeFeed = null
+// Sent with every change so this page can recognize its own events on the change feed
+const CLIENT_ID = Math.random().toString(36).slice(2) + Date.now().toString(36)
 
 // API endpoints
 const API = {
   SAVE_LOG: "/api/save",
+  PATCH_LOG: "/api/patch/",
   LOAD_LOGS: "/api/logs",
   LOAD_LOG: "/api/log/",
   DELETE_LOG: "/api/delete/",
   TEMPLATES: "/api/templates",
   IMPORT_TEMPLATE: "/api/import-template/",
+  SEARCH: "/api/search",
+  CHANGES: "/api/changes",
 }
 
 // Initialize the application
@@ -24,6 +38,9 @@ async function init() {
   // Set up event listeners
   setupEventListeners()
 
+  // Follow changes made in other tabs and by other users
+  connectChangeFeed()
+
   // Load quest logs
   await loadQuestLogs()
 
@@ -77,6 +94,10 @@ function setupEventListeners() {
   document.getElementById("add-quest-btn").addEventListener("click", showAddQuestForm)
   document.getElementById("delete-log-btn").addEventListener("click", deleteCurrentQuestLog)
   document.getElementById("export-log-btn").addEventListener("click", exportCurrentLog)
+  document.getElementById("search-quests").addEventListener("input", () => {
+    clearTimeout(searchTimeout)
+    searchTimeout = setTimeout(searchQuests, 200)
+  })
 
   // Add Quest Form
   document.getElementById("add-objective-btn").addEventListener("click", addObjectiveInput)
@@ -148,13 +169,36 @@ function updateDate() {
 }
 
 // API Functions
+async function fetchJson(url) {
+  // Revalidate against the cached copy so unchanged responses come back as 304 without a body
+  const cached = responseCache.get(url)
+  const response = await fetch(url, {
+    headers: cached ? { "If-None-Match": cached.etag } : {},
+    cache: "no-store",
+  })
+
+  if (response.status === 304 && cached) return structuredClone(cached.data)
+  if (!response.ok) throw new Error(`Request to ${url} failed with status ${response.status}`)
+
+  const data = await response.json()
+  const etag = response.headers.get("ETag")
+  if (etag) {
+    responseCache.set(url, { etag, data: structuredClone(data) })
+  }
+  return data
+}
+
+function questLogsPageUrl(cursor) {
+  const params = new URLSearchParams({ sort: "updated", order: "desc", fields: LOG_LIST_FIELDS })
+  if (cursor) params.set("cursor", cursor)
+  return `${API.LOAD_LOGS}?${params}`
+}
+
 async function loadQuestLogs() {
   try {
-    const response = await fetch(API.LOAD_LOGS)
-    if (!response.ok) throw new Error("Failed to load quest logs")
-
-    const data = await response.json()
+    const data = await fetchJson(questLogsPageUrl(null))
     questLogs = data.logs
+    logsCursor = data.nextCursor
     renderQuestLogs()
   } catch (error) {
     console.error("Error loading quest logs:", error)
@@ -165,16 +209,32 @@ async function loadQuestLogs() {
     if (savedData) {
       questLogs = JSON.parse(savedData)
     }
+    logsCursor = null
     renderQuestLogs()
   }
 }
 
-async function loadQuestLog(logId) {
+async function loadMoreQuestLogs() {
+  if (!logsCursor || loadingMoreLogs) return
+
+  loadingMoreLogs = true
   try {
-    const response = await fetch(API.LOAD_LOG + logId)
-    if (!response.ok) throw new Error("Failed to load quest log")
+    const data = await fetchJson(questLogsPageUrl(logsCursor))
+    const known = new Set(questLogs.map((log) => log.id))
+    questLogs.push(...data.logs.filter((log) => !known.has(log.id)))
+    logsCursor = data.nextCursor
+    renderQuestLogs()
+  } catch (error) {
+    console.error("Error loading more quest logs:", error)
+    showNotification("Failed to load more quest logs", "error")
+  } finally {
+    loadingMoreLogs = false
+  }
+}
 
-    const data = await response.json()
+async function loadQuestLog(logId) {
+  try {
+    const data = await fetchJson(API.LOAD_LOG + logId)
 
     // Update the quest log in the questLogs array
     const index = questLogs.findIndex((log) => log.id === logId)
@@ -202,12 +262,16 @@ async function saveQuestLog(log) {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "X-Client-Id": CLIENT_ID,
       },
       body: JSON.stringify({ log }),
     })
 
     if (!response.ok) throw new Error("Failed to save quest log")
 
+    const data = await response.json()
+    log.revision = data.revision
+
     updateSaveStatus("All changes saved")
 
     // Also update localStorage as backup
@@ -225,10 +289,162 @@ async function saveQuestLog(log) {
   }
 }
 
+async function patchQuestLog(log, ops) {
+  updateSaveStatus("Saving...")
+
+  try {
+    const response = await fetch(API.PATCH_LOG + log.id, {
+      method: "PATCH",
+      headers: {
+        "Content-Type": "application/json",
+        "X-Client-Id": CLIENT_ID,
+      },
+      body: JSON.stringify({ baseRevision: log.revision, ops, updated: log.updated }),
+      keepalive: true,
+    })
+
+    if (!response.ok) throw new Error("Failed to patch quest log")
+
+    const data = await response.json()
+    log.revision = data.revision
+
+    updateSaveStatus("All changes saved")
+
+    // Also update localStorage as backup
+    localStorage.setItem("questLogs", JSON.stringify(questLogs))
+
+    return true
+  } catch (error) {
+    // The server copy diverged or the patch failed; fall back to saving the whole log
+    console.warn("Patch failed, saving the full quest log instead:", error)
+    return saveQuestLog(log)
+  }
+}
+
+function connectChangeFeed() {
+  if (!window.EventSource) return
+
+  // EventSource reconnects by itself and resumes after the last event it received
+  changeFeed = new EventSource(API.CHANGES)
+  changeFeed.addEventListener("change", (event) => {
+    applyChange(JSON.parse(event.data)).catch((error) => console.error("Error applying change:", error))
+  })
+  changeFeed.addEventListener("reset", async () => {
+    // Events were missed (e.g. the server restarted), so reload what is on screen
+    await loadQuestLogs()
+    if (currentLogId) {
+      await loadQuestLog(currentLogId)
+      refreshCurrentLogView()
+    }
+  })
+}
+
+async function applyChange(change) {
+  if (change.client === CLIENT_ID) return
+
+  const index = questLogs.findIndex((log) => log.id === change.logId)
+  const local = index === -1 ? null : questLogs[index]
+
+  if (change.type === "delete") {
+    if (index !== -1) questLogs.splice(index, 1)
+    if (change.logId === currentLogId) {
+      pendingOps = []
+      showNotification("This quest log was deleted elsewhere", "info")
+      await backToLogs()
+    } else if (!currentLogId) {
+      renderQuestLogs()
+    }
+    return
+  }
+
+  if (local && (local.revision ?? 0) >= change.revision) return
+
+  if (change.logId === currentLogId && local && local.quests) {
+    // Apply small patches in place; anything else is fetched again
+    const applied =
+      change.ops && change.revision === local.revision + 1 && pendingOps.length === 0 && applyLogOps(local, change.ops, change.summary.updated)
+    if (applied) {
+      local.revision = change.revision
+      local.updated = change.summary.updated
+    } else {
+      const fresh = await loadQuestLog(change.logId)
+      if (fresh !== local) keepPendingOps(fresh, local.updated)
+    }
+    refreshCurrentLogView()
+    return
+  }
+
+  if (local) {
+    Object.assign(local, change.summary)
+  } else {
+    questLogs.unshift(change.summary)
+  }
+  if (!currentLogId) renderQuestLogs()
+}
+
+function keepPendingOps(fresh, edited) {
+  // Edits not sent yet would vanish with the reloaded copy but still be sent against it,
+  // so apply them to the fresh copy too; if they no longer fit, drop them
+  if (pendingOps.length === 0) return
+  const merged = structuredClone(fresh)
+  if (applyLogOps(merged, pendingOps, edited)) {
+    merged.updated = edited
+    const index = questLogs.indexOf(fresh)
+    if (index !== -1) questLogs[index] = merged
+  } else {
+    pendingOps = []
+    showNotification("Your unsaved changes conflicted with changes made elsewhere", "info")
+  }
+}
+
+function applyLogOps(log, ops, now) {
+  // Mirrors apply_log_ops in server.py; returns false if the log does not match the ops
+  for (const op of ops) {
+    const quest = log.quests.find((q) => q.id === op.questId)
+    if (op.op === "toggleObjective") {
+      const objective = quest && quest.objectives.find((obj) => obj.id === op.objectiveId)
+      if (!objective) return false
+      objective.completed = Boolean(op.completed)
+      if (objective.completed) objective.completedAt = now
+      else delete objective.completedAt
+    } else if (op.op === "addQuest") {
+      log.quests.push(op.quest)
+    } else if (op.op === "updateQuest") {
+      if (!quest) return false
+      Object.assign(quest, op.quest, { id: op.questId })
+    } else if (op.op === "removeQuest") {
+      if (!quest) return false
+      log.quests.splice(log.quests.indexOf(quest), 1)
+    } else if (op.op === "renameLog") {
+      log.name = op.name
+    } else {
+      return false
+    }
+  }
+  return true
+}
+
+function refreshCurrentLogView() {
+  const currentLog = questLogs.find((log) => log.id === currentLogId)
+  if (!currentLog) return
+
+  document.getElementById("current-log-name").textContent = currentLog.name
+  renderQuests()
+  if (!currentQuestId) return
+  if (currentLog.quests.some((quest) => quest.id === currentQuestId)) {
+    renderQuestDetails()
+  } else {
+    // The selected quest was removed elsewhere
+    currentQuestId = null
+    showEmptyState()
+  }
+}
+
 async function deleteQuestLog(logId) {
   try {
     const response = await fetch(API.DELETE_LOG + logId, {
       method: "DELETE",
+      headers: { "X-Client-Id": CLIENT_ID },
     })
 
     if (!response.ok) throw new Error("Failed to delete quest log")
@@ -255,10 +471,7 @@ async function deleteQuestLog(logId) {
 
 async function loadTemplates() {
   try {
-    const response = await fetch(API.TEMPLATES)
-    if (!response.ok) throw new Error("Failed to load templates")
-
-    const data = await response.json()
+    const data = await fetchJson(API.TEMPLATES)
     templates = data.templates
     renderTemplates()
   } catch (error) {
@@ -277,7 +490,9 @@ async function loadTemplates() {
 
 async function importTemplate(templateId) {
   try {
-    const response = await fetch(API.IMPORT_TEMPLATE + templateId)
+    const response = await fetch(API.IMPORT_TEMPLATE + templateId, {
+      headers: { "X-Client-Id": CLIENT_ID },
+    })
     if (!response.ok) throw new Error("Failed to import template")
 
     const data = await response.json()
@@ -301,6 +516,11 @@ async function importTemplate(templateId) {
 }
 
 // UI Functions
+function isQuestComplete(quest) {
+  // Same rule as quest_progress in server.py
+  return quest.objectives.length > 0 && quest.objectives.every((obj) => obj.completed)
+}
+
 function renderQuestLogs() {
   const questLogsList = document.getElementById("quest-logs-list")
 
@@ -323,17 +543,21 @@ function renderQuestLogs() {
   }
 
   questLogsList.innerHTML = questLogs
-    .map(
-      (log) => `
+    .map((log) => {
+      // Listings from the server carry summary counts instead of the quests themselves
+      const questCount = log.questCount ?? log.quests.length
+      const completedQuests = log.completedQuestCount ?? log.quests.filter(isQuestComplete).length
+
+      return `
     <div class="item-list-item" data-id="${log.id}">
       <div class="item-title">${log.name}</div>
       <div class="item-meta">
-        <span class="item-badge">${log.quests.length} ${log.quests.length === 1 ? "quest" : "quests"}</span>
+        <span class="item-badge">${completedQuests}/${questCount} ${questCount === 1 ? "quest" : "quests"}</span>
         <span>${formatDate(log.updated)}</span>
       </div>
     </div>
-  `,
-    )
+  `
+    })
     .join("")
 
   // Add click event listeners
@@ -343,6 +567,20 @@ function renderQuestLogs() {
       openQuestLog(logId)
     })
   })
+
+  // Fetch the next page when the end of the list scrolls into view
+  if (logsObserver) logsObserver.disconnect()
+  if (logsCursor) {
+    const sentinel = document.createElement("div")
+    sentinel.className = "loading-indicator"
+    sentinel.textContent = "Loading more quest logs..."
+    questLogsList.appendChild(sentinel)
+
+    logsObserver = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) loadMoreQuestLogs()
+    })
+    logsObserver.observe(sentinel)
+  }
 }
 
 function renderTemplates() {
@@ -405,7 +643,19 @@ function renderQuests() {
     return
   }
 
-  questsList.innerHTML = currentLog.quests
+  const quests = questFilter ? currentLog.quests.filter((quest) => questFilter.has(quest.id)) : currentLog.quests
+  if (quests.length === 0) {
+    questsList.innerHTML = `
+      <div class="empty-state">
+        <div class="empty-state-content">
+          <p>No matching quests</p>
+        </div>
+      </div>
+    `
+    return
+  }
+
+  questsList.innerHTML = quests
     .map((quest) => {
       const completedCount = quest.objectives.filter((obj) => obj.completed).length
       const totalCount = quest.objectives.length
@@ -529,6 +779,27 @@ async function createQuestLog() {
   openQuestLog(newQuestLog.id)
 }
 
+async function searchQuests() {
+  const query = document.getElementById("search-quests").value.trim()
+  if (!query || !currentLogId) {
+    questFilter = null
+    renderQuests()
+    return
+  }
+
+  // Search the saved copy of the log, so flush edits the server has not seen yet
+  await saveCurrentLog(true)
+  const params = new URLSearchParams({ q: query, logId: currentLogId, limit: 200 })
+  try {
+    const data = await fetchJson(`${API.SEARCH}?${params}`)
+    if (document.getElementById("search-quests").value.trim() !== query) return
+    questFilter = new Set(data.results.filter((result) => result.questId).map((result) => result.questId))
+    renderQuests()
+  } catch (error) {
+    console.error("Error searching quests:", error)
+  }
+}
+
 async function openQuestLog(logId) {
   // If we have a current log, save it first
   if (currentLogId) {
@@ -537,6 +808,9 @@ async function openQuestLog(logId) {
 
   currentLogId = logId
   currentQuestId = null
+  pendingOps = []
+  questFilter = null
+  document.getElementById("search-quests").value = ""
 
   // Load the full log data
   const currentLog = await loadQuestLog(logId)
@@ -560,6 +834,7 @@ async function backToLogs() {
 
   currentLogId = null
   currentQuestId = null
+  pendingOps = []
 
   document.getElementById("quest-log-view").classList.add("hidden")
   document.getElementById("quest-log-selector").classList.remove("hidden")
@@ -665,8 +940,16 @@ function toggleObjectiveCompletion(objectiveId) {
 
   // Update the log's updated timestamp
   currentLog.updated = new Date().toISOString()
-
-  // Schedule auto-save
+  if (objective.completed) objective.completedAt = currentLog.updated
+  else delete objective.completedAt
+
+  // Schedule auto-save of just this change
+  pendingOps.push({
+    op: "toggleObjective",
+    questId: currentQuest.id,
+    objectiveId: objective.id,
+    completed: objective.completed,
+  })
   scheduleAutoSave()
 
   renderQuestDetails()
@@ -762,6 +1045,7 @@ async function saveQuest() {
 
   const currentLog = questLogs.find((log) => log.id === currentLogId)
   currentLog.quests.push(newQuest)
+  pendingOps.push({ op: "addQuest", quest: newQuest })
 
   // Update the log's updated timestamp
   currentLog.updated = new Date().toISOString()
@@ -877,13 +1161,17 @@ async function saveEditedQuest() {
   if (questIndex === -1) return
 
   // Update the quest
-  currentLog.quests[questIndex] = {
-    ...currentLog.quests[questIndex],
+  const questUpdate = {
     title,
     description,
     objectives,
     updated: new Date().toISOString(),
   }
+  currentLog.quests[questIndex] = {
+    ...currentLog.quests[questIndex],
+    ...questUpdate,
+  }
+  pendingOps.push({ op: "updateQuest", questId: currentQuestId, quest: questUpdate })
 
   // Update the log's updated timestamp
   currentLog.updated = new Date().toISOString()
@@ -967,10 +1255,18 @@ async function saveCurrentLog(immediate = false) {
       clearTimeout(saveTimeout)
       saveTimeout = null
     }
-    await saveQuestLog(currentLog)
   } else {
     saveTimeout = null
+  }
+
+  // Send only the accumulated operations when the server copy is known
+  const ops = pendingOps
+  pendingOps = []
+  if (ops.length === 0) return
+  if (currentLog.revision === undefined) {
     await saveQuestLog(currentLog)
+  } else {
+    await patchQuestLog(currentLog, ops)
   }
 }
 
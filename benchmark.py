@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Quest Log Benchmark
+Generates a synthetic dataset, starts the server on it and drives a mixed
+workload against the API, then prints throughput, latency percentiles and
+peak memory as JSON so runs can be compared.
+"""
+
+import os
+import sys
+import math
+import json
+import gzip
+import time
+import signal
+import random
+import socket
+import shutil
+import argparse
+import tempfile
+import resource
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timedelta
+
+import server
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+DEFAULT_MIX = "list=20,read=35,save=10,toggle=20,delete=5,import=10"
+STARTUP_TIMEOUT = 60.0  # Seconds to wait for the server to answer its first request
+SAMPLE_TEMPLATES = server.sample_templates()
+
+
+def parse_mix(text):
+    """Parse ``name=weight,...`` into a list of ``(operation, weight)`` pairs."""
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation: {name.strip()}")
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+def generate_log(index, quests, objectives, rng, now):
+    """Build one synthetic log whose quests and objectives follow the sample templates."""
+    template = SAMPLE_TEMPLATES[index % len(SAMPLE_TEMPLATES)]
+    created = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399))
+    updated = created + timedelta(seconds=rng.randint(0, 86400 * 30))
+    log = {
+        'id': f"bench-{index:06d}",
+        'name': f"{template['name']} {index}",
+        'description': template.get('description', ''),
+        'quests': [],
+        'revision': 1,
+        'created': created.isoformat(),
+        'updated': updated.isoformat(),
+    }
+    for q in range(quests):
+        source = template['quests'][q % len(template['quests'])]
+        log['quests'].append({
+            'id': f"quest-{q}",
+            'title': f"{source['title']} {q}",
+            'description': source.get('description', ''),
+            'objectives': [
+                {
+                    'id': f"obj-{o}",
+                    'title': source['objectives'][o % len(source['objectives'])]['title'],
+                    'completed': rng.random() < 0.3,
+                }
+                for o in range(objectives)
+            ],
+            'created': created.isoformat(),
+            'updated': updated.isoformat(),
+        })
+    return log
+
+
+def generate_dataset(data_dir, logs, quests, objectives, seed, layout="flat"):
+    """Write ``logs`` synthetic ``.quest`` files into ``data_dir`` and return their ids and total size."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    logs_dir = os.path.join(data_dir, "logs")
+    os.makedirs(logs_dir, exist_ok=True)
+    os.makedirs(os.path.join(data_dir, "templates"), exist_ok=True)
+    store = server.FileLogStore(logs_dir, layout)
+    ids, size = [], 0
+    for index in range(logs):
+        log = generate_log(index, quests, objectives, rng, now)
+        path = store.path(log['id'])
+        server.write_json_atomic(path, log)
+        size += os.path.getsize(path)
+        ids.append(log['id'])
+    return ids, size
+
+
+def free_port():
+    """Return a TCP port that is currently free on localhost."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, data_dir, port):
+    """Start ``server.py`` on ``data_dir`` and wait until it answers; returns the process."""
+    command = [sys.executable, SERVER_SCRIPT, "--data-dir", data_dir, "--port", str(port),
+               "--mode", args.mode, "--storage", args.storage, "--layout", args.layout]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    if args.write_behind:
+        command += ["--write-behind", str(args.write_behind)]
+    if args.log_cache_size is not None:
+        command += ["--log-cache-size", str(args.log_cache_size)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited during startup with status {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/api/templates")
+            conn.getresponse().read()
+            conn.close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise SystemExit("Server did not start in time")
+
+
+def process_tree(pid):
+    """Return ``pid`` and the ids of its child processes (Linux only; otherwise just ``pid``)."""
+    pids = [pid]
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return pids
+
+
+def peak_rss(pid):
+    """Return the peak resident set size of a running process in bytes, or None if unknown."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def maxrss_bytes(usage):
+    """Convert ``ru_maxrss`` to bytes (kilobytes on Linux, bytes on macOS)."""
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+class Workload:
+    """State shared by the client threads: the log ids, known revisions and deletable logs."""
+
+    def __init__(self, ids, templates, quests, objectives, gzip):
+        self.ids = ids
+        self.quests = quests
+        self.objectives = objectives
+        self.templates = templates
+        self.lock = threading.Lock()
+        self.revisions = dict.fromkeys(ids, 1)
+        self.imported = []  # Ids created by imports, which the delete operation removes
+        self.headers = {'Accept-Encoding': 'gzip'} if gzip else {}
+
+    def request(self, conn, method, path, body=None):
+        """Send one request and return ``(status, body)``."""
+        headers = dict(self.headers)
+        if body is not None:
+            body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return response.status, data
+
+
+def op_list(workload, conn, rng):
+    sort = rng.choice(['updated', 'created', 'name'])
+    return workload.request(conn, "GET", f"/api/logs?sort={sort}&limit=50")[0] == 200
+
+
+def op_read(workload, conn, rng):
+    return workload.request(conn, "GET", f"/api/log/{rng.choice(workload.ids)}")[0] == 200
+
+
+def op_save(workload, conn, rng):
+    index = rng.randrange(len(workload.ids))
+    log = generate_log(index, workload.quests, workload.objectives, rng, datetime.now())
+    status, body = workload.request(conn, "POST", "/api/save", {'log': log})
+    if status == 200:
+        with workload.lock:
+            workload.revisions[log['id']] = json.loads(body)['revision']
+    return status == 200
+
+
+def op_toggle(workload, conn, rng):
+    log_id = rng.choice(workload.ids)
+    op = {'op': 'toggleObjective', 'questId': f"quest-{rng.randrange(workload.quests)}",
+          'objectiveId': f"obj-{rng.randrange(workload.objectives)}", 'completed': rng.random() < 0.5}
+    for _ in range(3):
+        with workload.lock:
+            revision = workload.revisions[log_id]
+        status, body = workload.request(conn, "PATCH", f"/api/patch/{log_id}",
+                                        {'baseRevision': revision, 'ops': [op]})
+        if status in (200, 409):
+            # Both carry the stored revision; a conflict is retried against it
+            with workload.lock:
+                workload.revisions[log_id] = json.loads(body)['revision']
+        if status != 409:
+            return status == 200
+    return False
+
+
+def op_import(workload, conn, rng):
+    template_id = rng.choice(workload.templates)
+    status, body = workload.request(conn, "GET", f"/api/import-template/{template_id}")
+    if status == 200:
+        with workload.lock:
+            workload.imported.append(json.loads(body)['log']['id'])
+    return status == 200
+
+
+def op_delete(workload, conn, rng):
+    with workload.lock:
+        log_id = workload.imported.pop() if workload.imported else None
+    if log_id is None:
+        return None
+    return workload.request(conn, "DELETE", f"/api/delete/{log_id}")[0] == 200
+
+
+OPERATIONS = {
+    'list': op_list,
+    'read': op_read,
+    'save': op_save,
+    'toggle': op_toggle,
+    'delete': op_delete,
+    'import': op_import,
+}
+
+
+def client(workload, port, mix, seed, stop_at, record_after, samples, errors):
+    """Run operations from ``mix`` on one keep-alive connection until ``stop_at``."""
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while True:
+        now = time.perf_counter()
+        if now >= stop_at:
+            break
+        name = rng.choices(names, weights)[0]
+        try:
+            if name == 'delete' and not workload.imported:
+                # Deletes only remove imported logs; create one first, outside the timing
+                op_import(workload, conn, rng)
+                now = time.perf_counter()
+            result = OPERATIONS[name](workload, conn, rng)
+            elapsed = time.perf_counter() - now
+        except (OSError, http.client.HTTPException, ValueError, KeyError):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            result, elapsed = False, time.perf_counter() - now
+        if now < record_after or result is None:
+            continue
+        if result:
+            samples.setdefault(name, []).append(elapsed)
+        else:
+            errors[name] = errors.get(name, 0) + 1
+    conn.close()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def latency_stats(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': values[-1],
+    }
+
+
+def run(args):
+    """Run one benchmark and return its results."""
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="questlog-bench-")
+    try:
+        started = time.perf_counter()
+        ids, size = generate_dataset(data_dir, args.logs, args.quests, args.objectives, args.seed, args.layout)
+        generate_seconds = time.perf_counter() - started
+        if args.storage == "sqlite":
+            subprocess.run([sys.executable, SERVER_SCRIPT, "migrate-sqlite", "--data-dir", data_dir, "--layout", args.layout],
+                           check=True, stdout=subprocess.DEVNULL)
+
+        port = args.port or free_port()
+        started = time.perf_counter()
+        process = start_server(args, data_dir, port)
+        startup_seconds = time.perf_counter() - started
+        try:
+            templates = [t['id'] for t in SAMPLE_TEMPLATES]
+            workload = Workload(ids, templates, args.quests, args.objectives, args.gzip)
+            begin = time.perf_counter()
+            record_after = begin + args.warmup
+            stop_at = record_after + args.duration
+            per_client = [({}, {}) for _ in range(args.concurrency)]
+            threads = [
+                threading.Thread(target=client, args=(workload, port, args.mix, args.seed + n,
+                                                      stop_at, record_after, *per_client[n]))
+                for n in range(args.concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            server_rss = [peak_rss(pid) for pid in process_tree(process.pid)]
+        finally:
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+    finally:
+        if not args.data_dir and not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    samples, errors = {}, {}
+    for client_samples, client_errors in per_client:
+        for name, values in client_samples.items():
+            samples.setdefault(name, []).extend(values)
+        for name, count in client_errors.items():
+            errors[name] = errors.get(name, 0) + count
+    total = sum(len(values) for values in samples.values())
+    if None in server_rss:
+        # /proc is unavailable: fall back to the largest reaped child process
+        server_rss = [maxrss_bytes(resource.getrusage(resource.RUSAGE_CHILDREN))]
+    return {
+        'config': {
+            'logs': args.logs, 'quests': args.quests, 'objectives': args.objectives,
+            'storage': args.storage, 'mode': args.mode, 'workers': args.workers,
+            'concurrency': args.concurrency, 'duration': args.duration, 'warmup': args.warmup,
+            'mix': dict(args.mix), 'gzip': args.gzip, 'seed': args.seed,
+        },
+        'dataset': {'bytes': size, 'generateSeconds': generate_seconds},
+        'startupSeconds': startup_seconds,
+        'requests': total,
+        'errors': sum(errors.values()),
+        'throughput': total / args.duration,
+        'operations': {
+            name: {
+                'count': len(samples.get(name, [])),
+                'errors': errors.get(name, 0),
+                'throughput': len(samples.get(name, [])) / args.duration,
+                'latency': latency_stats(samples.get(name, [])),
+            }
+            for name, _ in args.mix
+        },
+        'server': {'peakRssBytes': max(server_rss), 'totalPeakRssBytes': sum(server_rss),
+                   'processes': len(server_rss)},
+        'client': {'peakRssBytes': maxrss_bytes(resource.getrusage(resource.RUSAGE_SELF))},
+    }
+
+
+def parse_args(argv=None):
+    """Parse the command line options for a benchmark run."""
+    parser = argparse.ArgumentParser(description="Quest Log API benchmark")
+    parser.add_argument("--logs", type=int, default=1000, help="synthetic logs to generate (default: %(default)s)")
+    parser.add_argument("--quests", type=int, default=10, help="quests per log (default: %(default)s)")
+    parser.add_argument("--objectives", type=int, default=5, help="objectives per quest (default: %(default)s)")
+    parser.add_argument("--storage", choices=["file", "journal", "sqlite"], default="file",
+                        help="server storage engine (default: %(default)s)")
+    parser.add_argument("--layout", choices=["flat", "sharded"], default="flat",
+                        help="directory layout of the log files (default: %(default)s)")
+    parser.add_argument("--mode", choices=["single", "threaded", "prefork", "async"], default="threaded",
+                        help="server concurrency mode (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="server worker threads or processes")
+    parser.add_argument("--write-behind", type=float, metavar="SECONDS", help="server write-behind delay")
+    parser.add_argument("--log-cache-size", type=int, metavar="BYTES", help="server log cache budget (0 disables it)")
+    parser.add_argument("--concurrency", type=int, default=16, help="client connections (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds (default: %(default)s)")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds first (default: %(default)s)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--no-gzip", dest="gzip", action="store_false", help="do not send Accept-Encoding: gzip")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: %(default)s)")
+    parser.add_argument("--port", type=int, help="server port (default: a free port)")
+    parser.add_argument("--data-dir", help="generate into this directory instead of a temporary one")
+    parser.add_argument("--keep-data", action="store_true", help="keep the temporary data directory")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
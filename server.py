@@ -4,384 +4,3800 @@ Quest Log Server
 A simple HTTP server that handles file operations for the Quest Log web app.
 """
 
+import io
 import os
+import sys
 import json
+import time
 import shutil
+import signal
+import socket
+import base64
+import secrets
+import bisect
+import hashlib
+import sqlite3
+import zlib
+import struct
+import codecs
+import gzip
+import tarfile
+import heapq
+import itertools
+import re
+import asyncio
+import argparse
+import threading
+import contextlib
 import http.server
 import socketserver
+import collections
 import urllib.parse
+import email.utils
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+try:
+    import resource
+except ImportError:  # Windows: the async server keeps the default descriptor limit
+    resource = None
+
+try:
+    import brotli
+except ImportError:  # Optional: responses fall back to gzip
+    brotli = None
+
 # Configuration
 PORT = 8000
 DATA_DIR = "data"
 LOGS_DIR = os.path.join(DATA_DIR, "logs")
 TEMPLATES_DIR = os.path.join(DATA_DIR, "templates")
+IMPORTS_DIR = os.path.join(DATA_DIR, "imports")  # Progress files of archive imports, for resuming them
 PUBLIC_DIR = "."  # Current directory for static files
+INDEX_REVALIDATE_SECONDS = 5.0  # Max age of the log index before re-checking file mtimes
+STORAGE_ENGINE = "file"  # "file" (one JSON file per log), "journal" (snapshot + journal) or "sqlite"
+LOG_LAYOUT = "flat"  # "flat" (logs/<id>.quest) or "sharded" (logs/<a>/<b>/<id>.quest, by a hash of the id)
+LOG_FILE_SUFFIXES = ('.quest', '.journal')  # Files a log may be stored in, by any engine
+FILE_FORMAT = "json"  # Encoding of new log and template files: "json" (one line), "pretty" (indented) or "binary"
+JOURNAL_FSYNC_INTERVAL = 0.005  # Seconds the group committer waits to batch journal fsyncs
+JOURNAL_COMPACT_BYTES = 256 * 1024  # Journal size that triggers folding it into a new snapshot
+WRITE_BEHIND_DELAY = 0  # Seconds log writes may wait in memory to be merged and flushed together; 0 writes at once
+WRITE_BEHIND_BATCH = 500  # Dirty logs that trigger a write-behind flush before the delay is up
+LOG_CACHE_BYTES = 64 * 1024 * 1024  # Memory budget of the cache of encoded logs (file and journal storage); 0 disables it
+SQLITE_PATH = os.path.join(DATA_DIR, "questlog.db")  # Database used by the "sqlite" storage engine
+SQLITE_BATCH_SIZE = 500  # Logs per transaction when bulk-loading into SQLite
+SERVER_MODE = "threaded"  # "single", "threaded", "prefork" or "async"
+SERVER_WORKERS = None  # Threads (threaded) or processes (prefork); None picks a default from the CPU count
+PREFORK_THREADS = 4  # Worker threads inside each prefork process
+ASYNC_KEEPALIVE_TIMEOUT = 75.0  # Seconds an idle keep-alive connection may wait for its next request
+ASYNC_BACKLOG = 1024  # Listen backlog of the async server
+ASYNC_MAX_HEADER_BYTES = 64 * 1024  # Largest request line plus headers the async server accepts
+LOCK_STRIPES = 1024  # Byte-range lock slots shared by all log ids
+TEMPLATE_BATCH_MAX = 1000  # Most copies one batch template import may create
+BATCH_MAX_OPERATIONS = 1000  # Most operations one /api/batch request may carry
+BATCH_WORKERS = 8  # Threads that run the per-log groups of /api/batch requests in parallel
+MAX_BODY_BYTES = 8 * 1024 * 1024  # Largest request body accepted (saves and patches)
+MAX_IMPORT_BODY_BYTES = 256 * 1024  # Largest body of a template import request
+MAX_ARCHIVE_BYTES = 4 * 1024 ** 3  # Largest archive accepted by POST /api/import
+EXPORT_CHUNK_BYTES = 64 * 1024  # Archive bytes collected before an export sends them
+IMPORT_PROGRESS_INTERVAL = 200  # Records between saves of an import's progress; a resumed import may redo this many
+BODY_CHUNK_SIZE = 64 * 1024  # Bytes read from the socket at a time while receiving a body
+LIST_PAGE_SIZE = 50  # Default number of logs per /api/logs page
+LIST_MAX_PAGE_SIZE = 500  # Largest page a client may request
+COMPRESSION_MIN_SIZE = 1024  # JSON responses smaller than this are sent uncompressed
+COMPRESSION_LEVEL = 6  # gzip level (1-9) / brotli quality for JSON responses
+STATIC_COMPRESSION_LEVEL = 9  # Level for pre-compressed static files, which are compressed once
+STATS_RECENT_DAYS = 30  # Days of per-day completion counts kept in summaries and reported by /api/stats
+SEARCH_DEFAULT_LIMIT = 20  # Results returned by /api/search when no limit is given
+SEARCH_MAX_LIMIT = 200  # Largest result count a client may request
+SEARCH_MAX_EXPANSIONS = 256  # Most indexed tokens a single search prefix may expand to
+SEARCH_PREFIX_WEIGHT = 0.5  # Score factor for tokens matched by prefix rather than exactly
+SEARCH_FIELD_WEIGHTS = {'logName': 3.0, 'questTitle': 2.0, 'objectiveTitle': 1.5, 'questDescription': 1.0}
+CHANGE_FEED_SIZE = 4096  # Change events kept for clients resuming with Last-Event-ID
+CHANGE_FEED_HEARTBEAT = 15.0  # Seconds between keep-alive comments on idle change streams
+CHANGE_FEED_RETRY_MS = 2000  # Reconnect delay suggested to EventSource clients
+METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_QUANTILES = (0.5, 0.95, 0.99)  # Latency quantiles estimated from the histogram buckets
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# Sample templates
+def sample_templates():
+    """Build the sample templates, stamped with the current time.
+
+    Only called when the templates directory is empty, so the server does not
+    pay for building them at import.
+    """
+    now = datetime.now().isoformat()
+    return [
+        {
+            "id": "daily-tasks",
+            "name": "Daily Tasks",
+            "description": "A template for tracking daily tasks and routines",
+            "quests": [
+                {
+                    "id": "morning-routine",
+                    "title": "Morning Routine",
+                    "description": "Complete your morning routine to start the day right",
+                    "objectives": [
+                        {"id": "obj1", "title": "Wake up at 6:30 AM", "completed": False},
+                        {"id": "obj2", "title": "Drink water", "completed": False},
+                        {"id": "obj3", "title": "Exercise for 15 minutes", "completed": False},
+                        {"id": "obj4", "title": "Eat breakfast", "completed": False},
+                        {"id": "obj5", "title": "Plan your day", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "work-tasks",
+                    "title": "Work Tasks",
+                    "description": "Complete your work tasks for the day",
+                    "objectives": [
+                        {"id": "obj1", "title": "Check emails", "completed": False},
+                        {"id": "obj2", "title": "Attend daily meeting", "completed": False},
+                        {"id": "obj3", "title": "Complete primary task", "completed": False},
+                        {"id": "obj4", "title": "Follow up with team", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "evening-routine",
+                    "title": "Evening Routine",
+                    "description": "Wind down and prepare for tomorrow",
+                    "objectives": [
+                        {"id": "obj1", "title": "Review today's accomplishments", "completed": False},
+                        {"id": "obj2", "title": "Prepare for tomorrow", "completed": False},
+                        {"id": "obj3", "title": "Read for 30 minutes", "completed": False},
+                        {"id": "obj4", "title": "Sleep by 10:30 PM", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                }
+            ],
+            "created": now,
+            "updated": now
+        },
+        {
+            "id": "fitness-journey",
+            "name": "Fitness Journey",
+            "description": "Track your fitness goals and progress",
+            "quests": [
+                {
+                    "id": "strength-training",
+                    "title": "Strength Training",
+                    "description": "Build strength through regular weight training",
+                    "objectives": [
+                        {"id": "obj1", "title": "Upper body workout (2x per week)", "completed": False},
+                        {"id": "obj2", "title": "Lower body workout (2x per week)", "completed": False},
+                        {"id": "obj3", "title": "Increase bench press by 10%", "completed": False},
+                        {"id": "obj4", "title": "Master proper squat form", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "cardio-endurance",
+                    "title": "Cardio & Endurance",
+                    "description": "Improve cardiovascular health and endurance",
+                    "objectives": [
+                        {"id": "obj1", "title": "Run 5k without stopping", "completed": False},
+                        {"id": "obj2", "title": "30 minutes of cardio (3x per week)", "completed": False},
+                        {"id": "obj3", "title": "Try a new cardio activity", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "nutrition",
+                    "title": "Nutrition",
+                    "description": "Maintain a balanced diet to fuel your fitness journey",
+                    "objectives": [
+                        {"id": "obj1", "title": "Track macros for 2 weeks", "completed": False},
+                        {"id": "obj2", "title": "Meal prep weekly", "completed": False},
+                        {"id": "obj3", "title": "Drink 2L of water daily", "completed": False},
+                        {"id": "obj4", "title": "Reduce processed food intake", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                }
+            ],
+            "created": now,
+            "updated": now
+        },
+        {
+            "id": "project-management",
+            "name": "Project Management",
+            "description": "Organize and track your work projects",
+            "quests": [
+                {
+                    "id": "project-planning",
+                    "title": "Project Planning",
+                    "description": "Set up the foundation for your project",
+                    "objectives": [
+                        {"id": "obj1", "title": "Define project scope", "completed": False},
+                        {"id": "obj2", "title": "Create timeline", "completed": False},
+                        {"id": "obj3", "title": "Assign responsibilities", "completed": False},
+                        {"id": "obj4", "title": "Set up tracking system", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "execution-phase",
+                    "title": "Execution Phase",
+                    "description": "Implement the project plan",
+                    "objectives": [
+                        {"id": "obj1", "title": "Complete first milestone", "completed": False},
+                        {"id": "obj2", "title": "Weekly progress reviews", "completed": False},
+                        {"id": "obj3", "title": "Address blockers", "completed": False},
+                        {"id": "obj4", "title": "Update stakeholders", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                }
+            ],
+            "created": now,
+            "updated": now
+        },
+        {
+            "id": "algebra-2",
+            "name": "10th Grade Algebra II",
+            "description": "A comprehensive curriculum for 10th grade Algebra II",
+            "quests": [
+                {
+                    "id": "linear-equations",
+                    "title": "Linear Equations and Inequalities",
+                    "description": "Master solving and graphing linear equations and inequalities in one and two variables.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Solve linear equations with variables on both sides", "completed": False},
+                        {"id": "obj2", "title": "Graph linear equations using slope-intercept form", "completed": False},
+                        {"id": "obj3", "title": "Solve systems of linear equations", "completed": False},
+                        {"id": "obj4", "title": "Solve and graph linear inequalities", "completed": False},
+                        {"id": "obj5", "title": "Complete linear word problems", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "quadratic-functions",
+                    "title": "Quadratic Functions",
+                    "description": "Understand and work with quadratic functions and their applications.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Graph quadratic functions", "completed": False},
+                        {"id": "obj2", "title": "Find zeros using factoring", "completed": False},
+                        {"id": "obj3", "title": "Apply the quadratic formula", "completed": False},
+                        {"id": "obj4", "title": "Complete the square", "completed": False},
+                        {"id": "obj5", "title": "Solve quadratic word problems", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "polynomials",
+                    "title": "Polynomials and Rational Expressions",
+                    "description": "Learn to manipulate and solve polynomial and rational expressions.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Add, subtract, and multiply polynomials", "completed": False},
+                        {"id": "obj2", "title": "Factor polynomials", "completed": False},
+                        {"id": "obj3", "title": "Simplify rational expressions", "completed": False},
+                        {"id": "obj4", "title": "Solve polynomial equations", "completed": False},
+                        {"id": "obj5", "title": "Graph polynomial functions", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "exponential-logarithmic",
+                    "title": "Exponential and Logarithmic Functions",
+                    "description": "Explore exponential growth/decay and logarithmic relationships.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Evaluate exponential expressions", "completed": False},
+                        {"id": "obj2", "title": "Graph exponential functions", "completed": False},
+                        {"id": "obj3", "title": "Convert between exponential and logarithmic forms", "completed": False},
+                        {"id": "obj4", "title": "Solve logarithmic equations", "completed": False},
+                        {"id": "obj5", "title": "Apply exponential models to real-world scenarios", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                }
+            ],
+            "created": now,
+            "updated": now
+        },
+        {
+            "id": "geometry",
+            "name": "High School Geometry",
+            "description": "A structured curriculum for high school geometry",
+            "quests": [
+                {
+                    "id": "basic-concepts",
+                    "title": "Basic Geometric Concepts",
+                    "description": "Learn the fundamental concepts and vocabulary of geometry.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Identify points, lines, planes, and angles", "completed": False},
+                        {"id": "obj2", "title": "Measure and classify angles", "completed": False},
+                        {"id": "obj3", "title": "Understand parallel and perpendicular lines", "completed": False},
+                        {"id": "obj4", "title": "Apply the coordinate system", "completed": False},
+                        {"id": "obj5", "title": "Use geometric notation correctly", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "triangles",
+                    "title": "Triangles and Congruence",
+                    "description": "Explore properties of triangles and methods to prove congruence.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Classify triangles by sides and angles", "completed": False},
+                        {"id": "obj2", "title": "Apply the triangle sum theorem", "completed": False},
+                        {"id": "obj3", "title": "Prove triangles congruent using SSS, SAS, ASA, and AAS", "completed": False},
+                        {"id": "obj4", "title": "Use triangle congruence to solve problems", "completed": False},
+                        {"id": "obj5", "title": "Understand and apply the Pythagorean theorem", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "similarity",
+                    "title": "Similarity and Proportions",
+                    "description": "Understand similar figures and proportional relationships.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Identify similar triangles", "completed": False},
+                        {"id": "obj2", "title": "Apply the AA similarity criterion", "completed": False},
+                        {"id": "obj3", "title": "Use proportions to find missing measurements", "completed": False},
+                        {"id": "obj4", "title": "Apply similarity to real-world problems", "completed": False},
+                        {"id": "obj5", "title": "Understand scale factors and their effects", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "circles",
+                    "title": "Circles and Their Properties",
+                    "description": "Explore the properties and theorems related to circles.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Identify parts of a circle (radius, diameter, chord, arc)", "completed": False},
+                        {"id": "obj2", "title": "Apply the inscribed angle theorem", "completed": False},
+                        {"id": "obj3", "title": "Find arc lengths and sector areas", "completed": False},
+                        {"id": "obj4", "title": "Write the equation of a circle", "completed": False},
+                        {"id": "obj5", "title": "Solve problems involving tangent lines", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "area-volume",
+                    "title": "Area and Volume",
+                    "description": "Calculate measurements of two and three-dimensional figures.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Find areas of triangles, quadrilaterals, and circles", "completed": False},
+                        {"id": "obj2", "title": "Calculate surface areas of 3D figures", "completed": False},
+                        {"id": "obj3", "title": "Determine volumes of prisms, pyramids, cylinders, and spheres", "completed": False},
+                        {"id": "obj4", "title": "Apply area and volume formulas to composite figures", "completed": False},
+                        {"id": "obj5", "title": "Solve real-world measurement problems", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                }
+            ],
+            "created": now,
+            "updated": now
+        },
+        {
+            "id": "precalculus",
+            "name": "11th Grade Pre-Calculus",
+            "description": "A comprehensive curriculum for 11th grade Pre-Calculus",
+            "quests": [
+                {
+                    "id": "functions",
+                    "title": "Functions and Their Graphs",
+                    "description": "Analyze various functions and their graphical representations.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Identify function types and their characteristics", "completed": False},
+                        {"id": "obj2", "title": "Find domains and ranges", "completed": False},
+                        {"id": "obj3", "title": "Perform function transformations", "completed": False},
+                        {"id": "obj4", "title": "Compose functions and find inverses", "completed": False},
+                        {"id": "obj5", "title": "Analyze piecewise functions", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "trigonometry",
+                    "title": "Trigonometric Functions",
+                    "description": "Explore the properties and applications of trigonometric functions.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Convert between degrees and radians", "completed": False},
+                        {"id": "obj2", "title": "Evaluate the six trigonometric functions", "completed": False},
+                        {"id": "obj3", "title": "Graph sine, cosine, and tangent functions", "completed": False},
+                        {"id": "obj4", "title": "Apply trigonometric identities", "completed": False},
+                        {"id": "obj5", "title": "Solve trigonometric equations", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "vectors",
+                    "title": "Vectors and Parametric Equations",
+                    "description": "Work with vectors and parametric representations in two and three dimensions.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Perform vector operations", "completed": False},
+                        {"id": "obj2", "title": "Find dot and cross products", "completed": False},
+                        {"id": "obj3", "title": "Write parametric equations", "completed": False},
+                        {"id": "obj4", "title": "Convert between parametric and rectangular forms", "completed": False},
+                        {"id": "obj5", "title": "Apply vectors to physics problems", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "conic-sections",
+                    "title": "Conic Sections",
+                    "description": "Study the properties and equations of circles, ellipses, parabolas, and hyperbolas.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Identify and graph circles", "completed": False},
+                        {"id": "obj2", "title": "Analyze ellipses and their properties", "completed": False},
+                        {"id": "obj3", "title": "Work with parabolas in various forms", "completed": False},
+                        {"id": "obj4", "title": "Understand hyperbolas and their asymptotes", "completed": False},
+                        {"id": "obj5", "title": "Convert between general and standard forms", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                },
+                {
+                    "id": "limits-intro",
+                    "title": "Introduction to Limits",
+                    "description": "Begin exploring the foundational concept of calculus: limits.",
+                    "objectives": [
+                        {"id": "obj1", "title": "Evaluate limits graphically", "completed": False},
+                        {"id": "obj2", "title": "Find limits algebraically", "completed": False},
+                        {"id": "obj3", "title": "Understand one-sided limits", "completed": False},
+                        {"id": "obj4", "title": "Identify when limits do not exist", "completed": False},
+                        {"id": "obj5", "title": "Apply the squeeze theorem", "completed": False}
+                    ],
+                    "created": now,
+                    "updated": now
+                }
+            ],
+            "created": now,
+            "updated": now
+        }
+    ]
+
+
+def json_objects(value):
+    """Return the objects in a parsed JSON list, skipping other items; [] if ``value`` is not a list."""
+    return [item for item in value if isinstance(item, dict)] if isinstance(value, list) else []
+
+
+def quest_progress(quest):
+    """Return the completion aggregates of one quest.
+
+    A quest is complete once it has objectives and all of them are; its
+    ``lastCompletedAt`` is the latest ``completedAt`` of its objectives.
+    """
+    objectives = json_objects(quest.get('objectives'))
+    completed = [objective for objective in objectives if objective.get('completed')]
+    stamps = [str(objective['completedAt']) for objective in completed if objective.get('completedAt')]
+    return {
+        'id': quest.get('id'),
+        'title': quest.get('title'),
+        'objectiveCount': len(objectives),
+        'completedCount': len(completed),
+        'completed': bool(objectives) and len(completed) == len(objectives),
+        'lastCompletedAt': max(stamps, default=None),
+    }
+
+
+def completion_day(stamp):
+    """Return the UTC day (``YYYY-MM-DD``) of a ``completedAt`` stamp, or None if it is not an ISO time.
+
+    Pages stamp in UTC (``toISOString``) while the server stamps its local
+    time without an offset, so stamps without one are read as server time.
+    """
+    try:
+        moment = datetime.fromisoformat(stamp.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return moment.astimezone(timezone.utc).date().isoformat()
+
+
+def summarize_log(log):
+    """Build the listing summary for a parsed quest log.
+
+    Besides the counts it carries ``completedByDay``, the number of objectives
+    completed on each of the last ``STATS_RECENT_DAYS`` days, which is what
+    /api/stats adds up instead of reading every log. Quests and objectives
+    that are not objects are skipped.
+    """
+    quests = json_objects(log.get('quests'))
+    objective_count = 0
+    completed_count = 0
+    completed_quests = 0
+    last_completed = None
+    by_day = {}
+    oldest_day = (datetime.now(timezone.utc) - timedelta(days=STATS_RECENT_DAYS)).date()
+    # Stamps dated before this cannot fall in the window in any time zone, so they are not parsed
+    earliest = (oldest_day - timedelta(days=1)).isoformat()
+    oldest_day = oldest_day.isoformat()
+    for quest in quests:
+        objectives = json_objects(quest.get('objectives'))
+        done = 0
+        for objective in objectives:
+            if not objective.get('completed'):
+                continue
+            done += 1
+            stamp = objective.get('completedAt')
+            if stamp:
+                stamp = str(stamp)
+                last_completed = max(last_completed or stamp, stamp)
+                day = completion_day(stamp) if stamp[:10] >= earliest else None
+                if day and day >= oldest_day:
+                    by_day[day] = by_day.get(day, 0) + 1
+        objective_count += len(objectives)
+        completed_count += done
+        if objectives and done == len(objectives):
+            completed_quests += 1
+    return {
+        'id': log.get('id'),
+        'name': log.get('name'),
+        'questCount': len(quests),
+        'objectiveCount': objective_count,
+        'completedCount': completed_count,
+        'completedQuestCount': completed_quests,
+        'lastCompletedAt': last_completed,
+        'completedByDay': by_day,
+        'revision': log.get('revision', 0),
+        'created': log.get('created'),
+        'updated': log.get('updated')
+    }
+
+
+LOG_ID = re.compile(r"[A-Za-z0-9_-]{1,128}")  # Ids a log may be stored under; keeps its files inside LOGS_DIR
+
+
+def validate_log(log):
+    """Raise ValueError unless ``log`` is a quest log the server can store, list and search."""
+    if not isinstance(log, dict) or not log.get('id') or not log.get('name'):
+        raise ValueError("Invalid quest log data")
+    if not isinstance(log['id'], str):
+        raise ValueError("Invalid quest log data: id must be a string")
+    if not LOG_ID.fullmatch(log['id']):
+        raise ValueError("Invalid quest log data: id may only contain letters, digits, '-' and '_'")
+    quests = log.get('quests')
+    if quests is None:
+        return
+    if not isinstance(quests, list):
+        raise ValueError("Invalid quest log data: quests must be a list")
+    for quest in quests:
+        problem = quest_shape_error(quest)
+        if problem:
+            raise ValueError(f"Invalid quest log data: {problem}")
+
+
+def stamp_completions(log, now):
+    """Give completed objectives that lack one a ``completedAt`` of ``now``; drop it from open ones."""
+    for quest in json_objects(log.get('quests')):
+        for objective in json_objects(quest.get('objectives')):
+            if objective.get('completed'):
+                objective.setdefault('completedAt', now)
+            else:
+                objective.pop('completedAt', None)
+
+
+# Only ASCII letters are case-folded, matching SQLite's lower() so both backends page identically
+ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+# Sort orders for log listings; each maps a summary to a string key, ties broken by id
+LIST_SORT_KEYS = {
+    'updated': lambda summary: str(summary.get('updated') or ''),
+    'created': lambda summary: str(summary.get('created') or ''),
+    'name': lambda summary: str(summary.get('name') or '').translate(ASCII_LOWER),
+}
+
+
+def encode_cursor(key, log_id):
+    """Encode the position after a listing item as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps([key, log_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from ``encode_cursor``; raises ValueError if it is malformed."""
+    try:
+        key, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    return str(key), str(log_id)
+
+
+def new_log_id():
+    """Return a fresh log id: the creation time in seconds plus 48 random bits.
+
+    Ids made in the same second (or by different prefork workers) differ in the
+    random part, so imports never overwrite each other.
+    """
+    return f"{int(time.time())}-{secrets.token_hex(6)}"
+
+
+class PatchError(Exception):
+    """Raised when a patch operation is malformed."""
+
+
+class PatchConflict(PatchError):
+    """Raised when a patch does not apply to the stored state of a log."""
+
+
+def quest_shape_error(quest):
+    """Return why ``quest`` cannot be stored, or None if it has the shape the server relies on.
+
+    Listings, search and the completion aggregates read every quest, so a
+    malformed one must be refused before it reaches the disk.
+    """
+    if not isinstance(quest, dict):
+        return "quest must be an object"
+    for field in ('title', 'description'):
+        if quest.get(field) is not None and not isinstance(quest[field], str):
+            return f"quest {field} must be a string"
+    objectives = quest.get('objectives')
+    if objectives is None:
+        return None
+    if not isinstance(objectives, list):
+        return "quest objectives must be a list"
+    for objective in objectives:
+        if not isinstance(objective, dict) or not isinstance(objective.get('id'), str):
+            return "quest objectives must be objects with string ids"
+    return None
+
+
+def find_quest(log, quest_id):
+    """Return the quest with ``quest_id`` in ``log`` or raise PatchConflict."""
+    for quest in log.get('quests', []):
+        if quest.get('id') == quest_id:
+            return quest
+    raise PatchConflict(f"Quest {quest_id} not found")
+
+
+def apply_log_ops(log, ops, now=None):
+    """Apply patch operations to a parsed quest log in place.
+
+    Supported operations:
+      {"op": "toggleObjective", "questId", "objectiveId", "completed"}  (stamps ``completedAt`` with ``now``)
+      {"op": "addQuest", "quest"}
+      {"op": "updateQuest", "questId", "quest"}  (merged into the existing quest)
+      {"op": "removeQuest", "questId"}
+      {"op": "renameLog", "name"}
+
+    Returns the ids of the quests that were touched.
+    """
+    if not isinstance(ops, list):
+        raise PatchError("ops must be a list")
+    changed = []
+    for op in ops:
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind == 'toggleObjective':
+            quest = find_quest(log, op.get('questId'))
+            for objective in quest.get('objectives', []):
+                if objective.get('id') == op.get('objectiveId'):
+                    objective['completed'] = bool(op.get('completed'))
+                    if objective['completed'] and now:
+                        objective['completedAt'] = now
+                    elif not objective['completed']:
+                        objective.pop('completedAt', None)
+                    break
+            else:
+                raise PatchConflict(f"Objective {op.get('objectiveId')} not found")
+            changed.append(quest.get('id'))
+        elif kind == 'addQuest':
+            quest = op.get('quest')
+            if not isinstance(quest, dict) or not quest.get('id'):
+                raise PatchError("addQuest requires a quest with an id")
+            problem = quest_shape_error(quest)
+            if problem:
+                raise PatchError(problem)
+            log.setdefault('quests', []).append(quest)
+            changed.append(quest['id'])
+        elif kind == 'updateQuest':
+            fields = op.get('quest')
+            if not isinstance(fields, dict):
+                raise PatchError("updateQuest requires quest fields")
+            quest = find_quest(log, op.get('questId'))
+            problem = quest_shape_error({**quest, **fields})
+            if problem:
+                raise PatchError(problem)
+            quest.update(fields)
+            quest['id'] = op.get('questId')
+            changed.append(quest['id'])
+        elif kind == 'removeQuest':
+            quest = find_quest(log, op.get('questId'))
+            log['quests'].remove(quest)
+            changed.append(quest.get('id'))
+        elif kind == 'renameLog':
+            if not op.get('name'):
+                raise PatchError("renameLog requires a name")
+            log['name'] = op['name']
+        else:
+            raise PatchError(f"Unknown patch operation: {kind}")
+    return changed
+
+
+class LogLocks:
+    """Per-log-id locks that hold across threads and, where supported, processes.
+
+    Threads in one process serialize on a ``threading.Lock`` per log id. Processes
+    (prefork mode) additionally take a POSIX byte-range lock on one byte of a
+    shared lock file, chosen by hashing the log id into ``LOCK_STRIPES`` slots.
+
+    Record locks belong to the process, not the thread: a second ``lockf`` on
+    a stripe the process already holds succeeds at once, and the first unlock
+    releases it for every thread. So each stripe counts its holders in this
+    process, takes the file lock when the first one arrives and releases it
+    when the last one leaves.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self.guard = threading.Lock()
+        self.locks = {}  # log id -> [lock, holders]
+        self.stripes = {}  # stripe -> [lock, holders in this process]
+        self.fd = None
+        self.fd_pid = None
+
+    @contextlib.contextmanager
+    def hold(self, log_id):
+        """Hold the exclusive lock for ``log_id`` for the duration of the block."""
+        with self.guard:
+            slot = self.locks.setdefault(log_id, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                stripe = zlib.crc32(str(log_id).encode('utf-8')) % LOCK_STRIPES
+                self._lock_stripe(stripe)
+                try:
+                    yield
+                finally:
+                    self._unlock_stripe(stripe)
+        finally:
+            with self.guard:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self.locks[log_id]
+
+    def _lock_stripe(self, stripe):
+        """Join this process's holders of a stripe, taking the inter-process lock if they are the first."""
+        if fcntl is None:
+            return
+        with self.guard:
+            # POSIX record locks belong to the process, so every forked worker
+            # opens its own descriptor and keeps it for its whole lifetime; the
+            # holder counts inherited from the parent do not carry its locks over.
+            if self.fd is None or self.fd_pid != os.getpid():
+                self.fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                self.fd_pid = os.getpid()
+                self.stripes = {}
+            entry = self.stripes.setdefault(stripe, [threading.Lock(), 0])
+            fd = self.fd
+        with entry[0]:
+            if not entry[1]:
+                fcntl.lockf(fd, fcntl.LOCK_EX, 1, stripe)
+            entry[1] += 1
+
+    def _unlock_stripe(self, stripe):
+        """Leave a stripe, releasing the inter-process lock once no thread of this process holds it."""
+        if fcntl is None:
+            return
+        with self.guard:
+            entry = self.stripes[stripe]
+            fd = self.fd
+        with entry[0]:
+            entry[1] -= 1
+            if not entry[1]:
+                fcntl.lockf(fd, fcntl.LOCK_UN, 1, stripe)
+
+
+def fsync_dir(dir_path):
+    """Flush a directory entry change (create, rename, unlink) to disk."""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Header of "binary" files: magic, format version, payload length and CRC-32 of the payload
+STORED_HEADER = struct.Struct('>4sB3xII')
+STORED_MAGIC = b'QLOG'
+STORED_VERSION = 1
+
+
+def encode_stored(data, file_format=None):
+    """Encode ``data`` for a file in ``file_format`` (FILE_FORMAT by default).
+
+    "json" files hold exactly what ``json.dumps`` returns, the API's wire
+    format; "binary" files prefix those bytes with ``STORED_HEADER``.
+    """
+    file_format = file_format or FILE_FORMAT
+    if file_format == "pretty":
+        return json.dumps(data, indent=2).encode('utf-8')
+    payload = json.dumps(data).encode('utf-8')
+    if file_format == "binary":
+        return STORED_HEADER.pack(STORED_MAGIC, STORED_VERSION, len(payload), zlib.crc32(payload)) + payload
+    return payload
+
+
+def stored_format(raw):
+    """Return the format ("json", "pretty" or "binary") a file's contents were written in."""
+    if raw.startswith(STORED_MAGIC):
+        return "binary"
+    # json.dumps escapes newlines inside strings, so only indented files contain any
+    return "pretty" if b'\n' in raw else "json"
+
+
+def stored_payload(raw):
+    """Return the JSON text of a file's contents, checking the header of binary files.
+
+    A damaged binary file raises ``json.JSONDecodeError``, as a damaged JSON
+    file would, so callers handle both alike.
+    """
+    if not raw.startswith(STORED_MAGIC):
+        return raw
+    if len(raw) < STORED_HEADER.size:
+        raise json.JSONDecodeError("Truncated binary header", '', 0)
+    _, version, length, crc = STORED_HEADER.unpack_from(raw)
+    if version != STORED_VERSION:
+        raise json.JSONDecodeError(f"Unsupported binary format version {version}", '', 0)
+    payload = raw[STORED_HEADER.size:]
+    if len(payload) != length or zlib.crc32(payload) != crc:
+        raise json.JSONDecodeError("Binary payload does not match its header", '', 0)
+    return payload
+
+
+def decode_stored(raw):
+    """Parse a file's contents in any of the formats."""
+    return json.loads(stored_payload(raw))
+
+
+def stored_wire_json(raw):
+    """Return a file's contents as ``json.dumps`` bytes, reusing them when they already are.
+
+    Binary payloads are trusted once their CRC matches; one-line JSON files
+    carry no checksum, so they are parsed to make sure they are whole.
+    Indented files have to be re-encoded.
+    """
+    file_format = stored_format(raw)
+    if file_format == "binary":
+        return stored_payload(raw)
+    data = json.loads(raw)
+    return raw if file_format == "json" else json.dumps(data).encode('utf-8')
+
+
+def read_stored(file_path):
+    """Read and parse a file written by ``write_json_atomic``, in any of the formats."""
+    with open(file_path, 'rb') as f:
+        return decode_stored(f.read())
+
+
+def write_json_atomic(file_path, data, durable=False, sync_dir=True, file_format=None):
+    """Write JSON to ``file_path`` via a temp file and rename, so readers never see partial files.
+
+    The file is encoded in ``file_format`` (FILE_FORMAT by default). With
+    ``durable`` the data and (unless ``sync_dir`` is false, for callers that
+    fsync the directory themselves) the rename are fsynced before returning.
+    """
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    encoded = encode_stored(data, file_format)
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    if durable and sync_dir:
+        fsync_dir(os.path.dirname(file_path) or '.')
+
+
+class FileLogStore:
+    """Stores each quest log as a JSON document in ``<logs_dir>/<id>.quest``.
+
+    In the ``sharded`` layout documents live in ``<logs_dir>/<a>/<b>/<id>.quest``
+    instead, where ``a`` and ``b`` are the first two hex digits of a hash of the
+    id, so each directory holds a 256th of the logs. Lookups fall back to the
+    other layout, which keeps every log reachable while ``migrate_log_layout``
+    moves files between layouts under a running server.
+    """
+
+    suffixes = ('.quest',)
+    appended_suffixes = ()  # files that change in place rather than by rename
+
+    def __init__(self, logs_dir, layout="flat"):
+        self.logs_dir = logs_dir
+        self.sharded = layout == "sharded"
+        self.shards = {}  # shard directory -> (mtime_ns, [(file name, signature)], settled)
+        self.lock = threading.Lock()
+
+    def shard_dir(self, log_id):
+        digest = hashlib.blake2b(log_id.encode('utf-8'), digest_size=1).hexdigest()
+        return os.path.join(self.logs_dir, digest[0], digest[1])
+
+    def candidates(self, log_id, suffix='.quest'):
+        """Return the two places a log file can be, the store's own layout first."""
+        name = f"{log_id}{suffix}"
+        flat = os.path.join(self.logs_dir, name)
+        sharded = os.path.join(self.shard_dir(log_id), name)
+        return (sharded, flat) if self.sharded else (flat, sharded)
+
+    def path(self, log_id, suffix='.quest'):
+        """Return where a log file is, or where a new one goes (creating its shard directory)."""
+        paths = self.candidates(log_id, suffix)
+        for path in paths:
+            if os.path.exists(path):
+                return path
+        if suffix != '.quest' and os.path.exists(self.candidates(log_id)[1]):
+            paths = paths[::-1]  # start a journal next to its snapshot, wherever that is
+        os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+        return paths[0]
+
+    def stat(self, log_id, suffix='.quest'):
+        """Return the ``os.stat`` result of a log file in either layout, or None if it is missing."""
+        primary, secondary = self.candidates(log_id, suffix)
+        for path in (primary, secondary, primary):  # a migration may move it between the checks
+            try:
+                return os.stat(path)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def open_file(self, log_id, suffix='.quest', mode='r'):
+        """Open a log file for reading in either layout, or return None if it is missing."""
+        primary, secondary = self.candidates(log_id, suffix)
+        for path in (primary, secondary, primary):
+            try:
+                return open(path, mode)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def version(self):
+        """Return a token that changes whenever logs are added or removed."""
+        try:
+            if self.sharded:
+                return tuple(mtime_ns for _, mtime_ns in self.directories())
+            return os.stat(self.logs_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def signature(self, log_id):
+        """Return a cheap stat-based token for a log's stored state, or None if it is missing."""
+        try:
+            st = self.stat(log_id)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size) if st else None
+
+    def scan(self):
+        """Yield ``(log_id, signature)`` for every stored log."""
+        for name, signature in self.files():
+            yield name[:-len('.quest')], signature
+
+    def directories(self):
+        """Return ``(path, mtime_ns)`` for the logs directory and every shard directory."""
+        found = [(self.logs_dir, os.stat(self.logs_dir).st_mtime_ns)]
+        for top in self._subdirectories(self.logs_dir):
+            for leaf in self._subdirectories(top):
+                with contextlib.suppress(OSError):
+                    found.append((leaf, os.stat(leaf).st_mtime_ns))
+        return found
+
+    def files(self, suffixes=None):
+        """Yield ``(file name, signature)`` for the log files of both layouts.
+
+        Files at the top level are always stat-ed. Shards are re-listed only when
+        their directory mtime moved, which every atomic write or delete in them
+        does; the others are answered from memory without touching their files.
+        """
+        suffixes = suffixes or self.suffixes
+        tops = []
+        with os.scandir(self.logs_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(suffixes):
+                    if len(entry.name) == 1 and entry.is_dir():
+                        tops.append(entry.path)
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield entry.name, (st.st_mtime_ns, st.st_size)
+        for top in tops:
+            for leaf in self._subdirectories(top):
+                for name, signature in self._shard_files(leaf):
+                    if name.endswith(suffixes):
+                        yield name, signature
+
+    def _subdirectories(self, path):
+        """Return the one-character shard directories inside ``path``."""
+        try:
+            with os.scandir(path) as it:
+                return [entry.path for entry in it if len(entry.name) == 1 and entry.is_dir()]
+        except OSError:
+            return []
+
+    def _shard_files(self, leaf):
+        """Return ``[(file name, signature)]`` for one shard, cached by the shard's mtime.
+
+        As for templates, a listing taken within a second of the mtime is not
+        trusted, since a change in the same clock tick would not move it.
+        """
+        try:
+            mtime_ns = os.stat(leaf).st_mtime_ns
+        except OSError:
+            return []
+        with self.lock:
+            cached = self.shards.get(leaf)
+        if cached is not None and cached[0] == mtime_ns and cached[2]:
+            files = cached[1]
+        else:
+            settled = time.time() - mtime_ns / 1e9 > 1.0
+            files = []
+            with os.scandir(leaf) as it:
+                for entry in it:
+                    if not entry.name.endswith(LOG_FILE_SUFFIXES):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((entry.name, (st.st_mtime_ns, st.st_size)))
+            with self.lock:
+                self.shards[leaf] = (mtime_ns, files, settled)
+        if not self.appended_suffixes:
+            return files
+        # Appended files grow without a rename, so their signatures are always re-read
+        current = []
+        for name, signature in files:
+            if name.endswith(self.appended_suffixes):
+                try:
+                    st = os.stat(os.path.join(leaf, name))
+                except OSError:
+                    continue
+                signature = (st.st_mtime_ns, st.st_size)
+            current.append((name, signature))
+        return current
+
+    def read(self, log_id):
+        """Return the parsed log, or None if it does not exist."""
+        raw = self.read_bytes(log_id)
+        return decode_stored(raw) if raw is not None else None
+
+    def read_json(self, log_id):
+        """Return the log as ``json.dumps`` bytes, or None if it does not exist."""
+        raw = self.read_bytes(log_id)
+        return stored_wire_json(raw) if raw is not None else None
+
+    def read_bytes(self, log_id):
+        """Return the raw contents of a log's file, or None if it does not exist."""
+        f = self.open_file(log_id, mode='rb')
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def write(self, log_id, log):
+        """Store the full state of a log."""
+        write_json_atomic(self.path(log_id), log)
+
+    def write_ops(self, log_id, log, ops):
+        """Store a log after ``ops`` were applied to it; ``log`` is the resulting state."""
+        self.write(log_id, log)
+
+    def write_many(self, logs, durable=False, locks=None):
+        """Store the full state of several logs.
+
+        With ``durable`` every file is fsynced and each directory is fsynced
+        once after all the renames, so the batch shares one directory commit.
+        With ``locks`` each log is written holding its own lock, for callers
+        that do not hold the locks already.
+        """
+        dirs = set()
+        for log in logs:
+            with locks.hold(log['id']) if locks else contextlib.nullcontext():
+                path = self.path(log['id'])
+                write_json_atomic(path, log, durable=durable, sync_dir=False)
+            dirs.add(os.path.dirname(path) or '.')
+        if durable:
+            for dir_path in dirs:
+                fsync_dir(dir_path)
+
+    def delete(self, log_id):
+        """Delete a log's files in either layout; returns False if it did not exist."""
+        existed = False
+        for suffix in self.suffixes:
+            for path in self.candidates(log_id, suffix):
+                try:
+                    os.remove(path)
+                    existed = True
+                except FileNotFoundError:
+                    pass
+        return existed
+
+    def relocate(self, log_id):
+        """Move a log's files into the store's layout and return how many moved.
+
+        Each file moves with one rename, so readers always find it in one of the
+        two places. Caller must hold the log's lock.
+        """
+        moved = 0
+        for suffix in LOG_FILE_SUFFIXES:
+            target, source = self.candidates(log_id, suffix)
+            if not os.path.exists(source):
+                continue
+            if os.path.exists(target):
+                print(f"Not moving {source}: {target} already exists")
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source, target)
+            moved += 1
+        return moved
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class GroupCommitter:
+    """Background thread that fsyncs appended journal data in groups.
+
+    Writers append to a journal, hand the descriptor to ``commit`` and block until
+    the next group fsync covers their write. All writes that arrive within one
+    ``JOURNAL_FSYNC_INTERVAL`` share a single fsync per file. If a group's fsync
+    fails, its writers get the error from ``wait`` and the thread carries on.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.cond = threading.Condition()
+        self.pending = []  # (path, fd, created)
+        self.submitted = 0
+        self.synced = 0
+        self.failures = collections.deque(maxlen=256)  # (first ticket, last ticket, OSError) of failed groups
+        self.thread = None
+        self.stopping = False
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="questlog-journal-sync", daemon=True)
+        self.thread.start()
+
+    def commit(self, path, fd, created):
+        """Queue ``fd`` for the next group fsync and wait for it; the fd is closed afterwards."""
+        self.wait(self.submit(path, fd, created))
+
+    def submit(self, path, fd, created):
+        """Queue ``fd`` for the next group fsync without waiting; returns a ticket for ``wait``."""
+        with self.cond:
+            self.pending.append((path, fd, created))
+            self.submitted += 1
+            self.cond.notify_all()
+            return self.submitted
+
+    def wait(self, ticket, first=None):
+        """Block until the fsync covering ``ticket`` (and every earlier one) is done.
+
+        Raises OSError if the group fsync of ``ticket``, or of any ticket from
+        ``first`` on, failed.
+        """
+        with self.cond:
+            while self.synced < ticket:
+                self.cond.wait()
+            for start, end, error in self.failures:
+                if start <= ticket and end >= (first or ticket):
+                    raise OSError(error.errno, f"Journal fsync failed: {error.strerror or error}")
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopping:
+                    self.cond.wait()
+                if not self.pending and self.stopping:
+                    return
+            time.sleep(self.interval)  # let concurrent writers join this group
+            with self.cond:
+                batch, self.pending = self.pending, []
+                first, ticket = self.synced + 1, self.submitted
+            synced_paths = set()
+            new_dirs = set()
+            error = None
+            for path, fd, created in batch:
+                try:
+                    if error is None and path not in synced_paths:
+                        os.fsync(fd)
+                        synced_paths.add(path)
+                    if created:
+                        new_dirs.add(os.path.dirname(path) or '.')
+                except OSError as e:
+                    error = e
+                finally:
+                    os.close(fd)
+            try:
+                if error is None:
+                    for dir_path in new_dirs:
+                        fsync_dir(dir_path)
+            except OSError as e:
+                error = e
+            with self.cond:
+                if error is not None:
+                    print(f"Journal fsync failed: {error}")
+                    self.failures.append((first, ticket, error))
+                self.synced = ticket
+                self.cond.notify_all()
+
+
+class JournalLogStore(FileLogStore):
+    """Append-only storage engine: a ``.quest`` snapshot plus a ``.journal`` of changes.
+
+    Every save or patch appends one JSON line to ``<id>.journal`` -- either the
+    full log (``{"rev", "log"}``) or the applied operations (``{"rev", "ops",
+    "updated"}``) -- and waits for a group fsync. Reads replay the journal tail on
+    top of the snapshot. A background compactor folds journals larger than
+    ``JOURNAL_COMPACT_BYTES`` into a new snapshot, which keeps the plain ``.quest``
+    format so exports and ``handle_get_log`` responses are unchanged.
+    """
+
+    suffixes = ('.quest', '.journal')
+    appended_suffixes = ('.journal',)
+
+    def __init__(self, logs_dir, locks, layout="flat"):
+        super().__init__(logs_dir, layout)
+        self.locks = locks
+        self.committer = None
+        self.compact_queue = []
+        self.compact_cond = threading.Condition()
+        self.compactor = None
+        self.stopping = False
+        self.started_pid = None
+
+    def start(self):
+        """Start the group-commit and compaction threads (again in each forked worker)."""
+        if self.started_pid == os.getpid():
+            return
+        self.started_pid = os.getpid()
+        self.compact_queue = []
+        self.committer = GroupCommitter(JOURNAL_FSYNC_INTERVAL)
+        self.committer.start()
+        self.compactor = threading.Thread(target=self._compact_loop, name="questlog-compactor", daemon=True)
+        self.compactor.start()
+
+    def close(self):
+        """Stop the background threads once queued commits and compactions are done."""
+        with self.compact_cond:
+            self.stopping = True
+            self.compact_cond.notify_all()
+        if self.started_pid != os.getpid():
+            return
+        self.compactor.join()
+        self.committer.stop()
+
+    def journal_path(self, log_id):
+        return self.path(log_id, '.journal')
+
+    def signature(self, log_id):
+        snapshot = super().signature(log_id)
+        try:
+            st = self.stat(log_id, '.journal')
+            journal = (st.st_mtime_ns, st.st_size) if st else None
+        except OSError:
+            journal = None
+        if snapshot is None and journal is None:
+            return None
+        return (snapshot, journal)
+
+    def scan(self):
+        found = {}
+        for name, signature in self.files():
+            if name.endswith('.quest'):
+                log_id, slot = name[:-len('.quest')], 0
+            else:
+                log_id, slot = name[:-len('.journal')], 1
+            found.setdefault(log_id, [None, None])[slot] = signature
+        for log_id, (snapshot, journal) in found.items():
+            yield log_id, (snapshot, journal)
+
+    def read(self, log_id):
+        # Retry if a compaction swapped the snapshot while we were reading
+        for _ in range(3):
+            before = super().signature(log_id)
+            log = self._replay(log_id)
+            if super().signature(log_id) == before:
+                return log
+        with self.locks.hold(log_id):
+            return self._replay(log_id)
+
+    def read_json(self, log_id):
+        if self.stat(log_id, '.journal') is None:
+            return super().read_json(log_id)
+        log = self.read(log_id)
+        return json.dumps(log).encode('utf-8') if log is not None else None
+
+    def write(self, log_id, log):
+        self._append(log_id, {'rev': log.get('revision', 0), 'log': log})
+
+    def write_ops(self, log_id, log, ops):
+        self._append(log_id, {'rev': log.get('revision', 0), 'ops': ops, 'updated': log.get('updated')})
+
+    def write_many(self, logs, durable=True, locks=None):
+        self._append_many([(log['id'], {'rev': log.get('revision', 0), 'log': log}) for log in logs], locks)
+
+    def compact(self, log_id):
+        """Fold a log's journal into a new snapshot. Caller must hold the log's lock."""
+        if self.stat(log_id, '.journal') is None:
+            return
+        snapshot, journal = self.path(log_id), self.journal_path(log_id)
+        log = self._replay(log_id)
+        if log is not None:
+            write_json_atomic(snapshot, log, durable=True)
+        os.remove(journal)
+        for dir_path in {os.path.dirname(snapshot), os.path.dirname(journal)}:
+            fsync_dir(dir_path)
+
+    def has_journals(self):
+        """Return True if any log still has a journal."""
+        return any(True for _ in self.files(('.journal',)))
+
+    def compact_all(self):
+        """Fold every journal in the logs directory into its snapshot."""
+        for name, _ in list(self.files(('.journal',))):
+            log_id = name[:-len('.journal')]
+            with self.locks.hold(log_id):
+                self.compact(log_id)
+
+    def _replay(self, log_id):
+        """Rebuild a log from its snapshot plus the journal records newer than it."""
+        log = super().read(log_id)
+        f = self.open_file(log_id, '.journal')
+        if f is None:
+            return log
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write from a crash; it was never acknowledged, so skip it
+                    continue
+                if log is not None and record.get('rev', 0) <= log.get('revision', 0):
+                    continue  # already folded into the snapshot
+                if 'log' in record:
+                    log = record['log']
+                elif log is not None:
+                    apply_log_ops(log, record.get('ops'), record.get('updated'))
+                    log['revision'] = record.get('rev')
+                    log['updated'] = record.get('updated')
+        return log
+
+    def _append(self, log_id, record):
+        """Append one record to the log's journal and wait for it to be durable."""
+        self._append_many([(log_id, record)])
+
+    def _append_many(self, records, locks=None):
+        """Append ``(log id, record)`` pairs to their journals and wait once for all to be durable.
+
+        With ``locks`` each append holds its log's lock, for callers that do not
+        hold the locks already.
+        """
+        self.start()
+        first = ticket = 0
+        grown = []
+        for log_id, record in records:
+            data = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+            with locks.hold(log_id) if locks else contextlib.nullcontext():
+                path = self.journal_path(log_id)
+                created = not os.path.exists(path)
+                fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    size = os.fstat(fd).st_size
+                    if size and os.pread(fd, 1, size - 1) != b'\n':
+                        data = b'\n' + data  # terminate a torn record left by a crash
+                    os.write(fd, data)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                ticket = self.committer.submit(path, fd, created)
+                first = first or ticket
+            if size + len(data) > JOURNAL_COMPACT_BYTES:
+                grown.append(log_id)
+        self.committer.wait(ticket, first)
+        with self.compact_cond:
+            for log_id in grown:
+                if log_id not in self.compact_queue:
+                    self.compact_queue.append(log_id)
+                    self.compact_cond.notify()
+
+    def _compact_loop(self):
+        while True:
+            with self.compact_cond:
+                while not self.compact_queue and not self.stopping:
+                    self.compact_cond.wait()
+                if not self.compact_queue:
+                    return
+                log_id = self.compact_queue.pop(0)
+            try:
+                with self.locks.hold(log_id):
+                    self.compact(log_id)
+            except (json.JSONDecodeError, PatchError, IOError) as e:
+                print(f"Error compacting journal for {log_id}: {e}")
+
+
+class WriteBehindLogStore:
+    """Log store wrapper that accepts writes at once and flushes them in batches.
+
+    Writes and deletes land in ``pending``, keyed by log id, so repeated saves
+    of one log within the window collapse into its latest state. A background
+    writer flushes them at most ``delay`` seconds after the first one arrived
+    (sooner once ``WRITE_BEHIND_BATCH`` logs are dirty) with one durable
+    ``write_many``. Reads look at the pending and
+    in-flight batches before the wrapped store, so they always see the newest
+    accepted state, and ``close`` flushes whatever is left. The batches live in
+    one process's memory, so prefork mode cannot use it.
+    """
+
+    DELETED = object()  # pending marker for a deleted log
+    MISSING = object()
+
+    def __init__(self, store, locks, delay):
+        self.store = store
+        self.locks = locks
+        self.delay = delay
+        self.cond = threading.Condition()
+        self.pending = {}  # log id -> latest accepted log, or DELETED
+        self.flushing = {}  # the batch being written right now
+        self.signatures = {}  # log id -> stand-in signature of its newest accepted state
+        self.stored = {}  # log id -> store signature right after the flush that wrote that state
+        self.first_pending = None
+        self.sequence = 0
+        self.generation = 0
+        self.thread = None
+        self.stopping = False
+        self.started_pid = None
+
+    def start(self):
+        """Start the wrapped store and the background writer (again in a forked process)."""
+        self.store.start()
+        with self.cond:
+            if self.started_pid == os.getpid():
+                return
+            self.started_pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name="questlog-write-behind", daemon=True)
+            self.thread.start()
+
+    def close(self):
+        """Flush everything still pending, then close the wrapped store.
+
+        Whatever the background writer could not store is written here once
+        more. Those writes were already acknowledged, so if this fails too the
+        error is raised rather than dropping them quietly.
+        """
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        if self.thread is not None and self.started_pid == os.getpid():
+            self.thread.join()
+        with self.cond:
+            batch, self.pending, self.first_pending = self.pending, {}, None
+        try:
+            if batch:
+                self._flush(batch)
+        except Exception as e:
+            raise IOError(f"{len(batch)} acknowledged quest log writes could not be stored: {e}") from e
+        finally:
+            self.store.close()
+
+    def version(self):
+        with self.cond:
+            generation = self.generation
+        return (self.store.version(), generation)
+
+    def signature(self, log_id):
+        """Return the stand-in signature of a log written through here, unless it changed since.
+
+        Keeping the stand-in after the flush spares the index from re-reading
+        every flushed log; a change made outside the server still shows.
+        """
+        with self.cond:
+            latest = self._latest(log_id)
+            if latest is not self.MISSING:
+                return None if latest is self.DELETED else self.signatures[log_id]
+            stored = self.stored.get(log_id)
+        signature = self.store.signature(log_id)
+        if stored is not None and signature == stored:
+            with self.cond:
+                return self.signatures.get(log_id, signature)
+        return signature
+
+    def scan(self):
+        with self.cond:
+            overlay = {**self.flushing, **self.pending}
+            signatures = dict(self.signatures)
+            stored = dict(self.stored)
+        for log_id, signature in self.store.scan():
+            if log_id not in overlay:
+                yield log_id, signatures[log_id] if stored.get(log_id) == signature else signature
+        for log_id, log in overlay.items():
+            if log is not self.DELETED:
+                yield log_id, signatures[log_id]
+
+    def read(self, log_id):
+        with self.cond:
+            latest = self._latest(log_id)
+        if latest is self.DELETED:
+            return None
+        if latest is not self.MISSING:
+            return copy_json(latest)  # callers modify what they read
+        return self.store.read(log_id)
+
+    def read_json(self, log_id):
+        with self.cond:
+            latest = self._latest(log_id)
+        if latest is self.DELETED:
+            return None
+        if latest is not self.MISSING:
+            return json.dumps(latest).encode('utf-8')
+        return self.store.read_json(log_id)
+
+    def write(self, log_id, log):
+        self._enqueue([(log_id, log)])
+
+    def write_ops(self, log_id, log, ops):
+        self._enqueue([(log_id, log)])
+
+    def write_many(self, logs, durable=False, locks=None):
+        self._enqueue([(log['id'], log) for log in logs])
+
+    def delete(self, log_id):
+        with self.cond:
+            latest = self._latest(log_id)
+        if latest is self.DELETED:
+            return False
+        if latest is self.MISSING and self.store.signature(log_id) is None:
+            return False
+        self._enqueue([(log_id, self.DELETED)])
+        return True
+
+    def _latest(self, log_id):
+        """Return the newest accepted state not yet stored, DELETED or MISSING. Caller holds ``cond``."""
+        latest = self.pending.get(log_id, self.MISSING)
+        if latest is self.MISSING:
+            latest = self.flushing.get(log_id, self.MISSING)
+        return latest
+
+    def _enqueue(self, items):
+        self.start()
+        with self.cond:
+            if not self.stopping:
+                for log_id, log in items:
+                    self.sequence += 1
+                    self.pending[log_id] = log
+                    # Unique per accepted write; the mtime part feeds Last-Modified
+                    self.signatures[log_id] = (time.time_ns(), -self.sequence)
+                if self.first_pending is None:
+                    self.first_pending = time.monotonic()
+                self.generation += 1
+                self.cond.notify_all()
+                return
+        # Shutting down: write straight through
+        for log_id, log in items:
+            if log is self.DELETED:
+                self.store.delete(log_id)
+            else:
+                self.store.write(log_id, log)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopping:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                deadline = self.first_pending + self.delay
+                while not self.stopping and len(self.pending) < WRITE_BEHIND_BATCH and time.monotonic() < deadline:
+                    self.cond.wait(deadline - time.monotonic())
+                batch = self.flushing = self.pending
+                self.pending, self.first_pending = {}, None
+            failed = False
+            try:
+                self._flush(batch)
+                written = {log_id: self.store.signature(log_id) for log_id in batch}
+            except Exception as e:
+                written, failed = {}, True
+                print(f"Error flushing {len(batch)} quest logs: {e}")
+                with self.cond:
+                    # Keep them dirty behind any newer state and retry after the next delay,
+                    # or leave them to close() when shutting down
+                    for log_id, log in batch.items():
+                        self.pending.setdefault(log_id, log)
+                    self.first_pending = self.first_pending or time.monotonic()
+            with self.cond:
+                self.flushing = {}
+                for log_id, signature in written.items():
+                    if log_id in self.pending:
+                        continue
+                    if signature is None:
+                        self.signatures.pop(log_id, None)
+                        self.stored.pop(log_id, None)
+                    else:
+                        self.stored[log_id] = signature
+                self.generation += 1
+                self.cond.notify_all()
+                if failed and self.stopping:
+                    return
+
+    def _flush(self, batch):
+        """Store one batch as a single durable group.
+
+        Each log's lock is held only while its own files are written, so
+        requests for the other logs of the batch never wait on the flush.
+        """
+        writes = [log for log in batch.values() if log is not self.DELETED]
+        if writes:
+            self.store.write_many(writes, durable=True, locks=self.locks)
+        for log_id, log in batch.items():
+            if log is self.DELETED:
+                with self.locks.hold(log_id):
+                    self.store.delete(log_id)
+
+
+def version_token(*parts):
+    """Hash ``parts`` into a short token for use in strong ETags."""
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def signature_mtime(signature):
+    """Return the newest mtime (in seconds) recorded in a store signature."""
+    if signature is None:
+        return 0.0
+    if isinstance(signature[0], int):
+        return signature[0] / 1e9
+    return max(signature_mtime(part) for part in signature)
+
+
+class LogIndex:
+    """In-memory summary index of the quest logs in a log store.
+
+    Entries map a log id to ``(signature, summary)``, where the signature is the
+    store's stat-based token for the stored files. The index is built once at
+    startup, updated in place by the handlers that write logs, and revalidated
+    against the signatures so logs changed outside the server are picked up
+    without re-parsing unchanged ones.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.store_version = None
+        self.validated_at = 0.0
+        self.digest = None  # (token, last modified) of the whole index, rebuilt after changes
+        self.orders = {}  # sort name -> ascending [(key, id)] list, rebuilt after changes
+
+    def build(self):
+        """Scan the store and (re)build every entry."""
+        with self.lock:
+            self.entries = {}
+            self._revalidate()
+
+    def refresh(self):
+        """Revalidate the index if the store changed or the index is stale."""
+        with self.lock:
+            stale = time.monotonic() - self.validated_at > INDEX_REVALIDATE_SECONDS
+            if self.store.version() != self.store_version or stale:
+                self._revalidate()
+
+    def update(self, log_id, log):
+        """Record a log that was just written by the server."""
+        signature = self.store.signature(log_id)
+        if signature is None:
+            return
+        summary = self._summarize(log_id, log)
+        with self.lock:
+            if summary is None:
+                self.entries.pop(log_id, None)
+            else:
+                self.entries[log_id] = (signature, summary)
+            self.digest = None
+
+    def get(self, log_id):
+        """Return the summary of one log, revalidating only that log."""
+        entry = self.entry(log_id)
+        return entry[1] if entry else None
+
+    def entry(self, log_id):
+        """Return ``(signature, summary)`` for one log, revalidating only that log."""
+        signature = self.store.signature(log_id)
+        if signature is None:
+            self.remove(log_id)
+            return None
+        with self.lock:
+            cached = self.entries.get(log_id)
+            if cached and cached[0] == signature:
+                return cached
+        try:
+            log = self.store.read(log_id)
+        except (json.JSONDecodeError, PatchError, IOError):
+            return None
+        summary = self._summarize(log_id, log) if log is not None else None
+        if summary is None:
+            return None
+        entry = (signature, summary)
+        with self.lock:
+            self.entries[log_id] = entry
+            self.digest = None
+        return entry
+
+    def remove(self, log_id):
+        """Forget a log that was just deleted by the server."""
+        with self.lock:
+            if self.entries.pop(log_id, None) is not None:
+                self.digest = None
+
+    def version(self):
+        """Return ``(token, last modified)`` describing the current contents of the index."""
+        self.refresh()
+        with self.lock:
+            if self.digest is None:
+                self.orders = {}
+                self._compute_digest()
+            return self.digest
+
+    def _summarize(self, log_id, log):
+        """Summarize a log under the id it is stored as, which is the one its URL uses.
+
+        Returns None for a log too malformed to summarize; the index leaves it
+        out rather than failing every listing.
+        """
+        try:
+            summary = summarize_log(log)
+        except (AttributeError, TypeError, ValueError) as e:
+            print(f"Error summarizing quest log {log_id}: {e}")
+            return None
+        summary['id'] = log_id
+        return summary
+
+    def _compute_digest(self):
+        items = sorted((log_id, entry[0], entry[1]['revision']) for log_id, entry in self.entries.items())
+        latest = max((signature_mtime(item[1]) for item in items), default=0.0)
+        self.digest = (version_token(items), latest)
+
+    def summaries(self):
+        """Return the summaries of all indexed logs."""
+        self.refresh()
+        with self.lock:
+            return [entry[1] for entry in self.entries.values()]
+
+    def page(self, sort, descending=False, after=None, limit=None):
+        """Return up to ``limit`` summaries in ``sort`` order, starting after the ``(key, id)`` position."""
+        self.refresh()
+        with self.lock:
+            if self.digest is None:
+                # The index changed since the orders were built
+                self.orders = {}
+                self._compute_digest()
+            order = self.orders.get(sort)
+            if order is None:
+                key = LIST_SORT_KEYS[sort]
+                order = sorted((key(entry[1]), log_id) for log_id, entry in self.entries.items())
+                self.orders[sort] = order
+            if descending:
+                end = bisect.bisect_left(order, after) if after else len(order)
+                start = max(0, end - limit) if limit else 0
+                positions = reversed(order[start:end])
+            else:
+                start = bisect.bisect_right(order, after) if after else 0
+                positions = order[start:start + limit] if limit else order[start:]
+            return [self.entries[log_id][1] for _, log_id in positions]
+
+    def _revalidate(self):
+        """Check every stored log's signature and re-read only the ones that changed."""
+        self.store_version = self.store.version()
+        seen = set()
+        for log_id, signature in self.store.scan():
+            seen.add(log_id)
+            cached = self.entries.get(log_id)
+            if cached and cached[0] == signature:
+                continue
+            try:
+                log = self.store.read(log_id)
+            except (json.JSONDecodeError, PatchError, IOError) as e:
+                print(f"Error reading quest log {log_id}: {e}")
+                self.entries.pop(log_id, None)
+                continue
+            summary = self._summarize(log_id, log) if log is not None else None
+            if summary is None:
+                self.entries.pop(log_id, None)
+                continue
+            self.entries[log_id] = (signature, summary)
+            self.digest = None
+        for log_id in set(self.entries) - seen:
+            del self.entries[log_id]
+            self.digest = None
+        self.validated_at = time.monotonic()
+
+
+class StorageBackend:
+    """Interface for persisting quest logs and templates.
+
+    Logs are passed around as the same dicts the API sends and receives. Callers
+    hold ``LOG_LOCKS`` around read-modify-write sequences on one log id; backends
+    only have to make each individual call atomic.
+    """
+
+    def open(self):
+        """Prepare the backend for serving (build indexes, start threads)."""
+
+    def close(self):
+        """Flush pending work and release resources."""
+
+    def get_log(self, log_id):
+        """Return the full log, or None if it does not exist."""
+        raise NotImplementedError
+
+    def get_log_json(self, log_id, cached=True):
+        """Return the log encoded as by ``json.dumps``, in UTF-8, or None if it does not exist.
+
+        ``cached=False`` is for scans over many logs, which should not push
+        everything else out of a backend's cache.
+        """
+        log = self.get_log(log_id)
+        return json.dumps(log).encode('utf-8') if log is not None else None
+
+    def cache_stats(self):
+        """Return the counters of the backend's log cache, or None if it has none."""
+        return None
+
+    def log_summary(self, log_id):
+        """Return the listing summary of one log, or None if it does not exist."""
+        raise NotImplementedError
+
+    def put_log(self, log):
+        """Store the full state of a log."""
+        raise NotImplementedError
+
+    def patch_log(self, log_id, log, ops):
+        """Store ``log``, read as ``log_id``, after ``ops`` were applied to it; backends may persist just the ops."""
+        self.put_log(log)
+
+    def put_logs(self, logs):
+        """Store several logs in one batch; backends may share one write or transaction."""
+        for log in logs:
+            self.put_log(log)
+
+    def delete_log(self, log_id):
+        """Delete a log; returns False if it did not exist."""
+        raise NotImplementedError
+
+    def list_logs(self, sort='updated', descending=False, after=None, limit=None):
+        """Return log summaries ordered by ``LIST_SORT_KEYS[sort]`` then id.
+
+        ``after`` is a ``(key, id)`` position from a previous page; only logs
+        strictly after it (in the requested direction) are returned.
+        """
+        raise NotImplementedError
+
+    def log_version(self, log_id):
+        """Return ``(token, last modified)`` for one log without reading it, or None if missing."""
+        raise NotImplementedError
+
+    def logs_version(self):
+        """Return ``(token, last modified)`` that changes whenever any log changes."""
+        raise NotImplementedError
+
+    def templates_version(self):
+        """Return ``(token, last modified)`` that changes whenever any template changes."""
+        raise NotImplementedError
+
+    def get_template(self, template_id):
+        """Return a full template, or None if it does not exist."""
+        raise NotImplementedError
+
+    def put_template(self, template):
+        """Store a template."""
+        raise NotImplementedError
+
+    def list_templates(self):
+        """Return ``{'id', 'name', 'description'}`` for every template."""
+        raise NotImplementedError
+
+    def progress_totals(self):
+        """Return the completion aggregates of all logs added up (see ``total_progress``)."""
+        return total_progress(self.list_logs())
+
+
+def total_progress(summaries):
+    """Add up the progress aggregates of log summaries.
+
+    A log counts as completed once it has quests and every one of them is.
+    ``completedByDay`` is merged across logs.
+    """
+    totals = {'logCount': 0, 'questCount': 0, 'objectiveCount': 0, 'completedCount': 0,
+              'completedQuestCount': 0, 'completedLogCount': 0, 'lastCompletedAt': None,
+              'completedByDay': {}}
+    by_day = totals['completedByDay']
+    for summary in summaries:
+        totals['logCount'] += 1
+        for key in ('questCount', 'objectiveCount', 'completedCount', 'completedQuestCount'):
+            totals[key] += summary.get(key) or 0
+        if summary.get('questCount') and summary.get('completedQuestCount') == summary.get('questCount'):
+            totals['completedLogCount'] += 1
+        if summary.get('lastCompletedAt'):
+            totals['lastCompletedAt'] = max(totals['lastCompletedAt'] or '', summary['lastCompletedAt'])
+        for day, count in (summary.get('completedByDay') or {}).items():
+            by_day[day] = by_day.get(day, 0) + count
+    return totals
+
+
+def progress_report(totals, today):
+    """Build the /api/stats response from ``total_progress`` output as of the date ``today``.
+
+    ``completedByDay`` is filled out to one entry per day of the last
+    ``STATS_RECENT_DAYS`` days, oldest first.
+    """
+    days = [(today - timedelta(days=n)).isoformat() for n in range(STATS_RECENT_DAYS)]
+    counts = [totals['completedByDay'].get(day, 0) for day in days]
+    report = dict(totals)
+    report['completedByDay'] = dict(zip(reversed(days), reversed(counts)))
+    report['recentlyCompleted'] = {'today': counts[0], 'last7Days': sum(counts[:7]), 'last30Days': sum(counts[:30])}
+    return report
+
+
+def copy_json(value):
+    """Deep-copy a parsed JSON value (dicts, lists and scalars) faster than ``copy.deepcopy``."""
+    if isinstance(value, dict):
+        return {key: copy_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_json(item) for item in value]
+    return value
+
+
+class LogCache:
+    """Byte-budgeted LRU cache of quest logs, kept as their encoded JSON response bytes.
+
+    Each entry remembers the store signature the log was read at, so a log
+    changed outside the server is a miss rather than a stale hit; the
+    handlers discard entries when they write or delete a log. The encoded
+    form is about a quarter of the size of the parsed dicts, is sent as-is by
+    ``GET /api/log/<id>`` and parses back (in C) faster than the file can be
+    re-read, so nothing is kept as Python objects.
+    """
+
+    ENTRY_BYTES = 200  # Rough per-entry cost of the key, tuple and dict slot on top of the body
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # log id -> (signature, body, size), oldest first
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, log_id, signature):
+        """Return the cached body of a log if it was cached at ``signature``, else None."""
+        with self.lock:
+            entry = self.entries.get(log_id)
+            if entry is None or entry[0] != signature:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(log_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, log_id, signature, body):
+        """Cache ``body`` as read at ``signature``, evicting the least recently used logs.
+
+        Logs written within the last second are not cached: another write in
+        the same filesystem clock tick could leave the signature unchanged.
+        """
+        size = len(body) + self.ENTRY_BYTES
+        if time.time() - signature_mtime(signature) <= 1.0:
+            return
+        with self.lock:
+            old = self.entries.pop(log_id, None)
+            if old is not None:
+                self.size -= old[2]
+            if size > self.max_bytes:
+                return
+            self.entries[log_id] = (signature, body, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def discard(self, log_id):
+        """Drop a log that is being written or deleted."""
+        with self.lock:
+            entry = self.entries.pop(log_id, None)
+            if entry is not None:
+                self.size -= entry[2]
+
+    def stats(self):
+        """Return the hit, miss and eviction counters and the current size."""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self.entries), 'bytes': self.size, 'maxBytes': self.max_bytes}
+
+
+class TemplateCache:
+    """Parsed templates of a templates directory, reloaded only when the directory changes.
+
+    Templates are written with ``os.replace``, so every add, update or removal
+    bumps the directory mtime; a ``stat`` of the directory is all a request
+    costs while it is unchanged. A load that happens within a second of the
+    mtime is not trusted, since a change in the same filesystem clock tick
+    would leave the mtime as it was. The cached templates are never handed out
+    directly: ``get`` returns a deep copy that the caller may modify.
+    """
+
+    def __init__(self, templates_dir):
+        self.templates_dir = templates_dir
+        self.lock = threading.Lock()
+        self.loaded = None  # (directory mtime_ns, {id: template}, [summaries], version, settled)
+
+    def get(self, template_id):
+        """Return a private copy of one template, or None."""
+        template = self._load()[1].get(template_id)
+        return copy_json(template) if template is not None else None
+
+    def summaries(self):
+        """Return ``[{id, name, description}]`` for every template."""
+        return [dict(summary) for summary in self._load()[2]]
+
+    def version(self):
+        """Return ``(token, last modified)`` of the directory contents."""
+        return self._load()[3]
+
+    def _load(self):
+        mtime_ns = os.stat(self.templates_dir).st_mtime_ns
+        loaded = self.loaded
+        if loaded is not None and loaded[0] == mtime_ns and loaded[4]:
+            return loaded
+        with self.lock:
+            if self.loaded is not None and self.loaded[0] == mtime_ns and self.loaded[4]:
+                return self.loaded
+            settled = time.time() - mtime_ns / 1e9 > 1.0
+            templates, files = {}, []
+            with os.scandir(self.templates_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.quest'):
+                        continue
+                    try:
+                        st = entry.stat()
+                        template = read_stored(entry.path)
+                    except (json.JSONDecodeError, IOError) as e:
+                        print(f"Error reading template {entry.name}: {e}")
+                        continue
+                    templates[entry.name[:-len('.quest')]] = template
+                    files.append((entry.name, st.st_mtime_ns, st.st_size))
+            files.sort()
+            summaries = [{'id': template.get('id'), 'name': template.get('name'),
+                          'description': template.get('description', '')}
+                         for template in templates.values()]
+            version = (version_token(files), max((f[1] / 1e9 for f in files), default=0.0))
+            self.loaded = (mtime_ns, templates, summaries, version, settled)
+            return self.loaded
+
+
+class DirectoryBackend(StorageBackend):
+    """Stores logs and templates as ``.quest`` files under the data directory.
+
+    Logs go through a log store (plain files or the journal engine) and are
+    listed from an in-memory ``LogIndex``; with ``cache_bytes`` set, recently
+    read logs are served from a ``LogCache``. Templates are one file each in
+    ``templates_dir``, served from a ``TemplateCache``.
+    """
+
+    def __init__(self, log_store, templates_dir, cache_bytes=0):
+        self.store = log_store
+        self.index = LogIndex(log_store)
+        self.cache = LogCache(cache_bytes) if cache_bytes > 0 else None
+        self.templates_dir = templates_dir
+        self.templates = TemplateCache(templates_dir)
+
+    def open(self):
+        self.store.start()
+        self.index.build()
+
+    def close(self):
+        self.store.close()
+
+    def get_log(self, log_id):
+        if self.cache is not None:
+            signature = self.store.signature(log_id)
+            body = self.cache.get(log_id, signature) if signature is not None else None
+            if body is not None:
+                return json.loads(body)
+        return self.store.read(log_id)
+
+    def get_log_json(self, log_id, cached=True):
+        if self.cache is None:
+            return self.store.read_json(log_id)
+        signature = self.store.signature(log_id)
+        if signature is None:
+            return None
+        body = self.cache.get(log_id, signature)
+        if body is None:
+            body = self.store.read_json(log_id)
+            if body is None:
+                return None
+            if cached:
+                self.cache.put(log_id, signature, body)
+        return body
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
+
+    def log_summary(self, log_id):
+        return self.index.get(log_id)
+
+    def put_log(self, log):
+        self._discard(log['id'])
+        self.store.write(log['id'], log)
+        self.index.update(log['id'], log)
+
+    def patch_log(self, log_id, log, ops):
+        self._discard(log_id)
+        self.store.write_ops(log_id, log, ops)
+        self.index.update(log_id, log)
+
+    def put_logs(self, logs):
+        for log in logs:
+            self._discard(log['id'])
+        self.store.write_many(logs)
+        for log in logs:
+            self.index.update(log['id'], log)
+
+    def delete_log(self, log_id):
+        self._discard(log_id)
+        deleted = self.store.delete(log_id)
+        self.index.remove(log_id)
+        return deleted
+
+    def _discard(self, log_id):
+        if self.cache is not None:
+            self.cache.discard(log_id)
+
+    def list_logs(self, sort='updated', descending=False, after=None, limit=None):
+        return self.index.page(sort, descending, after, limit)
+
+    def progress_totals(self):
+        return total_progress(self.index.summaries())
+
+    def log_version(self, log_id):
+        entry = self.index.entry(log_id)
+        if entry is None:
+            return None
+        signature, summary = entry
+        return version_token(log_id, signature, summary['revision']), signature_mtime(signature)
+
+    def logs_version(self):
+        return self.index.version()
+
+    def templates_version(self):
+        return self.templates.version()
+
+    def get_template(self, template_id):
+        return self.templates.get(template_id)
+
+    def put_template(self, template):
+        write_json_atomic(os.path.join(self.templates_dir, f"{template['id']}.quest"), template)
+
+    def list_templates(self):
+        return self.templates.summaries()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    revision INTEGER NOT NULL DEFAULT 0,
+    created TEXT,
+    updated TEXT,
+    quest_count INTEGER NOT NULL DEFAULT 0,
+    objective_count INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    extra TEXT,
+    modified REAL,
+    completed_quest_count INTEGER NOT NULL DEFAULT 0,
+    last_completed TEXT,
+    completed_by_day TEXT
+);
+CREATE TABLE IF NOT EXISTS quests (
+    log_id TEXT NOT NULL REFERENCES logs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    id TEXT,
+    title TEXT,
+    description TEXT,
+    created TEXT,
+    updated TEXT,
+    extra TEXT,
+    PRIMARY KEY (log_id, position)
+);
+CREATE TABLE IF NOT EXISTS objectives (
+    log_id TEXT NOT NULL,
+    quest_position INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    id TEXT,
+    title TEXT,
+    completed INTEGER NOT NULL DEFAULT 0,
+    extra TEXT,
+    PRIMARY KEY (log_id, quest_position, position),
+    FOREIGN KEY (log_id, quest_position) REFERENCES quests(log_id, position) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS templates (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('generation', 0), ('modified', 0);
+CREATE INDEX IF NOT EXISTS logs_updated ON logs(COALESCE(updated, ''), id);
+CREATE INDEX IF NOT EXISTS logs_created ON logs(COALESCE(created, ''), id);
+CREATE INDEX IF NOT EXISTS logs_name ON logs(lower(COALESCE(name, '')), id);
+CREATE INDEX IF NOT EXISTS quests_id ON quests(log_id, id);
+CREATE INDEX IF NOT EXISTS objectives_completed ON objectives(completed);
+"""
+
+# SQL equivalents of LIST_SORT_KEYS; they match the expression indexes above
+SQLITE_SORT_EXPRESSIONS = {
+    'updated': "COALESCE(updated, '')",
+    'created': "COALESCE(created, '')",
+    'name': "lower(COALESCE(name, ''))",
+}
+
+# Columns read into a listing summary by SQLiteBackend._summary
+SQLITE_SUMMARY_COLUMNS = ("id, name, quest_count, objective_count, completed_count, revision, created, updated, "
+                          "completed_quest_count, last_completed, completed_by_day")
+
+LOG_COLUMNS = ('id', 'name', 'quests', 'revision', 'created', 'updated')
+QUEST_COLUMNS = ('id', 'title', 'description', 'objectives', 'created', 'updated')
+OBJECTIVE_COLUMNS = ('id', 'title', 'completed')
+
+
+def split_extra(item, columns):
+    """Return the keys of ``item`` that have no column of their own, as JSON (or None)."""
+    extra = {key: value for key, value in item.items() if key not in columns}
+    return json.dumps(extra) if extra else None
+
+
+class SQLiteBackend(StorageBackend):
+    """Stores logs and templates in an embedded SQLite database in WAL mode.
+
+    Quests and objectives live in their own indexed tables and each log row
+    carries its quest/objective/completed counts, so listings and aggregates are
+    single queries. Keys that have no column are kept as JSON in ``extra`` so
+    logs round-trip unchanged. Each thread (and forked process) gets its own
+    connection.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Run the block in a write transaction on this thread's connection.
+
+        Every transaction bumps the ``generation`` counter in ``meta``, which is
+        what listing and template validators are derived from.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'modified'", (time.time(),))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def open(self):
+        conn = self.connection()
+        conn.executescript(SQLITE_SCHEMA)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(logs)")]
+        if 'modified' not in columns:
+            conn.execute("ALTER TABLE logs ADD COLUMN modified REAL")
+        if 'completed_quest_count' not in columns:
+            conn.execute("ALTER TABLE logs ADD COLUMN completed_quest_count INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE logs ADD COLUMN last_completed TEXT")
+            conn.execute("ALTER TABLE logs ADD COLUMN completed_by_day TEXT")
+            self._backfill_progress()
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None and self.local.pid == os.getpid():
+            conn.close()
+            self.local.conn = None
+
+    def get_log(self, log_id):
+        conn = self.connection()
+        row = conn.execute("SELECT id, name, revision, created, updated, extra FROM logs WHERE id = ?",
+                           (log_id,)).fetchone()
+        if row is None:
+            return None
+        objectives = {}
+        for quest_position, obj_id, title, completed, extra in conn.execute(
+                "SELECT quest_position, id, title, completed, extra FROM objectives "
+                "WHERE log_id = ? ORDER BY quest_position, position", (log_id,)):
+            objective = {'id': obj_id, 'title': title, 'completed': bool(completed)}
+            if extra:
+                objective.update(json.loads(extra))
+            objectives.setdefault(quest_position, []).append(objective)
+        quests = []
+        for position, quest_id, title, description, created, updated, extra in conn.execute(
+                "SELECT position, id, title, description, created, updated, extra FROM quests "
+                "WHERE log_id = ? ORDER BY position", (log_id,)):
+            quest = {'id': quest_id, 'title': title, 'description': description,
+                     'objectives': objectives.get(position, []), 'created': created, 'updated': updated}
+            quest = {key: value for key, value in quest.items() if value is not None}
+            if extra:
+                quest.update(json.loads(extra))
+            quests.append(quest)
+        log = {'id': row[0], 'name': row[1], 'quests': quests, 'created': row[3], 'updated': row[4],
+               'revision': row[2]}
+        log = {key: value for key, value in log.items() if value is not None}
+        if row[5]:
+            log.update(json.loads(row[5]))
+        return log
+
+    def log_summary(self, log_id):
+        row = self.connection().execute(
+            f"SELECT {SQLITE_SUMMARY_COLUMNS} FROM logs WHERE id = ?", (log_id,)).fetchone()
+        return self._summary(row) if row else None
+
+    def put_log(self, log):
+        with self.transaction() as conn:
+            self._insert_logs(conn, [log])
+
+    def put_logs(self, logs):
+        with self.transaction() as conn:
+            self._insert_logs(conn, logs)
+
+    def patch_log(self, log_id, log, ops):
+        if any(op.get('op') != 'toggleObjective' for op in ops):
+            self.put_log(log)
+            return
+        # Objective toggles only touch their own rows and the log's counters
+        summary = summarize_log(log)
+        objectives = {(quest.get('id'), objective.get('id')): objective
+                      for quest in log.get('quests') or [] for objective in quest.get('objectives') or []}
+        with self.transaction() as conn:
+            for op in ops:
+                objective = objectives.get((op.get('questId'), op.get('objectiveId')), {})
+                conn.execute(
+                    "UPDATE objectives SET completed = ?, extra = ? WHERE log_id = ? AND id = ? AND quest_position = "
+                    "(SELECT position FROM quests WHERE log_id = ? AND id = ?)",
+                    (int(bool(op.get('completed'))), split_extra(objective, OBJECTIVE_COLUMNS),
+                     log_id, op.get('objectiveId'), log_id, op.get('questId')))
+            conn.execute("UPDATE logs SET revision = ?, updated = ?, completed_count = ?, completed_quest_count = ?, "
+                         "last_completed = ?, completed_by_day = ?, modified = ? WHERE id = ?",
+                         (log.get('revision', 0), log.get('updated'), summary['completedCount'],
+                          summary['completedQuestCount'], summary['lastCompletedAt'],
+                          json.dumps(summary['completedByDay']), time.time(), log_id))
+
+    def delete_log(self, log_id):
+        with self.transaction() as conn:
+            cursor = conn.execute("DELETE FROM logs WHERE id = ?", (log_id,))
+        return cursor.rowcount > 0
+
+    def list_logs(self, sort='updated', descending=False, after=None, limit=None):
+        key = SQLITE_SORT_EXPRESSIONS[sort]
+        direction = "DESC" if descending else "ASC"
+        sql = f"SELECT {SQLITE_SUMMARY_COLUMNS} FROM logs"
+        params = []
+        if after:
+            # Spelled out rather than as a row value so SQLite can seek in the expression index
+            op = '<' if descending else '>'
+            sql += f" WHERE {key} {op}= ? AND ({key} {op} ? OR id {op} ?)"
+            params.extend([after[0], after[0], after[1]])
+        sql += f" ORDER BY {key} {direction}, id {direction}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._summary(row) for row in self.connection().execute(sql, params)]
+
+    def log_version(self, log_id):
+        row = self.connection().execute("SELECT revision, updated, modified FROM logs WHERE id = ?",
+                                        (log_id,)).fetchone()
+        if row is None:
+            return None
+        return version_token(log_id, row[0], row[1], row[2]), row[2] or 0.0
+
+    def logs_version(self):
+        return self._generation()
+
+    def templates_version(self):
+        return self._generation()
+
+    def _generation(self):
+        values = dict(self.connection().execute("SELECT key, value FROM meta"))
+        return version_token(values['generation']), values['modified']
+
+    def get_template(self, template_id):
+        row = self.connection().execute("SELECT body FROM templates WHERE id = ?", (template_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_template(self, template):
+        with self.transaction() as conn:
+            self._insert_templates(conn, [template])
+
+    def list_templates(self):
+        rows = self.connection().execute("SELECT id, name, description FROM templates ORDER BY id")
+        return [{'id': row[0], 'name': row[1], 'description': row[2] or ''} for row in rows]
+
+    def progress_totals(self):
+        conn = self.connection()
+        row = conn.execute(
+            "SELECT COUNT(*), TOTAL(quest_count), TOTAL(objective_count), TOTAL(completed_count), "
+            "TOTAL(completed_quest_count), TOTAL(quest_count > 0 AND completed_quest_count = quest_count), "
+            "MAX(last_completed) FROM logs").fetchone()
+        by_day = conn.execute(
+            "SELECT day.key, SUM(day.value) FROM logs, json_each(logs.completed_by_day) AS day "
+            "WHERE logs.completed_by_day IS NOT NULL GROUP BY day.key")
+        return {'logCount': row[0], 'questCount': int(row[1]), 'objectiveCount': int(row[2]),
+                'completedCount': int(row[3]), 'completedQuestCount': int(row[4]),
+                'completedLogCount': int(row[5]), 'lastCompletedAt': row[6], 'completedByDay': dict(by_day)}
+
+    def bulk_load(self, logs, templates=()):
+        """Insert many logs and templates, committing every ``SQLITE_BATCH_SIZE`` logs."""
+        count = 0
+        batch = []
+        for log in logs:
+            batch.append(log)
+            if len(batch) >= SQLITE_BATCH_SIZE:
+                with self.transaction() as conn:
+                    self._insert_logs(conn, batch)
+                count += len(batch)
+                batch = []
+        with self.transaction() as conn:
+            self._insert_logs(conn, batch)
+            self._insert_templates(conn, templates)
+        return count + len(batch)
+
+    def _summary(self, row):
+        return {
+            'id': row[0],
+            'name': row[1],
+            'questCount': row[2],
+            'objectiveCount': row[3],
+            'completedCount': row[4],
+            'completedQuestCount': row[8],
+            'lastCompletedAt': row[9],
+            'completedByDay': json.loads(row[10]) if row[10] else {},
+            'revision': row[5],
+            'created': row[6],
+            'updated': row[7]
+        }
+
+    def _backfill_progress(self):
+        """Fill in the progress columns of a database created before they existed."""
+        with self.transaction() as conn:
+            log_ids = [row[0] for row in conn.execute("SELECT id FROM logs")]
+            for log_id in log_ids:
+                summary = summarize_log(self.get_log(log_id))
+                conn.execute("UPDATE logs SET completed_quest_count = ?, last_completed = ?, completed_by_day = ? "
+                             "WHERE id = ?", (summary['completedQuestCount'], summary['lastCompletedAt'],
+                                              json.dumps(summary['completedByDay']), log_id))
+
+    def _insert_logs(self, conn, logs):
+        """Replace the rows of ``logs`` inside the caller's transaction."""
+        log_rows, quest_rows, objective_rows = [], [], []
+        modified = time.time()
+        for log in logs:
+            summary = summarize_log(log)
+            log_rows.append((log['id'], log.get('name'), log.get('revision', 0), log.get('created'),
+                             log.get('updated'), summary['questCount'], summary['objectiveCount'],
+                             summary['completedCount'], split_extra(log, LOG_COLUMNS), modified,
+                             summary['completedQuestCount'], summary['lastCompletedAt'],
+                             json.dumps(summary['completedByDay'])))
+            for position, quest in enumerate(log.get('quests') or []):
+                quest_rows.append((log['id'], position, quest.get('id'), quest.get('title'),
+                                   quest.get('description'), quest.get('created'), quest.get('updated'),
+                                   split_extra(quest, QUEST_COLUMNS)))
+                for obj_position, objective in enumerate(quest.get('objectives') or []):
+                    objective_rows.append((log['id'], position, obj_position, objective.get('id'),
+                                           objective.get('title'), int(bool(objective.get('completed'))),
+                                           split_extra(objective, OBJECTIVE_COLUMNS)))
+        conn.executemany("DELETE FROM logs WHERE id = ?", [(row[0],) for row in log_rows])
+        conn.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", log_rows)
+        conn.executemany("INSERT INTO quests VALUES (?, ?, ?, ?, ?, ?, ?, ?)", quest_rows)
+        conn.executemany("INSERT INTO objectives VALUES (?, ?, ?, ?, ?, ?, ?)", objective_rows)
+
+    def _insert_templates(self, conn, templates):
+        conn.executemany(
+            "INSERT OR REPLACE INTO templates VALUES (?, ?, ?, ?)",
+            [(t['id'], t.get('name'), t.get('description', ''), json.dumps(t)) for t in templates])
+
+
+API_ROUTES = ('/api/logs', '/api/log/', '/api/search', '/api/templates', '/api/import-template/',
+              '/api/save', '/api/patch/', '/api/delete/', '/api/batch', '/api/export', '/api/import',
+              '/api/import/', '/api/metrics', '/api/stats', '/api/changes')
+
+
+def route_name(path):
+    """Return the route label for a request path, with ids collapsed to ``:id``."""
+    path = path.split('?', 1)[0]
+    for route in API_ROUTES:
+        if route.endswith('/') and path.startswith(route):
+            return route + ':id'
+        if path == route:
+            return route
+    return '/api/other' if path.startswith('/api/') else 'static'
+
+
+def escape_label(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def histogram_quantile(buckets, counts, quantile):
+    """Estimate a quantile from per-bucket counts by interpolating inside the bucket that holds it."""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = quantile * total
+    seen = 0
+    for index, count in enumerate(counts):
+        if seen + count >= rank and count:
+            if index == len(buckets):
+                return buckets[-1]  # Beyond the largest bound; report that bound
+            lower = buckets[index - 1] if index else 0.0
+            return lower + (buckets[index] - lower) * (rank - seen) / count
+        seen += count
+    return buckets[-1]
+
+
+class Metrics:
+    """Thread-safe request counters, latency histograms and timers in the Prometheus text format.
+
+    Recording is a bisect plus a few dict updates under one lock, so it stays on
+    in production. In prefork mode every worker process keeps its own counters,
+    so each sample carries a ``pid`` label.
+    """
+
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.requests = {}  # (method, route, status) -> count
+        self.latency = {}  # route -> per-bucket counts (last slot is +Inf), then the sum of seconds
+        self.transferred = {}  # (route, direction) -> bytes
+        self.timings = {}  # (family, operation) -> [count, seconds]
+        self.started = time.time()
+
+    def observe_request(self, method, route, status, seconds, bytes_in, bytes_out):
+        """Record one handled request."""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get(route)
+            if histogram is None:
+                histogram = self.latency[route] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += seconds
+            for direction, size in (('in', bytes_in), ('out', bytes_out)):
+                self.transferred[route, direction] = self.transferred.get((route, direction), 0) + size
+
+    def observe(self, family, operation, seconds):
+        """Add ``seconds`` spent in one ``family`` ("json" or "storage") operation."""
+        with self.lock:
+            timing = self.timings.get((family, operation))
+            if timing is None:
+                timing = self.timings[family, operation] = [0, 0.0]
+            timing[0] += 1
+            timing[1] += seconds
+
+    @contextlib.contextmanager
+    def timed(self, family, operation):
+        """Time the body of a ``with`` block as one ``family`` operation."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(family, operation, time.perf_counter() - started)
+
+    def render(self, log_cache=None):
+        """Return all metrics in the Prometheus text exposition format.
+
+        ``log_cache`` is the storage backend's ``cache_stats()``, if it has a cache.
+        """
+        with self.lock:
+            requests = sorted(self.requests.items())
+            latency = sorted((route, list(histogram)) for route, histogram in self.latency.items())
+            transferred = sorted(self.transferred.items())
+            timings = sorted((key, list(timing)) for key, timing in self.timings.items())
+        pid = os.getpid()
+        lines = [
+            '# HELP questlog_process_start_time_seconds Start time of the process since the epoch.',
+            '# TYPE questlog_process_start_time_seconds gauge',
+            f'questlog_process_start_time_seconds{{pid="{pid}"}} {self.started:.3f}',
+            '# HELP questlog_requests_total HTTP requests handled.',
+            '# TYPE questlog_requests_total counter',
+        ]
+        for (method, route, status), count in requests:
+            lines.append(f'questlog_requests_total{{pid="{pid}",method="{escape_label(method)}",'
+                         f'route="{route}",status="{status}"}} {count}')
+        lines += ['# HELP questlog_request_duration_seconds Time from parsing the request line to the end of the response.',
+                  '# TYPE questlog_request_duration_seconds histogram']
+        for route, histogram in latency:
+            counts, total_seconds = histogram[:-1], histogram[-1]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'questlog_request_duration_seconds_bucket{{pid="{pid}",route="{route}",'
+                             f'le="{bound}"}} {cumulative}')
+            lines.append(f'questlog_request_duration_seconds_sum{{pid="{pid}",route="{route}"}} {total_seconds:.6f}')
+            lines.append(f'questlog_request_duration_seconds_count{{pid="{pid}",route="{route}"}} {cumulative}')
+        lines += ['# HELP questlog_request_duration_quantile_seconds Latency quantiles estimated from the histogram.',
+                  '# TYPE questlog_request_duration_quantile_seconds gauge']
+        for route, histogram in latency:
+            for quantile in METRICS_QUANTILES:
+                value = histogram_quantile(self.buckets, histogram[:-1], quantile)
+                lines.append(f'questlog_request_duration_quantile_seconds{{pid="{pid}",route="{route}",'
+                             f'quantile="{quantile}"}} {value:.6f}')
+        lines += ['# HELP questlog_transferred_bytes_total Request and response bytes, including headers on the way out.',
+                  '# TYPE questlog_transferred_bytes_total counter']
+        for (route, direction), size in transferred:
+            lines.append(f'questlog_transferred_bytes_total{{pid="{pid}",route="{route}",direction="{direction}"}} {size}')
+        for family, description in (('json', 'JSON parsing and serialization'), ('storage', 'storage backend calls')):
+            lines += [f'# HELP questlog_{family}_seconds Time spent in {description}.',
+                      f'# TYPE questlog_{family}_seconds summary']
+            for (timing_family, operation), (count, seconds) in timings:
+                if timing_family == family:
+                    lines.append(f'questlog_{family}_seconds_sum{{pid="{pid}",operation="{operation}"}} {seconds:.6f}')
+                    lines.append(f'questlog_{family}_seconds_count{{pid="{pid}",operation="{operation}"}} {count}')
+        if log_cache is not None:
+            for key, kind, description in (('hits', 'counter', 'Log reads served from the log cache.'),
+                                           ('misses', 'counter', 'Log reads that missed the log cache.'),
+                                           ('evictions', 'counter', 'Logs evicted to stay within the log cache budget.'),
+                                           ('entries', 'gauge', 'Logs held in the log cache.'),
+                                           ('bytes', 'gauge', 'Estimated memory used by the log cache.')):
+                name = f'questlog_log_cache_{key}' + ('_total' if kind == 'counter' else '')
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}',
+                          f'{name}{{pid="{pid}"}} {log_cache[key]}']
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+class InstrumentedBackend:
+    """Storage backend wrapper that times every interface call in ``METRICS``."""
+
+    TIMED = frozenset(name for name in vars(StorageBackend) if not name.startswith('_'))
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        attribute = getattr(self.backend, name)
+        if name not in self.TIMED:
+            return attribute
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                METRICS.observe('storage', name, time.perf_counter() - started)
+
+        setattr(self, name, timed)  # Later lookups skip __getattr__
+        return timed
+
+
+class CountingWriter:
+    """Write-through wrapper around a handler's ``wfile`` that counts the bytes sent."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        return self.raw.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+LOG_LOCKS = LogLocks(os.path.join(LOGS_DIR, ".lock"))
+STORAGE = InstrumentedBackend(DirectoryBackend(FileLogStore(LOGS_DIR, LOG_LAYOUT), TEMPLATES_DIR))
+
+
+def create_backend(engine):
+    """Create the storage backend for ``engine`` ("file", "journal" or "sqlite")."""
+    if engine == "journal":
+        return DirectoryBackend(write_behind(JournalLogStore(LOGS_DIR, LOG_LOCKS, LOG_LAYOUT)), TEMPLATES_DIR,
+                                LOG_CACHE_BYTES)
+    if engine == "file":
+        # Fold journals left behind by the journal engine so no change is hidden
+        journals = JournalLogStore(LOGS_DIR, LOG_LOCKS, LOG_LAYOUT)
+        if journals.has_journals():
+            print("Folding journals into .quest files...")
+            journals.compact_all()
+        return DirectoryBackend(write_behind(FileLogStore(LOGS_DIR, LOG_LAYOUT)), TEMPLATES_DIR, LOG_CACHE_BYTES)
+    if engine == "sqlite":
+        return SQLiteBackend(SQLITE_PATH)
+    raise ValueError(f"Unknown storage engine: {engine}")
+
+
+def write_behind(store):
+    """Wrap ``store`` in a WriteBehindLogStore if WRITE_BEHIND_DELAY is set."""
+    return WriteBehindLogStore(store, LOG_LOCKS, WRITE_BEHIND_DELAY) if WRITE_BEHIND_DELAY > 0 else store
+
+
+def configure_storage(engine):
+    """Select and open the storage backend used by the handlers."""
+    global STORAGE
+    STORAGE = InstrumentedBackend(create_backend(engine))
+    STORAGE.open()
+
+
+def configure_data_dir(path):
+    """Point the server at the data directory ``path``, creating it if needed."""
+    global DATA_DIR, LOGS_DIR, TEMPLATES_DIR, IMPORTS_DIR, SQLITE_PATH, LOG_LOCKS, STORAGE
+    DATA_DIR = path
+    LOGS_DIR = os.path.join(path, "logs")
+    TEMPLATES_DIR = os.path.join(path, "templates")
+    IMPORTS_DIR = os.path.join(path, "imports")
+    SQLITE_PATH = os.path.join(path, "questlog.db")
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    os.makedirs(TEMPLATES_DIR, exist_ok=True)
+    LOG_LOCKS = LogLocks(os.path.join(LOGS_DIR, ".lock"))
+    STORAGE = InstrumentedBackend(DirectoryBackend(FileLogStore(LOGS_DIR, LOG_LAYOUT), TEMPLATES_DIR))
+
+
+def ensure_sample_templates():
+    """Create the sample templates if the backend has none."""
+    if not STORAGE.list_templates():
+        print("Creating sample templates...")
+        for template in sample_templates():
+            STORAGE.put_template(template)
+
+
+def migrate_to_sqlite(db_path=None):
+    """Bulk-load the ``data/logs`` and ``data/templates`` trees into a SQLite database."""
+    source = create_backend("file")
+    target = SQLiteBackend(db_path or SQLITE_PATH)
+    target.open()
+    templates = [source.get_template(t['id']) for t in source.list_templates()]
+
+    def logs():
+        for log_id, _ in source.store.scan():
+            try:
+                log = source.store.read(log_id)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"Skipping {log_id}: {e}")
+                continue
+            if log is not None:
+                log.setdefault('id', log_id)
+                yield log
+
+    started = time.monotonic()
+    count = target.bulk_load(logs(), [t for t in templates if t])
+    target.close()
+    print(f"Migrated {count} quest logs and {len(templates)} templates to {target.db_path} "
+          f"in {time.monotonic() - started:.1f}s")
+
+
+
+def migrate_log_layout(layout):
+    """Move every log file in LOGS_DIR into ``layout`` ("flat" or "sharded").
+
+    Safe to run next to a server using the same data directory: each log moves
+    under its lock, and the server finds logs in either layout meanwhile.
+    Restart the server with ``--layout`` afterwards so new logs go there too.
+    """
+    store = FileLogStore(LOGS_DIR, layout)
+    started = time.monotonic()
+    log_ids = sorted({name.rsplit('.', 1)[0] for name, _ in store.files(LOG_FILE_SUFFIXES)})
+    moved = 0
+    for count, log_id in enumerate(log_ids, 1):
+        with LOG_LOCKS.hold(log_id):
+            moved += store.relocate(log_id)
+        if count % 10000 == 0:
+            print(f"  {count}/{len(log_ids)} logs checked, {moved} files moved")
+    if layout == "flat":
+        # Drop the emptied shard directories
+        for leaf, _ in reversed(store.directories()[1:]):
+            with contextlib.suppress(OSError):
+                os.rmdir(leaf)
+                os.rmdir(os.path.dirname(leaf))
+    print(f"Moved {moved} files of {len(log_ids)} quest logs to the {layout} layout "
+          f"in {time.monotonic() - started:.1f}s")
+
+
+def convert_file_format(file_format):
+    """Rewrite every log snapshot and template in ``file_format`` ("json", "pretty" or "binary").
+
+    Safe to run next to a server using the same data directory: each log is
+    rewritten under its lock with an atomic rename, and readers accept every
+    format. Journals stay as they are. Restart the server with
+    ``--file-format`` afterwards so new writes use the format too.
+    """
+    store = FileLogStore(LOGS_DIR, LOG_LAYOUT)
+    started = time.monotonic()
+    log_ids = sorted({name[:-len('.quest')] for name, _ in store.files(('.quest',))})
+    converted = failed = 0
+
+    def convert(file_path):
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return 0
+        if stored_format(raw) == file_format:
+            return 0
+        try:
+            data = decode_stored(raw)
+        except json.JSONDecodeError as e:
+            print(f"Skipping {file_path}: {e}")
+            return -1
+        write_json_atomic(file_path, data, file_format=file_format)
+        return 1
+
+    for count, log_id in enumerate(log_ids, 1):
+        with LOG_LOCKS.hold(log_id):
+            for path in store.candidates(log_id, '.quest'):
+                result = convert(path)
+                converted += result > 0
+                failed += result < 0
+        if count % 10000 == 0:
+            print(f"  {count}/{len(log_ids)} logs checked, {converted} files converted")
+    with os.scandir(TEMPLATES_DIR) as it:
+        template_paths = [entry.path for entry in it if entry.name.endswith('.quest')]
+    for path in template_paths:
+        result = convert(path)
+        converted += result > 0
+        failed += result < 0
+    print(f"Converted {converted} files of {len(log_ids)} quest logs and {len(template_paths)} templates "
+          f"to the {file_format} format in {time.monotonic() - started:.1f}s"
+          + (f"; {failed} unreadable files were skipped" if failed else ""))
+
+
+SEARCH_TOKEN = re.compile(r"\w+")
+
+
+def search_tokens(text):
+    """Split ``text`` into lowercase word tokens."""
+    return SEARCH_TOKEN.findall(text.casefold()) if isinstance(text, str) else []
+
+
+def search_stamp(summary):
+    """Return the parts of a log summary that change whenever its searchable text may have."""
+    return (summary.get('revision'), summary.get('updated'), summary.get('name'),
+            summary.get('questCount'), summary.get('objectiveCount'), summary.get('completedCount'))
+
+
+class SearchIndex:
+    """In-memory inverted index over log names, quest titles/descriptions and objective titles.
+
+    Every log contributes one document for its name, one per quest and one per
+    objective, keyed by ``(log id, quest position, objective position)`` with -1
+    for the levels that do not apply. ``postings`` maps a token to
+    ``{document key: weight}`` and ``vocabulary`` keeps the tokens sorted so a
+    prefix resolves to a contiguous slice with bisect. The handlers update the
+    index whenever they write or delete a log; searches reconcile it against the
+    backend's summaries so logs changed by another process are re-indexed
+    without re-reading unchanged ones.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.vocabulary = []
+        self.documents = {}  # document key -> (result fields, {token: weight})
+        self.logs = {}  # log id -> (search stamp, [document keys])
+        self.validated_at = 0.0
+
+    def build(self, backend):
+        """Index every log in ``backend``."""
+        with self.lock:
+            self.postings, self.vocabulary, self.documents, self.logs = {}, [], {}, {}
+        self.validated_at = 0.0
+        self.refresh(backend)
+
+    def refresh(self, backend):
+        """Re-index the logs whose summaries changed since they were indexed, if the index is stale."""
+        with self.lock:
+            if time.monotonic() - self.validated_at <= INDEX_REVALIDATE_SECONDS:
+                return
+            self.validated_at = time.monotonic()
+            indexed = {log_id: entry[0] for log_id, entry in self.logs.items()}
+        for summary in backend.list_logs():
+            log_id = summary['id']
+            if indexed.pop(log_id, None) == search_stamp(summary):
+                continue
+            try:
+                log = backend.get_log(log_id)
+            except (json.JSONDecodeError, PatchError, IOError, sqlite3.Error) as e:
+                print(f"Error indexing quest log {log_id}: {e}")
+                continue
+            if log is not None:
+                self.add(log, log_id, force=True)
+        with self.lock:
+            for log_id, stamp in indexed.items():
+                # Only drop entries nobody re-indexed while the backend was being listed
+                if log_id in self.logs and self.logs[log_id][0] == stamp:
+                    self._remove(log_id)
+
+    def add(self, log, log_id=None, force=False):
+        """Index (or re-index) a log that was just written.
+
+        A write is skipped if a newer revision of the log was indexed in the
+        meantime. ``force`` replaces the entry regardless, for logs re-read
+        because their stored state changed, which may have gone back to an
+        older revision (a file restored from outside the server).
+        """
+        log_id = log_id or log['id']
+        summary = summarize_log(log)
+        documents = self._documents(log_id, log)
+        with self.lock:
+            current = self.logs.get(log_id)
+            if not force and current and (current[0][0] or 0) > (summary['revision'] or 0):
+                return  # A newer revision was indexed while this one was being read
+            self._remove(log_id)
+            for key, fields, weights in documents:
+                self.documents[key] = (fields, weights)
+                for token, weight in weights.items():
+                    postings = self.postings.get(token)
+                    if postings is None:
+                        postings = self.postings[token] = {}
+                        bisect.insort(self.vocabulary, token)
+                    postings[key] = weight
+            self.logs[log_id] = (search_stamp(summary), [document[0] for document in documents])
+
+    def remove(self, log_id):
+        """Forget a log that was just deleted."""
+        with self.lock:
+            self._remove(log_id)
+
+    def search(self, query, limit, log_id=None):
+        """Return ``(results, total)`` for the documents matching every term of ``query``.
+
+        Each term matches the indexed tokens it is a prefix of; exact matches
+        score the full field weight and prefix matches ``SEARCH_PREFIX_WEIGHT``
+        of it. A document's score is the sum of its best match per term.
+        """
+        terms = list(dict.fromkeys(search_tokens(query)))
+        if not terms:
+            return [], 0
+        with self.lock:
+            scores = None
+            for term in terms:
+                matches = {}
+                position = bisect.bisect_left(self.vocabulary, term)
+                end = min(len(self.vocabulary), position + SEARCH_MAX_EXPANSIONS)
+                while position < end and self.vocabulary[position].startswith(term):
+                    token = self.vocabulary[position]
+                    factor = 1.0 if token == term else SEARCH_PREFIX_WEIGHT
+                    for key, weight in self.postings[token].items():
+                        if log_id is not None and key[0] != log_id:
+                            continue
+                        if scores is not None and key not in scores:
+                            continue
+                        score = weight * factor
+                        if score > matches.get(key, 0.0):
+                            matches[key] = score
+                    position += 1
+                if scores is not None:
+                    for key in matches:
+                        matches[key] += scores[key]
+                scores = matches
+                if not scores:
+                    return [], 0
+            best = heapq.nsmallest(limit, ((-score, key) for key, score in scores.items()))
+            results = [dict(self.documents[key][0], score=round(-score, 3)) for score, key in best]
+        return results, len(scores)
+
+    def _documents(self, log_id, log):
+        """Return ``[(key, result fields, {token: weight})]`` for the searchable parts of a log."""
+        def weigh(*fields):
+            weights = {}
+            for field, text in fields:
+                for token in set(search_tokens(text)):
+                    weights[token] = weights.get(token, 0.0) + SEARCH_FIELD_WEIGHTS[field]
+            return weights
+
+        name = log.get('name')
+        documents = [((log_id, -1, -1), {'type': 'log', 'logId': log_id, 'logName': name},
+                      weigh(('logName', name)))]
+        for position, quest in enumerate(json_objects(log.get('quests'))):
+            quest_fields = {'logId': log_id, 'logName': name,
+                            'questId': quest.get('id'), 'questTitle': quest.get('title')}
+            documents.append(((log_id, position, -1), dict(quest_fields, type='quest'),
+                              weigh(('questTitle', quest.get('title')),
+                                    ('questDescription', quest.get('description')))))
+            for obj_position, objective in enumerate(json_objects(quest.get('objectives'))):
+                documents.append(((log_id, position, obj_position),
+                                  dict(quest_fields, type='objective', objectiveId=objective.get('id'),
+                                       objectiveTitle=objective.get('title'),
+                                       completed=bool(objective.get('completed'))),
+                                  weigh(('objectiveTitle', objective.get('title')))))
+        return [document for document in documents if document[2]]
+
+    def _remove(self, log_id):
+        entry = self.logs.pop(log_id, None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            _, weights = self.documents.pop(key)
+            for token in weights:
+                postings = self.postings[token]
+                del postings[key]
+                if not postings:
+                    del self.postings[token]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+
+SEARCH_INDEX = SearchIndex()
+
+
+class SocketSubscriber:
+    """Change stream written straight to a connection taken over from a request handler."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.cursor = 0
+        self.preamble = b''
+
+    def deliver(self, data):
+        """Send ``data`` without blocking; returns False when the client is gone or too slow."""
+        try:
+            return self.sock.send(data) == len(data)
+        except OSError:
+            return False
+
+    def close(self):
+        with contextlib.suppress(OSError):
+            self.sock.shutdown(socket.SHUT_RDWR)
+        self.sock.close()
+
+
+class StreamSubscriber:
+    """Change stream written to an asyncio connection of the async server."""
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self.cursor = 0
+        self.preamble = b''
+
+    def deliver(self, data):
+        if self.writer.is_closing() or self.writer.transport.get_write_buffer_size() > 1024 * 1024:
+            return False
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+        return True
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.writer.close)
+
+
+class ChangeFeed:
+    """Ring buffer of log change events, streamed to subscribers as Server-Sent Events.
+
+    Handlers ``publish`` a small dict for every save, patch, import and delete.
+    Events get ids of the form ``<epoch>-<sequence>``, where the epoch is random
+    per process, so a client reconnecting with ``Last-Event-ID`` resumes exactly
+    after the last event it saw, or is told to ``reset`` (reload everything)
+    when that event is older than the buffer or from a previous server run. One
+    background thread writes to every subscriber, so open streams do not hold
+    a request thread. In prefork mode each worker only streams its own changes.
+    """
+
+    def __init__(self, size=CHANGE_FEED_SIZE):
+        self.epoch = secrets.token_hex(4)
+        self.events = collections.deque(maxlen=size)  # (sequence, encoded event)
+        self.sequence = 0
+        self.cond = threading.Condition()
+        self.dirty = False
+        self.subscribers = []
+        self.sockets = set()  # connections owned by socket subscribers
+        self.thread = None
+        self.thread_pid = None
+
+    def publish(self, change):
+        """Append one change event and wake the broadcaster."""
+        data = json.dumps(change, separators=(',', ':'))
+        with self.cond:
+            self.sequence += 1
+            event = f"id: {self.epoch}-{self.sequence}\nevent: change\ndata: {data}\n\n"
+            self.events.append((self.sequence, event.encode('utf-8')))
+            if self.subscribers:
+                self.dirty = True
+                self.cond.notify()
+
+    def subscribe(self, subscriber, last_event_id=None):
+        """Start streaming to ``subscriber`` after ``last_event_id`` (or from now)."""
+        with self.cond:
+            cursor = self._resume_cursor(last_event_id)
+            subscriber.preamble = f"retry: {CHANGE_FEED_RETRY_MS}\n\n".encode('ascii')
+            if cursor is None:
+                subscriber.preamble += b"event: reset\ndata: {}\n\n"
+                cursor = self.sequence
+            subscriber.cursor = cursor
+            self.subscribers.append(subscriber)
+            if isinstance(subscriber, SocketSubscriber):
+                self.sockets.add(subscriber.sock)
+            self.dirty = True
+            self._start()
+            self.cond.notify()
+
+    def unsubscribe(self, subscriber):
+        with self.cond:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            if isinstance(subscriber, SocketSubscriber):
+                self.sockets.discard(subscriber.sock)
+
+    def owns(self, sock):
+        """Return True if ``sock`` was taken over by a change stream (the server must not close it)."""
+        with self.cond:
+            return sock in self.sockets
+
+    def _resume_cursor(self, last_event_id):
+        if not last_event_id:
+            return self.sequence
+        epoch, _, sequence = last_event_id.partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self.events[0][0] if self.events else self.sequence + 1
+        if sequence > self.sequence or sequence < oldest - 1:
+            return None  # From the future, or events after it were already dropped
+        return sequence
+
+    def _start(self):
+        if self.thread is None or self.thread_pid != os.getpid():
+            # Started lazily so that each prefork child runs its own broadcaster
+            self.thread = threading.Thread(target=self._run, name="questlog-changes", daemon=True)
+            self.thread_pid = os.getpid()
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                heartbeat = not self.dirty and not self.cond.wait(CHANGE_FEED_HEARTBEAT)
+                self.dirty = False
+                subscribers = list(self.subscribers)
+                sequence = self.sequence
+                oldest_cursor = min((sub.cursor for sub in subscribers), default=sequence)
+                pending = []
+                for event in reversed(self.events):
+                    if event[0] <= oldest_cursor:
+                        break
+                    pending.append(event)
+                pending.reverse()
+            for subscriber in subscribers:
+                chunks = [subscriber.preamble] if subscriber.preamble else []
+                chunks += [data for number, data in pending if number > subscriber.cursor]
+                if not chunks and heartbeat:
+                    chunks = [b": ping\n\n"]
+                subscriber.preamble = b''
+                subscriber.cursor = sequence
+                if chunks and not subscriber.deliver(b''.join(chunks)):
+                    # Gone or too slow; it can reconnect and resume from its Last-Event-ID
+                    self.unsubscribe(subscriber)
+                    subscriber.close()
+
+
+CHANGE_FEED = ChangeFeed()
+
+
+def log_written(kind, log, log_id=None, quest_ids=None, ops=None, client=None):
+    """Index a log that was just stored and publish its change event.
+
+    ``quest_ids`` lists the quests that changed (None means the whole log may
+    have), ``ops`` are the applied patch operations and ``client`` is the
+    ``X-Client-Id`` of the page that made the change, so it can skip its own events.
+    """
+    log_id = log_id or log['id']
+    SEARCH_INDEX.add(log, log_id)
+    summary = summarize_log(log)
+    summary['id'] = log_id
+    change = {'type': kind, 'logId': log_id, 'revision': log.get('revision'),
+              'questIds': quest_ids, 'summary': summary, 'client': client}
+    if ops is not None:
+        change['ops'] = ops
+    CHANGE_FEED.publish(change)
+
+
+def log_deleted(log_id, client=None):
+    """Drop a deleted log from the search index and publish its change event."""
+    SEARCH_INDEX.remove(log_id)
+    CHANGE_FEED.publish({'type': 'delete', 'logId': log_id, 'client': client})
+
+
+class BatchError(Exception):
+    """An /api/batch operation that cannot be run, with the HTTP status to report for it."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def batch_result(status, **fields):
+    """Encode the result of one /api/batch operation."""
+    return json.dumps({'status': int(status), **fields}).encode('utf-8')
+
+
+def batch_log_id(op):
+    """Return the id of the log an /api/batch operation works on, or raise BatchError."""
+    if not isinstance(op, dict):
+        raise BatchError(HTTPStatus.BAD_REQUEST, "Operation must be an object")
+    kind = op.get('op')
+    if kind == 'save':
+        log = op.get('log')
+        try:
+            validate_log(log)
+        except ValueError as e:
+            raise BatchError(HTTPStatus.BAD_REQUEST, str(e))
+        log_id = log['id']
+    elif kind in ('get', 'delete'):
+        log_id = op.get('id')
+    else:
+        raise BatchError(HTTPStatus.BAD_REQUEST, f"Unknown operation: {kind!r}")
+    if not isinstance(log_id, str) or not log_id:
+        raise BatchError(HTTPStatus.BAD_REQUEST, "Operation needs a log id")
+    if not LOG_ID.fullmatch(log_id):
+        raise BatchError(HTTPStatus.BAD_REQUEST, "Invalid log id")
+    return log_id
+
+
+def run_batch_group(log_id, items, client=None):
+    """Run the /api/batch operations on one log, all or nothing.
+
+    ``items`` are ``(position, operation)`` pairs in request order. They are
+    applied in order to the log's state in memory while its lock is held, so
+    gets see the batch's earlier saves and deletes and no other request sees a
+    partial result. Only when every operation succeeds is the final state
+    stored, with a single write or delete; if a save or delete fails, nothing
+    is stored and the operations that had succeeded (gets included, as they
+    may have seen the discarded changes) report 424. A get of a missing log
+    is answered with 404 without failing the others. Returns
+    ``(position, encoded result)`` pairs.
+    """
+    results = []  # (position, status, encoded result)
+    with LOG_LOCKS.hold(log_id):
+        stored = STORAGE.log_summary(log_id)
+        exists = stored is not None
+        revision = stored['revision'] if stored else 0
+        log, changed, failed = None, False, False
+        for position, op in items:
+            kind = op['op']
+            if kind == 'get':
+                body = None
+                if changed and exists:
+                    body = json.dumps(log).encode('utf-8')
+                elif exists:
+                    body = STORAGE.get_log_json(log_id)
+                if body is None:
+                    results.append((position, HTTPStatus.NOT_FOUND,
+                                    batch_result(HTTPStatus.NOT_FOUND, error="Quest log not found")))
+                else:
+                    results.append((position, HTTPStatus.OK, b'{"status": 200, "log": ' + body + b'}'))
+            elif kind == 'save':
+                log = op['log']
+                stamp_completions(log, log.get('updated') or datetime.now().isoformat())
+                revision += 1
+                log['revision'] = revision
+                exists = changed = True
+                results.append((position, HTTPStatus.OK, batch_result(HTTPStatus.OK, revision=revision)))
+            elif not exists:
+                failed = True
+                results.append((position, HTTPStatus.NOT_FOUND,
+                                batch_result(HTTPStatus.NOT_FOUND, error="Quest log not found")))
+            else:
+                log, revision, exists, changed = None, 0, False, True
+                results.append((position, HTTPStatus.OK, batch_result(HTTPStatus.OK, success=True)))
+
+        if failed:
+            aborted = batch_result(HTTPStatus.FAILED_DEPENDENCY, error="Another operation on this log failed")
+            return [(position, result if status != HTTPStatus.OK else aborted)
+                    for position, status, result in results]
+        if changed:
+            if exists:
+                STORAGE.put_log(log)
+                log_written('save', log, client=client)
+            elif stored is not None:
+                STORAGE.delete_log(log_id)
+                log_deleted(log_id, client)
+    return [(position, result) for position, _, result in results]
+
+
+def run_batch_group_safely(log_id, items, client=None):
+    """``run_batch_group``, reporting storage errors as a 500 result for each operation."""
+    try:
+        return run_batch_group(log_id, items, client)
+    except (json.JSONDecodeError, IOError, sqlite3.Error) as e:
+        error = batch_result(HTTPStatus.INTERNAL_SERVER_ERROR, error=f"Error accessing quest log: {e}")
+        return [(position, error) for position, _ in items]
+
+
+BATCH_EXECUTOR = None  # (pid, ThreadPoolExecutor), created on first use in each process
+BATCH_EXECUTOR_LOCK = threading.Lock()
+
+
+def batch_executor():
+    """Return this process's pool for /api/batch groups, creating it after a fork."""
+    global BATCH_EXECUTOR
+    with BATCH_EXECUTOR_LOCK:
+        if BATCH_EXECUTOR is None or BATCH_EXECUTOR[0] != os.getpid():
+            BATCH_EXECUTOR = (os.getpid(), ThreadPoolExecutor(max_workers=BATCH_WORKERS,
+                                                              thread_name_prefix="questlog-batch"))
+        return BATCH_EXECUTOR[1]
+
+
+def run_batch(operations, client=None):
+    """Run a list of /api/batch operations and return their encoded results in order.
+
+    Operations are grouped by log id; the groups run in parallel on the
+    batch pool, each as one ``run_batch_group``.
+    """
+    results = [None] * len(operations)
+    groups = {}
+    for position, op in enumerate(operations):
+        try:
+            groups.setdefault(batch_log_id(op), []).append((position, op))
+        except BatchError as e:
+            results[position] = batch_result(e.status, error=str(e))
+    if len(groups) == 1:
+        finished = [run_batch_group_safely(*groups.popitem(), client)]
+    else:
+        executor = batch_executor()
+        futures = [executor.submit(run_batch_group_safely, log_id, items, client)
+                   for log_id, items in groups.items()]
+        finished = [future.result() for future in futures]
+    for group in finished:
+        for position, result in group:
+            results[position] = result
+    return results
+
+
+def export_log_ids(ids=None, updated_since=None):
+    """Yield the ids of the logs to export: ``ids`` as given, or every log, a page at a time.
+
+    Logs are paged in creation order, so the set being exported never has to
+    be held in memory and logs saved meanwhile do not move between pages.
+    ``updated_since`` keeps only logs whose ``updated`` time is not older.
+    """
+    if ids is not None:
+        yield from dict.fromkeys(ids)
+        return
+    after = None
+    while True:
+        page = STORAGE.list_logs('created', after=after, limit=LIST_MAX_PAGE_SIZE)
+        for summary in page:
+            if updated_since is None or str(summary.get('updated') or '') >= updated_since:
+                yield summary['id']
+        if len(page) < LIST_MAX_PAGE_SIZE:
+            return
+        after = (LIST_SORT_KEYS['created'](page[-1]), page[-1]['id'])
+
+
+class ArchiveBuffer:
+    """Write target for an archive being streamed: gzips what it is given and hands it out in chunks."""
+
+    def __init__(self, compress):
+        self.compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31) if compress else None
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += self.compressor.compress(data) if self.compressor else data
+        return len(data)
+
+    def take(self, final=False):
+        """Return and forget the bytes collected so far; ``final`` ends the gzip stream."""
+        if final and self.compressor:
+            self.data += self.compressor.flush()
+        chunk = bytes(self.data)
+        self.data.clear()
+        return chunk
+
+
+def iter_export(log_ids, archive_format='ndjson', compress=True):
+    """Yield an export archive of ``log_ids`` in chunks of about EXPORT_CHUNK_BYTES.
+
+    ``ndjson`` writes one log per line; ``tar`` writes one ``<id>.quest``
+    member per log. Only one log is held in memory at a time, and logs deleted
+    while the export runs are left out.
+    """
+    buffer = ArchiveBuffer(compress)
+    tar = tarfile.open(fileobj=buffer, mode='w|', format=tarfile.PAX_FORMAT) if archive_format == 'tar' else None
+    for log_id in log_ids:
+        body = STORAGE.get_log_json(log_id, cached=False)
+        if body is None:
+            continue
+        if tar is None:
+            buffer.write(body + b'\n')
+        else:
+            info = tarfile.TarInfo(f"{log_id}.quest")
+            info.size = len(body)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(body))
+        if len(buffer.data) >= EXPORT_CHUNK_BYTES:
+            yield buffer.take()
+    if tar is not None:
+        tar.close()
+    yield buffer.take(final=True)
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file over an iterator of byte chunks; ``position`` counts the bytes read."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = memoryview(b'')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(b), len(self.pending))
+        b[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        self.position += size
+        return size
+
+
+def gunzip_chunks(chunks):
+    """Decompress a gzip stream given in chunks, yielding at most BODY_CHUNK_SIZE bytes at a time."""
+    decompressor = zlib.decompressobj(31)
+    for chunk in chunks:
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk, BODY_CHUNK_SIZE)
+            except zlib.error as e:
+                raise ValueError(f"Invalid gzip data: {e}") from None
+            chunk = decompressor.unconsumed_tail
+            if data:
+                yield data
+    if not decompressor.eof:
+        raise ValueError("Truncated gzip data")
+
+
+def iter_ndjson_records(chunks):
+    """Yield ``(line, end offset)`` for every non-blank line of a newline-delimited stream."""
+    buffer, position = b'', 0
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = buffer[start:end]
+            start = end + 1
+            if line.strip():
+                yield line, position + start
+        position += start
+        buffer = buffer[start:]
+        if len(buffer) > MAX_BODY_BYTES:
+            raise ValueError(f"Archive line longer than {MAX_BODY_BYTES} bytes")
+    if buffer.strip():
+        yield buffer, position + len(buffer)
+
+
+def iter_tar_records(chunks):
+    """Yield ``(contents, end offset)`` for every ``.quest`` or ``.json`` file of a tar stream."""
+    tar = tarfile.open(fileobj=io.BufferedReader(ChunkReader(chunks), BODY_CHUNK_SIZE), mode='r|')
+    while True:
+        member = tar.next()
+        if member is None:
+            return
+        tar.members = []  # A streamed archive has no use for the member list, which would only grow
+        if not member.isfile() or not member.name.endswith(('.quest', '.json')):
+            continue
+        if member.size > MAX_BODY_BYTES:
+            raise ValueError(f"Archive member {member.name} larger than {MAX_BODY_BYTES} bytes")
+        blocks = -(-member.size // tarfile.BLOCKSIZE)
+        yield tar.extractfile(member).read(), member.offset_data + blocks * tarfile.BLOCKSIZE
+
+
+def iter_archive_records(chunks, compressed):
+    """Yield ``(record bytes, end offset)`` for each log in an NDJSON or tar archive.
+
+    The format is recognized from the first non-blank byte. Offsets count the
+    archive bytes after decompression.
+    """
+    if compressed:
+        chunks = gunzip_chunks(chunks)
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+    rest = itertools.chain([head], chunks)
+    if not head.strip():
+        return iter(())
+    if head.lstrip()[:1] == b'{':
+        return iter_ndjson_records(rest)
+    return iter_tar_records(rest)
+
+
+IMPORT_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+ACTIVE_IMPORTS = set()  # ids of imports running in this process
+ACTIVE_IMPORTS_LOCK = threading.Lock()
+
+
+def import_progress_path(import_id):
+    return os.path.join(IMPORTS_DIR, f"{import_id}.json")
+
+
+def load_import_progress(import_id):
+    """Return the saved progress of an archive import, or None if there is none."""
+    try:
+        return read_stored(import_progress_path(import_id))
+    except FileNotFoundError:
+        return None
+
+
+def save_import_progress(progress):
+    progress['updated'] = datetime.now().isoformat()
+    os.makedirs(IMPORTS_DIR, exist_ok=True)
+    write_json_atomic(import_progress_path(progress['id']), progress)
+
+
+def import_log(data, client=None):
+    """Store one log read from an archive, in any stored file format, replacing any log with its id."""
+    log = decode_stored(data)
+    validate_log(log)
+    stamp_completions(log, log.get('updated') or datetime.now().isoformat())
+    with LOG_LOCKS.hold(log['id']):
+        stored = STORAGE.log_summary(log['id'])
+        revision = log.get('revision') if isinstance(log.get('revision'), int) else 0
+        log['revision'] = max(revision, (stored['revision'] if stored else 0) + 1)
+        STORAGE.put_log(log)
+        log_written('import', log, client=client)
+
+
+def run_import(progress, chunks, offset=0, client=None):
+    """Import the logs of an archive, saving ``progress`` as it goes.
+
+    ``chunks`` is the archive, or with ``offset`` the rest of an uncompressed
+    archive starting at that byte. Records counted in ``progress`` are skipped
+    when the archive is sent again from the start. Every
+    IMPORT_PROGRESS_INTERVAL records the progress -- including, for
+    uncompressed archives, the offset to resume from -- is saved. Raises
+    ValueError for archives that cannot be read and lets errors reading the
+    request through, after saving the progress.
+    """
+    received = [0]
+
+    def counted(chunks):
+        for chunk in chunks:
+            received[0] += len(chunk)
+            yield chunk
+
+    chunks = iter(counted(chunks))
+    first = next(chunks, b'')
+    compressed = first[:2] == b'\x1f\x8b'
+    if compressed and offset:
+        raise ValueError("Only uncompressed archives can be resumed from an offset")
+    progress.update(state='running', compressed=compressed, error=None)
+    skip = 0 if offset else progress['records']
+    try:
+        for record, end in iter_archive_records(itertools.chain([first], chunks), compressed):
+            if skip:
+                skip -= 1
+                continue
+            try:
+                import_log(record, client)
+                progress['imported'] += 1
+            except ValueError as e:
+                progress['failed'] += 1
+                progress['lastError'] = str(e)
+            except (IOError, sqlite3.Error):
+                raise  # The storage failed, not the record; stop so the import can be resumed
+            except Exception as e:
+                # A record that trips up the server must not stop every resume at the same place
+                progress['failed'] += 1
+                progress['lastError'] = f"{type(e).__name__}: {e}"
+            progress['records'] += 1
+            progress['offset'] = None if compressed else offset + end
+            progress['received'] = received[0]
+            if progress['records'] % IMPORT_PROGRESS_INTERVAL == 0:
+                save_import_progress(progress)
+        progress['state'] = 'done'
+    except (ValueError, tarfile.TarError) as e:
+        progress.update(state='failed', error=str(e))
+        raise ValueError(str(e)) from None
+    except BaseException as e:
+        progress.update(state='interrupted', error=str(e))
+        raise
+    finally:
+        progress['received'] = received[0]
+        save_import_progress(progress)
+    return progress
+
+
+def accepted_encodings(accept_encoding):
+    """Return the content codings we support that ``accept_encoding`` allows, best first."""
+    allowed = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        allowed[coding.strip().lower()] = quality
+    supported = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return [coding for coding in supported if allowed.get(coding, allowed.get('*', 0.0)) > 0]
+
+
+def compress_body(body, encoding, level):
+    """Compress ``body`` with the given content coding."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class CompressedAssetCache:
+    """Pre-compressed variants of static files, rebuilt when a file's mtime or size changes."""
+
+    def __init__(self):
+        self.entries = {}  # (path, encoding) -> ((mtime_ns, size), body)
+        self.lock = threading.Lock()
+
+    def get(self, path, encoding):
+        """Return ``((mtime_ns, size), compressed body)`` for a static file."""
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            cached = self.entries.get((path, encoding))
+        if cached and cached[0] == signature:
+            return cached
+        with open(path, 'rb') as f:
+            body = f.read()
+        entry = (signature, compress_body(body, encoding, STATIC_COMPRESSION_LEVEL))
+        with self.lock:
+            self.entries[(path, encoding)] = entry
+        return entry
+
+    def warm(self, directory):
+        """Compress every compressible file at the top of ``directory`` ahead of the first request."""
+        for entry in os.scandir(directory):
+            content_type = mimetypes.guess_type(entry.name)[0] or ''
+            if entry.is_file() and content_type.startswith(COMPRESSIBLE_TYPES):
+                for encoding in accepted_encodings('br, gzip'):
+                    self.get(entry.path, encoding)
+
+
+STATIC_CACHE = CompressedAssetCache()
+
+
+class RequestBodyError(Exception):
+    """A request body that is refused; ``status`` is the response to send."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def iter_request_body(rfile, headers, limit):
+    """Yield the request body from ``rfile`` in chunks of at most BODY_CHUNK_SIZE bytes.
+    
+    Handles both Content-Length and chunked framing. A body is refused with 413
+    as soon as it is known to exceed ``limit`` -- before reading anything when
+    the length is declared up front -- so nothing larger is ever buffered.
+    """
+    transfer_encoding = headers.get('Transfer-Encoding')
+    content_length = headers.get('Content-Length')
+    if transfer_encoding is not None:
+        if transfer_encoding.strip().lower() != 'chunked':
+            raise RequestBodyError(HTTPStatus.NOT_IMPLEMENTED, "Only chunked transfer coding is supported")
+        if content_length is not None:
+            raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Both Content-Length and Transfer-Encoding given")
+        yield from iter_chunked_body(rfile, limit)
+        return
+    if content_length is None:
+        raise RequestBodyError(HTTPStatus.LENGTH_REQUIRED, "Content-Length required")
+    if not content_length.strip().isdigit():
+        raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    remaining = int(content_length)
+    if remaining > limit:
+        raise RequestBodyError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body larger than {limit} bytes")
+    while remaining:
+        chunk = rfile.read(min(remaining, BODY_CHUNK_SIZE))
+        if not chunk:
+            raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Request body ended early")
+        remaining -= len(chunk)
+        yield chunk
+
+
+CHUNK_SIZE = re.compile(rb"[0-9A-Fa-f]{1,16}")
+
+
+def parse_chunk_size(line):
+    """Return the size on a chunk-size line, or None unless it is plain hex digits.
+
+    ``int(..., 16)`` alone would also take signs, underscores and ``0x``, and a
+    negative size would make the body readers read to the end of the stream.
+    """
+    digits = line.split(b';', 1)[0].strip()
+    return int(digits, 16) if CHUNK_SIZE.fullmatch(digits) else None
+
+
+def iter_chunked_body(rfile, limit):
+    """Yield the data of a ``Transfer-Encoding: chunked`` body, skipping extensions and trailers."""
+    total = 0
+    while True:
+        line = rfile.readline(1024)
+        size = parse_chunk_size(line)
+        if size is None:
+            raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Invalid chunk size")
+        if size == 0:
+            break
+        total += size
+        if total > limit:
+            raise RequestBodyError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body larger than {limit} bytes")
+        while size:
+            chunk = rfile.read(min(size, BODY_CHUNK_SIZE))
+            if not chunk:
+                raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Request body ended early")
+            size -= len(chunk)
+            yield chunk
+        if rfile.readline(3) not in (b'\r\n', b'\n'):
+            raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Malformed chunk")
+    while rfile.readline(8192) not in (b'\r\n', b'\n', b''):
+        pass  # Trailer fields are not used
 
-# Ensure directories exist
-os.makedirs(LOGS_DIR, exist_ok=True)
-os.makedirs(TEMPLATES_DIR, exist_ok=True)
 
-# Sample templates
-SAMPLE_TEMPLATES = [
-    {
-        "id": "daily-tasks",
-        "name": "Daily Tasks",
-        "description": "A template for tracking daily tasks and routines",
-        "quests": [
-            {
-                "id": "morning-routine",
-                "title": "Morning Routine",
-                "description": "Complete your morning routine to start the day right",
-                "objectives": [
-                    {"id": "obj1", "title": "Wake up at 6:30 AM", "completed": False},
-                    {"id": "obj2", "title": "Drink water", "completed": False},
-                    {"id": "obj3", "title": "Exercise for 15 minutes", "completed": False},
-                    {"id": "obj4", "title": "Eat breakfast", "completed": False},
-                    {"id": "obj5", "title": "Plan your day", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "work-tasks",
-                "title": "Work Tasks",
-                "description": "Complete your work tasks for the day",
-                "objectives": [
-                    {"id": "obj1", "title": "Check emails", "completed": False},
-                    {"id": "obj2", "title": "Attend daily meeting", "completed": False},
-                    {"id": "obj3", "title": "Complete primary task", "completed": False},
-                    {"id": "obj4", "title": "Follow up with team", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "evening-routine",
-                "title": "Evening Routine",
-                "description": "Wind down and prepare for tomorrow",
-                "objectives": [
-                    {"id": "obj1", "title": "Review today's accomplishments", "completed": False},
-                    {"id": "obj2", "title": "Prepare for tomorrow", "completed": False},
-                    {"id": "obj3", "title": "Read for 30 minutes", "completed": False},
-                    {"id": "obj4", "title": "Sleep by 10:30 PM", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            }
-        ],
-        "created": datetime.now().isoformat(),
-        "updated": datetime.now().isoformat()
-    },
-    {
-        "id": "fitness-journey",
-        "name": "Fitness Journey",
-        "description": "Track your fitness goals and progress",
-        "quests": [
-            {
-                "id": "strength-training",
-                "title": "Strength Training",
-                "description": "Build strength through regular weight training",
-                "objectives": [
-                    {"id": "obj1", "title": "Upper body workout (2x per week)", "completed": False},
-                    {"id": "obj2", "title": "Lower body workout (2x per week)", "completed": False},
-                    {"id": "obj3", "title": "Increase bench press by 10%", "completed": False},
-                    {"id": "obj4", "title": "Master proper squat form", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "cardio-endurance",
-                "title": "Cardio & Endurance",
-                "description": "Improve cardiovascular health and endurance",
-                "objectives": [
-                    {"id": "obj1", "title": "Run 5k without stopping", "completed": False},
-                    {"id": "obj2", "title": "30 minutes of cardio (3x per week)", "completed": False},
-                    {"id": "obj3", "title": "Try a new cardio activity", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "nutrition",
-                "title": "Nutrition",
-                "description": "Maintain a balanced diet to fuel your fitness journey",
-                "objectives": [
-                    {"id": "obj1", "title": "Track macros for 2 weeks", "completed": False},
-                    {"id": "obj2", "title": "Meal prep weekly", "completed": False},
-                    {"id": "obj3", "title": "Drink 2L of water daily", "completed": False},
-                    {"id": "obj4", "title": "Reduce processed food intake", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            }
-        ],
-        "created": datetime.now().isoformat(),
-        "updated": datetime.now().isoformat()
-    },
-    {
-        "id": "project-management",
-        "name": "Project Management",
-        "description": "Organize and track your work projects",
-        "quests": [
-            {
-                "id": "project-planning",
-                "title": "Project Planning",
-                "description": "Set up the foundation for your project",
-                "objectives": [
-                    {"id": "obj1", "title": "Define project scope", "completed": False},
-                    {"id": "obj2", "title": "Create timeline", "completed": False},
-                    {"id": "obj3", "title": "Assign responsibilities", "completed": False},
-                    {"id": "obj4", "title": "Set up tracking system", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "execution-phase",
-                "title": "Execution Phase",
-                "description": "Implement the project plan",
-                "objectives": [
-                    {"id": "obj1", "title": "Complete first milestone", "completed": False},
-                    {"id": "obj2", "title": "Weekly progress reviews", "completed": False},
-                    {"id": "obj3", "title": "Address blockers", "completed": False},
-                    {"id": "obj4", "title": "Update stakeholders", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            }
-        ],
-        "created": datetime.now().isoformat(),
-        "updated": datetime.now().isoformat()
-    },
-    {
-        "id": "algebra-2",
-        "name": "10th Grade Algebra II",
-        "description": "A comprehensive curriculum for 10th grade Algebra II",
-        "quests": [
-            {
-                "id": "linear-equations",
-                "title": "Linear Equations and Inequalities",
-                "description": "Master solving and graphing linear equations and inequalities in one and two variables.",
-                "objectives": [
-                    {"id": "obj1", "title": "Solve linear equations with variables on both sides", "completed": False},
-                    {"id": "obj2", "title": "Graph linear equations using slope-intercept form", "completed": False},
-                    {"id": "obj3", "title": "Solve systems of linear equations", "completed": False},
-                    {"id": "obj4", "title": "Solve and graph linear inequalities", "completed": False},
-                    {"id": "obj5", "title": "Complete linear word problems", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "quadratic-functions",
-                "title": "Quadratic Functions",
-                "description": "Understand and work with quadratic functions and their applications.",
-                "objectives": [
-                    {"id": "obj1", "title": "Graph quadratic functions", "completed": False},
-                    {"id": "obj2", "title": "Find zeros using factoring", "completed": False},
-                    {"id": "obj3", "title": "Apply the quadratic formula", "completed": False},
-                    {"id": "obj4", "title": "Complete the square", "completed": False},
-                    {"id": "obj5", "title": "Solve quadratic word problems", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "polynomials",
-                "title": "Polynomials and Rational Expressions",
-                "description": "Learn to manipulate and solve polynomial and rational expressions.",
-                "objectives": [
-                    {"id": "obj1", "title": "Add, subtract, and multiply polynomials", "completed": False},
-                    {"id": "obj2", "title": "Factor polynomials", "completed": False},
-                    {"id": "obj3", "title": "Simplify rational expressions", "completed": False},
-                    {"id": "obj4", "title": "Solve polynomial equations", "completed": False},
-                    {"id": "obj5", "title": "Graph polynomial functions", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "exponential-logarithmic",
-                "title": "Exponential and Logarithmic Functions",
-                "description": "Explore exponential growth/decay and logarithmic relationships.",
-                "objectives": [
-                    {"id": "obj1", "title": "Evaluate exponential expressions", "completed": False},
-                    {"id": "obj2", "title": "Graph exponential functions", "completed": False},
-                    {"id": "obj3", "title": "Convert between exponential and logarithmic forms", "completed": False},
-                    {"id": "obj4", "title": "Solve logarithmic equations", "completed": False},
-                    {"id": "obj5", "title": "Apply exponential models to real-world scenarios", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            }
-        ],
-        "created": datetime.now().isoformat(),
-        "updated": datetime.now().isoformat()
-    },
-    {
-        "id": "geometry",
-        "name": "High School Geometry",
-        "description": "A structured curriculum for high school geometry",
-        "quests": [
-            {
-                "id": "basic-concepts",
-                "title": "Basic Geometric Concepts",
-                "description": "Learn the fundamental concepts and vocabulary of geometry.",
-                "objectives": [
-                    {"id": "obj1", "title": "Identify points, lines, planes, and angles", "completed": False},
-                    {"id": "obj2", "title": "Measure and classify angles", "completed": False},
-                    {"id": "obj3", "title": "Understand parallel and perpendicular lines", "completed": False},
-                    {"id": "obj4", "title": "Apply the coordinate system", "completed": False},
-                    {"id": "obj5", "title": "Use geometric notation correctly", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "triangles",
-                "title": "Triangles and Congruence",
-                "description": "Explore properties of triangles and methods to prove congruence.",
-                "objectives": [
-                    {"id": "obj1", "title": "Classify triangles by sides and angles", "completed": False},
-                    {"id": "obj2", "title": "Apply the triangle sum theorem", "completed": False},
-                    {"id": "obj3", "title": "Prove triangles congruent using SSS, SAS, ASA, and AAS", "completed": False},
-                    {"id": "obj4", "title": "Use triangle congruence to solve problems", "completed": False},
-                    {"id": "obj5", "title": "Understand and apply the Pythagorean theorem", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "similarity",
-                "title": "Similarity and Proportions",
-                "description": "Understand similar figures and proportional relationships.",
-                "objectives": [
-                    {"id": "obj1", "title": "Identify similar triangles", "completed": False},
-                    {"id": "obj2", "title": "Apply the AA similarity criterion", "completed": False},
-                    {"id": "obj3", "title": "Use proportions to find missing measurements", "completed": False},
-                    {"id": "obj4", "title": "Apply similarity to real-world problems", "completed": False},
-                    {"id": "obj5", "title": "Understand scale factors and their effects", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "circles",
-                "title": "Circles and Their Properties",
-                "description": "Explore the properties and theorems related to circles.",
-                "objectives": [
-                    {"id": "obj1", "title": "Identify parts of a circle (radius, diameter, chord, arc)", "completed": False},
-                    {"id": "obj2", "title": "Apply the inscribed angle theorem", "completed": False},
-                    {"id": "obj3", "title": "Find arc lengths and sector areas", "completed": False},
-                    {"id": "obj4", "title": "Write the equation of a circle", "completed": False},
-                    {"id": "obj5", "title": "Solve problems involving tangent lines", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "area-volume",
-                "title": "Area and Volume",
-                "description": "Calculate measurements of two and three-dimensional figures.",
-                "objectives": [
-                    {"id": "obj1", "title": "Find areas of triangles, quadrilaterals, and circles", "completed": False},
-                    {"id": "obj2", "title": "Calculate surface areas of 3D figures", "completed": False},
-                    {"id": "obj3", "title": "Determine volumes of prisms, pyramids, cylinders, and spheres", "completed": False},
-                    {"id": "obj4", "title": "Apply area and volume formulas to composite figures", "completed": False},
-                    {"id": "obj5", "title": "Solve real-world measurement problems", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            }
-        ],
-        "created": datetime.now().isoformat(),
-        "updated": datetime.now().isoformat()
-    },
-    {
-        "id": "precalculus",
-        "name": "11th Grade Pre-Calculus",
-        "description": "A comprehensive curriculum for 11th grade Pre-Calculus",
-        "quests": [
-            {
-                "id": "functions",
-                "title": "Functions and Their Graphs",
-                "description": "Analyze various functions and their graphical representations.",
-                "objectives": [
-                    {"id": "obj1", "title": "Identify function types and their characteristics", "completed": False},
-                    {"id": "obj2", "title": "Find domains and ranges", "completed": False},
-                    {"id": "obj3", "title": "Perform function transformations", "completed": False},
-                    {"id": "obj4", "title": "Compose functions and find inverses", "completed": False},
-                    {"id": "obj5", "title": "Analyze piecewise functions", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "trigonometry",
-                "title": "Trigonometric Functions",
-                "description": "Explore the properties and applications of trigonometric functions.",
-                "objectives": [
-                    {"id": "obj1", "title": "Convert between degrees and radians", "completed": False},
-                    {"id": "obj2", "title": "Evaluate the six trigonometric functions", "completed": False},
-                    {"id": "obj3", "title": "Graph sine, cosine, and tangent functions", "completed": False},
-                    {"id": "obj4", "title": "Apply trigonometric identities", "completed": False},
-                    {"id": "obj5", "title": "Solve trigonometric equations", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "vectors",
-                "title": "Vectors and Parametric Equations",
-                "description": "Work with vectors and parametric representations in two and three dimensions.",
-                "objectives": [
-                    {"id": "obj1", "title": "Perform vector operations", "completed": False},
-                    {"id": "obj2", "title": "Find dot and cross products", "completed": False},
-                    {"id": "obj3", "title": "Write parametric equations", "completed": False},
-                    {"id": "obj4", "title": "Convert between parametric and rectangular forms", "completed": False},
-                    {"id": "obj5", "title": "Apply vectors to physics problems", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "conic-sections",
-                "title": "Conic Sections",
-                "description": "Study the properties and equations of circles, ellipses, parabolas, and hyperbolas.",
-                "objectives": [
-                    {"id": "obj1", "title": "Identify and graph circles", "completed": False},
-                    {"id": "obj2", "title": "Analyze ellipses and their properties", "completed": False},
-                    {"id": "obj3", "title": "Work with parabolas in various forms", "completed": False},
-                    {"id": "obj4", "title": "Understand hyperbolas and their asymptotes", "completed": False},
-                    {"id": "obj5", "title": "Convert between general and standard forms", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            },
-            {
-                "id": "limits-intro",
-                "title": "Introduction to Limits",
-                "description": "Begin exploring the foundational concept of calculus: limits.",
-                "objectives": [
-                    {"id": "obj1", "title": "Evaluate limits graphically", "completed": False},
-                    {"id": "obj2", "title": "Find limits algebraically", "completed": False},
-                    {"id": "obj3", "title": "Understand one-sided limits", "completed": False},
-                    {"id": "obj4", "title": "Identify when limits do not exist", "completed": False},
-                    {"id": "obj5", "title": "Apply the squeeze theorem", "completed": False}
-                ],
-                "created": datetime.now().isoformat(),
-                "updated": datetime.now().isoformat()
-            }
-        ],
-        "created": datetime.now().isoformat(),
-        "updated": datetime.now().isoformat()
-    }
-]
 
 class QuestLogHandler(http.server.SimpleHTTPRequestHandler):
     """Custom request handler for the Quest Log server."""
@@ -389,6 +3805,39 @@ class QuestLogHandler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=PUBLIC_DIR, **kwargs)
     
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+    
+    def parse_request(self):
+        """Start timing once the request line has arrived."""
+        self.request_started = time.perf_counter()
+        self.status_code = None
+        self.wfile.count = 0
+        return super().parse_request()
+    
+    def send_response_only(self, code, message=None):
+        self.status_code = int(code)
+        super().send_response_only(code, message)
+    
+    def handle_one_request(self):
+        """Handle one request and record its route, status, size and latency in ``METRICS``."""
+        self.request_started = None
+        super().handle_one_request()
+        if self.request_started is None or self.status_code is None:
+            return  # Connection closed before a request arrived
+        if self.command:
+            method, route = self.command, route_name(self.path)
+        else:
+            method, route = '-', 'invalid'
+        headers = getattr(self, 'headers', None)
+        try:
+            bytes_in = int(headers.get('Content-Length') or 0) if headers else 0
+        except ValueError:
+            bytes_in = 0
+        METRICS.observe_request(method, route, self.status_code, time.perf_counter() - self.request_started,
+                                bytes_in, self.wfile.count)
+    
     def do_GET(self):
         """Handle GET requests."""
         parsed_path = urllib.parse.urlparse(self.path)
@@ -398,8 +3847,22 @@ class QuestLogHandler(http.server.SimpleHTTPRequestHandler):
         if path == '/api/logs':
             self.handle_get_logs()
         elif path.startswith('/api/log/'):
-            log_id = path.split('/api/log/')[1]
-            self.handle_get_log(log_id)
+            log_id = self.route_log_id('/api/log/')
+            if log_id is not None:
+                self.handle_get_log(log_id)
+        elif path == '/api/search':
+            self.handle_search()
+        elif path == '/api/metrics':
+            self.handle_get_metrics()
+        elif path == '/api/stats':
+            self.handle_get_stats()
+        elif path == '/api/changes':
+            self.handle_changes()
+        elif path == '/api/export':
+            self.handle_export()
+        elif path.startswith('/api/import/'):
+            import_id = path.split('/api/import/')[1]
+            self.handle_get_import(import_id)
         elif path == '/api/templates':
             self.handle_get_templates()
         elif path.startswith('/api/import-template/'):
@@ -407,183 +3870,1113 @@ class QuestLogHandler(http.server.SimpleHTTPRequestHandler):
             self.handle_import_template(template_id)
         else:
             # Serve static files
-            super().do_GET()
+            self.serve_static()
     
     def do_POST(self):
         """Handle POST requests."""
         if self.path == '/api/save':
             self.handle_save_log()
+        elif self.path == '/api/batch':
+            self.handle_batch()
+        elif urllib.parse.urlparse(self.path).path == '/api/import':
+            self.handle_import_archive()
+        elif self.path.startswith('/api/import-template/'):
+            template_id = self.path.split('/api/import-template/')[1]
+            self.handle_import_template_batch(template_id)
         else:
             self.send_error(HTTPStatus.NOT_FOUND)
     
+    def do_PATCH(self):
+        """Handle PATCH requests."""
+        if self.path.startswith('/api/patch/'):
+            log_id = self.route_log_id('/api/patch/')
+            if log_id is not None:
+                self.handle_patch_log(log_id)
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+    
+    def route_log_id(self, prefix):
+        """Return the log id that follows ``prefix`` in the request path, or send 404 if it is not a valid one.
+
+        Only ``LOG_ID`` names can reach the storage layer, so no id can point
+        outside the logs directory.
+        """
+        log_id = urllib.parse.urlparse(self.path).path[len(prefix):]
+        if not LOG_ID.fullmatch(log_id):
+            self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
+            return None
+        return log_id
+    
     def do_DELETE(self):
         """Handle DELETE requests."""
         if self.path.startswith('/api/delete/'):
-            log_id = self.path.split('/api/delete/')[1]
-            self.handle_delete_log(log_id)
+            log_id = self.route_log_id('/api/delete/')
+            if log_id is not None:
+                self.handle_delete_log(log_id)
         else:
             self.send_error(HTTPStatus.NOT_FOUND)
     
     def handle_get_logs(self):
-        """Handle GET /api/logs - Return a list of all quest logs."""
-        logs = []
+        """Handle GET /api/logs - Return one page of quest log summaries.
         
-        # Get all .quest files from the logs directory
-        for filename in os.listdir(LOGS_DIR):
-            if filename.endswith('.quest'):
-                file_path = os.path.join(LOGS_DIR, filename)
-                try:
-                    with open(file_path, 'r') as f:
-                        log = json.load(f)
-                        # Include only basic info for the list
-                        logs.append({
-                            'id': log.get('id'),
-                            'name': log.get('name'),
-                            'quests': log.get('quests', []),
-                            'created': log.get('created'),
-                            'updated': log.get('updated')
-                        })
-                except (json.JSONDecodeError, IOError) as e:
-                    print(f"Error reading {filename}: {e}")
+        Query parameters: ``sort`` (updated, created or name), ``order`` (asc or
+        desc), ``limit``, ``cursor`` (``nextCursor`` of the previous page) and
+        ``fields`` (comma-separated summary fields to include).
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        sort = query.get('sort', ['updated'])[0]
+        order = query.get('order', ['asc' if sort == 'name' else 'desc'])[0]
+        fields = [f for f in query.get('fields', [''])[0].split(',') if f]
+        try:
+            if sort not in LIST_SORT_KEYS or order not in ('asc', 'desc'):
+                raise ValueError("Unknown sort order")
+            limit = min(int(query.get('limit', [LIST_PAGE_SIZE])[0]), LIST_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            after = decode_cursor(query['cursor'][0]) if 'cursor' in query else None
+        except ValueError as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, f"Invalid listing parameters: {e}")
+            return
+        
+        etag, last_modified = STORAGE.logs_version()
+        etag = version_token(etag, sort, order, limit, after, fields)
+        if self.not_modified(etag, last_modified):
+            return
         
-        self.send_json_response({'logs': logs})
+        logs = STORAGE.list_logs(sort, order == 'desc', after, limit + 1)
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = encode_cursor(LIST_SORT_KEYS[sort](logs[-1]), logs[-1]['id'])
+        if fields:
+            logs = [{key: log.get(key) for key in ['id'] + fields} for log in logs]
+        self.send_json_response({'logs': logs, 'nextCursor': next_cursor},
+                                etag=etag, last_modified=last_modified)
     
     def handle_get_log(self, log_id):
         """Handle GET /api/log/:id - Return a specific quest log."""
-        file_path = os.path.join(LOGS_DIR, f"{log_id}.quest")
+        try:
+            version = STORAGE.log_version(log_id)
+            if version is None:
+                self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
+                return
+            if self.not_modified(*version):
+                return
+            body = STORAGE.get_log_json(log_id)
+        except (json.JSONDecodeError, PatchError, IOError, sqlite3.Error) as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error reading quest log: {e}")
+            return
         
-        if not os.path.exists(file_path):
+        if body is None:
             self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
             return
         
-        try:
-            with open(file_path, 'r') as f:
-                log = json.load(f)
-                self.send_json_response({'log': log})
-        except (json.JSONDecodeError, IOError) as e:
-            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error reading quest log: {e}")
+        self.send_json_body(b'{"log": ' + body + b'}', etag=version[0], last_modified=version[1])
     
     def handle_save_log(self):
         """Handle POST /api/save - Save a quest log."""
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length).decode('utf-8')
-        
         try:
-            data = json.loads(post_data)
+            data = self.read_json_body()
+        except RequestBodyError as e:
+            self.send_error(e.status, str(e))
+            return
+        try:
             log = data.get('log')
             
-            if not log or not log.get('id') or not log.get('name'):
-                self.send_error(HTTPStatus.BAD_REQUEST, "Invalid quest log data")
+            try:
+                validate_log(log)
+            except ValueError as e:
+                self.send_error(HTTPStatus.BAD_REQUEST, str(e))
                 return
             
-            # Save the log to a file
-            file_path = os.path.join(LOGS_DIR, f"{log['id']}.quest")
-            with open(file_path, 'w') as f:
-                json.dump(log, f, indent=2)
+            stamp_completions(log, log.get('updated') or datetime.now().isoformat())
+            with LOG_LOCKS.hold(log['id']):
+                stored = STORAGE.log_summary(log['id'])
+                log['revision'] = (stored['revision'] if stored else 0) + 1
+                STORAGE.put_log(log)
+                log_written('save', log, client=self.headers.get('X-Client-Id'))
             
-            self.send_json_response({'success': True})
-        except (json.JSONDecodeError, IOError) as e:
+            self.send_json_response({'success': True, 'revision': log['revision']})
+        except (IOError, sqlite3.Error) as e:
             self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error saving quest log: {e}")
     
+    def handle_patch_log(self, log_id):
+        """Handle PATCH /api/patch/:id - Apply small operations to a stored quest log."""
+        try:
+            data = self.read_json_body()
+        except RequestBodyError as e:
+            self.send_error(e.status, str(e))
+            return
+        try:
+            with LOG_LOCKS.hold(log_id):
+                log = STORAGE.get_log(log_id)
+                if log is None:
+                    self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
+                    return
+                if log.get('id') != log_id:
+                    # A file copied in under another name; patching it would write it back under its own id
+                    self.send_error(HTTPStatus.CONFLICT, "Stored quest log id does not match its URL")
+                    return
+                
+                revision = log.get('revision', 0)
+                if data.get('baseRevision') != revision:
+                    self.send_json_response({'success': False, 'revision': revision},
+                                            status=HTTPStatus.CONFLICT)
+                    return
+                
+                ops = data.get('ops')
+                updated = data.get('updated') or datetime.now().isoformat()
+                quest_ids = apply_log_ops(log, ops, updated)
+                log['revision'] = revision + 1
+                log['updated'] = updated
+                STORAGE.patch_log(log_id, log, ops)
+                log_written('patch', log, log_id, quest_ids, ops, self.headers.get('X-Client-Id'))
+            
+            self.send_json_response({'success': True, 'revision': log['revision']})
+        except PatchConflict as e:
+            self.send_json_response({'success': False, 'error': str(e), 'revision': revision},
+                                    status=HTTPStatus.CONFLICT)
+        except PatchError as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, f"Invalid patch: {e}")
+        except (IOError, sqlite3.Error) as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error patching quest log: {e}")
+    
     def handle_delete_log(self, log_id):
         """Handle DELETE /api/delete/:id - Delete a quest log."""
-        file_path = os.path.join(LOGS_DIR, f"{log_id}.quest")
-        
-        if not os.path.exists(file_path):
-            self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
-            return
-        
         try:
-            os.remove(file_path)
+            with LOG_LOCKS.hold(log_id):
+                if not STORAGE.delete_log(log_id):
+                    self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
+                    return
+                log_deleted(log_id, self.headers.get('X-Client-Id'))
             self.send_json_response({'success': True})
-        except IOError as e:
+        except (IOError, sqlite3.Error) as e:
             self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error deleting quest log: {e}")
     
-    def handle_get_templates(self):
-        """Handle GET /api/templates - Return a list of available templates."""
-        templates = []
+    def handle_search(self):
+        """Handle GET /api/search - Find logs, quests and objectives by text.
         
-        # First, check if we need to create sample templates
-        if not os.listdir(TEMPLATES_DIR):
-            self.create_sample_templates()
+        Query parameters: ``q`` (every word must match, as a prefix), ``limit``
+        and ``logId`` (only search one log).
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        text = query.get('q', [''])[0]
+        try:
+            limit = min(int(query.get('limit', [SEARCH_DEFAULT_LIMIT])[0]), SEARCH_MAX_LIMIT)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            SEARCH_INDEX.refresh(STORAGE)
+        except ValueError as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, f"Invalid search parameters: {e}")
+            return
+        except (IOError, sqlite3.Error) as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error refreshing search index: {e}")
+            return
         
-        # Get all template files
-        for filename in os.listdir(TEMPLATES_DIR):
-            if filename.endswith('.quest'):
-                file_path = os.path.join(TEMPLATES_DIR, filename)
-                try:
-                    with open(file_path, 'r') as f:
-                        template = json.load(f)
-                        templates.append({
-                            'id': template.get('id'),
-                            'name': template.get('name'),
-                            'description': template.get('description', '')
-                        })
-                except (json.JSONDecodeError, IOError) as e:
-                    print(f"Error reading template {filename}: {e}")
+        results, total = SEARCH_INDEX.search(text, limit, query.get('logId', [None])[0])
+        self.send_json_response({'query': text, 'results': results, 'total': total})
+    
+    def handle_changes(self):
+        """Handle GET /api/changes - Stream log change events as Server-Sent Events.
         
-        self.send_json_response({'templates': templates})
+        Resumes after the ``Last-Event-ID`` header (or ``lastEventId`` query
+        parameter). The connection is handed to ``CHANGE_FEED``, which writes
+        the events from its own thread, so this worker thread is released.
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        last_event_id = self.headers.get('Last-Event-ID') or query.get('lastEventId', [None])[0]
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        CHANGE_FEED.subscribe(SocketSubscriber(self.connection), last_event_id)
     
-    def handle_import_template(self, template_id):
-        """Handle GET /api/import-template/:id - Import a template as a new quest log."""
-        template_path = os.path.join(TEMPLATES_DIR, f"{template_id}.quest")
+    def handle_export(self):
+        """Handle GET /api/export - Stream quest logs as one archive.
         
-        if not os.path.exists(template_path):
-            self.send_error(HTTPStatus.NOT_FOUND, "Template not found")
+        Query parameters: ``format`` (``ndjson``, the default, or ``tar``),
+        ``compress`` (``gzip``, the default, or ``none``), ``ids``
+        (comma-separated; all logs by default) and ``updatedSince``. The
+        archive is sent as it is produced, and the connection closed after it.
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        archive_format = query.get('format', ['ndjson'])[0]
+        compress = query.get('compress', ['gzip'])[0]
+        if archive_format not in ('ndjson', 'tar') or compress not in ('gzip', 'none'):
+            self.send_error(HTTPStatus.BAD_REQUEST, "format must be ndjson or tar and compress gzip or none")
+            return
+        ids = query.get('ids', [None])[0]
+        ids = [log_id for log_id in ids.split(',') if log_id] if ids is not None else None
+        if ids is not None and not all(LOG_ID.fullmatch(log_id) for log_id in ids):
+            self.send_error(HTTPStatus.BAD_REQUEST, "Invalid log id in ids")
+            return
+        updated_since = query.get('updatedSince', [None])[0]
+        
+        filename = f"questlog-export.{archive_format}" + ('.gz' if compress == 'gzip' else '')
+        content_type = {'ndjson': 'application/x-ndjson', 'tar': 'application/x-tar'}[archive_format]
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/gzip' if compress == 'gzip' else content_type)
+        self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for chunk in iter_export(export_log_ids(ids, updated_since), archive_format, compress == 'gzip'):
+                if chunk:
+                    self.wfile.write(chunk)
+        except (json.JSONDecodeError, IOError, sqlite3.Error) as e:
+            # The status line is gone; closing early leaves the client with an incomplete download
+            print(f"Export stopped: {e}")
+    
+    def handle_import_archive(self):
+        """Handle POST /api/import - Import an NDJSON or tar archive of quest logs, optionally gzipped.
+        
+        Query parameters: ``importId`` (letters, digits, ``-`` and ``_``; chosen
+        by the client, so it can resume) and ``offset``. Progress is saved
+        under the id and served by ``GET /api/import/<id>``. After an
+        interruption, send the archive again with the same id, and the records
+        already processed are skipped; an uncompressed archive may instead be
+        sent on from the saved ``offset`` with ``?offset=<offset>``.
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        import_id = query.get('importId', [None])[0] or new_log_id()
+        offset = query.get('offset', ['0'])[0]
+        self.close_connection = True  # Refusals leave the archive unread, so the connection cannot be reused
+        if not IMPORT_ID.fullmatch(import_id) or not offset.isdigit():
+            self.send_error(HTTPStatus.BAD_REQUEST, "Invalid importId or offset")
+            return
+        offset = int(offset)
+        with ACTIVE_IMPORTS_LOCK:
+            if import_id in ACTIVE_IMPORTS:
+                self.send_error(HTTPStatus.CONFLICT, "This import is already running")
+                return
+            ACTIVE_IMPORTS.add(import_id)
+        try:
+            try:
+                progress = load_import_progress(import_id)
+            except (json.JSONDecodeError, IOError) as e:
+                self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error reading import progress: {e}")
+                return
+            progress = progress or {
+                'id': import_id, 'state': 'new', 'records': 0, 'imported': 0, 'failed': 0, 'lastError': None,
+                'offset': 0, 'received': 0, 'compressed': None, 'error': None, 'started': datetime.now().isoformat()}
+            if progress['state'] == 'done':
+                self.send_json_response({'success': True, 'import': progress})
+                return
+            if offset and offset != progress['offset']:
+                self.send_json_response({'success': False, 'import': progress}, status=HTTPStatus.CONFLICT)
+                return
+            body = iter_request_body(self.rfile, self.headers, MAX_ARCHIVE_BYTES)
+            run_import(progress, body, offset, self.headers.get('X-Client-Id'))
+            self.send_json_response({'success': True, 'import': progress})
+        except RequestBodyError as e:
+            self.send_error(e.status, str(e))
+        except ValueError:
+            self.send_json_response({'success': False, 'import': progress}, status=HTTPStatus.BAD_REQUEST)
+        except (IOError, sqlite3.Error) as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error importing archive: {e}")
+        finally:
+            with ACTIVE_IMPORTS_LOCK:
+                ACTIVE_IMPORTS.discard(import_id)
+    
+    def handle_get_import(self, import_id):
+        """Handle GET /api/import/:id - Return the progress of an archive import."""
+        try:
+            progress = load_import_progress(import_id) if IMPORT_ID.fullmatch(import_id) else None
+        except (json.JSONDecodeError, IOError) as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error reading import progress: {e}")
+            return
+        if progress is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "Import not found")
+            return
+        self.send_json_response({'import': progress})
+    
+    def handle_get_stats(self):
+        """Handle GET /api/stats - Completion totals across all logs.
+        
+        With ``logId`` the totals cover that log only and come with a
+        per-quest breakdown under ``quests``.
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        log_id = query.get('logId', [None])[0]
+        if log_id and not LOG_ID.fullmatch(log_id):
+            self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
+            return
+        today = datetime.now(timezone.utc).date()  # completedByDay is bucketed by UTC day
+        try:
+            version = STORAGE.log_version(log_id) if log_id else STORAGE.logs_version()
+            if version is None:
+                self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
+                return
+            # The day windows move at midnight even when no log changes
+            etag = version_token(version[0], today.isoformat())
+            if self.not_modified(etag, version[1]):
+                return
+            if not log_id:
+                stats = progress_report(STORAGE.progress_totals(), today)
+            else:
+                log = STORAGE.get_log(log_id)
+                if log is None:
+                    self.send_error(HTTPStatus.NOT_FOUND, "Quest log not found")
+                    return
+                stats = progress_report(total_progress([summarize_log(log)]), today)
+                stats['logId'] = log_id
+                stats['quests'] = [quest_progress(quest) for quest in json_objects(log.get('quests'))]
+        except (json.JSONDecodeError, PatchError, IOError, sqlite3.Error) as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error computing stats: {e}")
+            return
+        
+        self.send_json_response(stats, etag=etag, last_modified=version[1])
+    
+    def handle_get_metrics(self):
+        """Handle GET /api/metrics - Return the server metrics in the Prometheus text format."""
+        body = METRICS.render(STORAGE.cache_stats()).encode('utf-8')
+        encodings = accepted_encodings(self.headers.get('Accept-Encoding'))
+        encoding = encodings[0] if encodings and len(body) >= COMPRESSION_MIN_SIZE else None
+        if encoding:
+            body = compress_body(body, encoding, COMPRESSION_LEVEL)
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def handle_get_templates(self):
+        """Handle GET /api/templates - Return a list of available templates."""
+        try:
+            etag, last_modified = STORAGE.templates_version()
+            if self.not_modified(etag, last_modified):
+                return
+            templates = STORAGE.list_templates()
+            
+            # First, check if we need to create sample templates
+            if not templates:
+                self.create_sample_templates()
+                etag, last_modified = STORAGE.templates_version()
+                templates = STORAGE.list_templates()
+        except (IOError, sqlite3.Error) as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error reading templates: {e}")
             return
         
+        self.send_json_response({'templates': templates}, etag=etag, last_modified=last_modified)
+    
+    def handle_import_template(self, template_id):
+        """Handle GET /api/import-template/:id - Import a template as a new quest log."""
         try:
-            with open(template_path, 'r') as f:
-                template = json.load(f)
+            template = STORAGE.get_template(template_id)
+            if template is None:
+                self.send_error(HTTPStatus.NOT_FOUND, "Template not found")
+                return
             
             # Create a new quest log from the template
             new_log = template.copy()
-            new_log['id'] = f"{int(datetime.now().timestamp())}"
+            new_log['id'] = new_log_id()
+            new_log['revision'] = 1
             new_log['created'] = datetime.now().isoformat()
-            new_log['updated'] = datetime.now().isoformat()
+            new_log['updated'] = new_log['created']
             
             # Save the new log
-            log_path = os.path.join(LOGS_DIR, f"{new_log['id']}.quest")
-            with open(log_path, 'w') as f:
-                json.dump(new_log, f, indent=2)
+            with LOG_LOCKS.hold(new_log['id']):
+                STORAGE.put_log(new_log)
+                log_written('import', new_log, client=self.headers.get('X-Client-Id'))
             
             self.send_json_response({'success': True, 'log': new_log})
-        except (json.JSONDecodeError, IOError) as e:
+        except (json.JSONDecodeError, IOError, sqlite3.Error) as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error importing template: {e}")
+    
+    def handle_import_template_batch(self, template_id):
+        """Handle POST /api/import-template/:id - Import a template as several new quest logs.
+        
+        The body is ``{"count": n}`` and/or ``{"names": [...]}`` (one name per
+        copy; copies without one keep the template's name). All copies are
+        written in one batch and their ids are returned in order.
+        """
+        try:
+            data = self.read_json_body(MAX_IMPORT_BODY_BYTES)
+        except RequestBodyError as e:
+            self.send_error(e.status, str(e))
+            return
+        try:
+            names = data.get('names')
+            count = data.get('count', len(names) if isinstance(names, list) else 1)
+            if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= TEMPLATE_BATCH_MAX:
+                raise ValueError(f"count must be between 1 and {TEMPLATE_BATCH_MAX}")
+            if names is not None and (not isinstance(names, list) or len(names) > count
+                                      or not all(isinstance(n, str) and n.strip() for n in names)):
+                raise ValueError("names must be a list of at most count non-empty strings")
+        except (ValueError, AttributeError) as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, f"Invalid import request: {e}")
+            return
+        
+        try:
+            template = STORAGE.get_template(template_id)
+            if template is None:
+                self.send_error(HTTPStatus.NOT_FOUND, "Template not found")
+                return
+            
+            now = datetime.now().isoformat()
+            names = names or []
+            new_logs = []
+            for index in range(count):
+                new_log = copy_json(template)
+                new_log['id'] = new_log_id()
+                new_log['name'] = names[index] if index < len(names) else template.get('name')
+                new_log['revision'] = 1
+                new_log['created'] = now
+                new_log['updated'] = now
+                new_logs.append(new_log)
+            
+            # Fresh random ids cannot be held by anyone else, so no per-log locks are needed
+            STORAGE.put_logs(new_logs)
+            for new_log in new_logs:
+                log_written('import', new_log, client=self.headers.get('X-Client-Id'))
+            
+            self.send_json_response({'success': True, 'ids': [log['id'] for log in new_logs]})
+        except (IOError, sqlite3.Error) as e:
             self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error importing template: {e}")
     
+    def handle_batch(self):
+        """Handle POST /api/batch - Run several get, save and delete operations in one request.
+        
+        The body is ``{"operations": [...]}`` with ``{"op": "get", "id"}``,
+        ``{"op": "save", "log"}`` and ``{"op": "delete", "id"}`` items. The
+        response lists one result per operation, in order, each with its own
+        HTTP ``status`` and the fields the single-log endpoint would return.
+        Operations on one log succeed or fail together (see ``run_batch_group``).
+        """
+        try:
+            data = self.read_json_body()
+        except RequestBodyError as e:
+            self.send_error(e.status, str(e))
+            return
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not 1 <= len(operations) <= BATCH_MAX_OPERATIONS:
+            self.send_error(HTTPStatus.BAD_REQUEST,
+                            f"operations must be a list of 1 to {BATCH_MAX_OPERATIONS} operations")
+            return
+        
+        results = run_batch(operations, self.headers.get('X-Client-Id'))
+        self.send_json_body(b'{"results": [' + b', '.join(results) + b']}')
+    
     def create_sample_templates(self):
         """Create sample templates if none exist."""
-        for template in SAMPLE_TEMPLATES:
-            file_path = os.path.join(TEMPLATES_DIR, f"{template['id']}.quest")
-            with open(file_path, 'w') as f:
-                json.dump(template, f, indent=2)
+        ensure_sample_templates()
+    
+    def read_json_body(self, limit=None):
+        """Receive and parse a JSON object request body of at most ``limit`` bytes.
+        
+        The body is decoded as it arrives, so oversized, badly framed, non-UTF-8
+        or non-object bodies are refused (``RequestBodyError``) at the first bad
+        chunk instead of after the whole upload. The connection is closed after
+        a refusal since the rest of the body is left unread.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        parts = []
+        try:
+            for chunk in iter_request_body(self.rfile, self.headers, limit or MAX_BODY_BYTES):
+                text = decoder.decode(chunk)
+                if not parts and text.lstrip() and not text.lstrip().startswith('{'):
+                    raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+                if text.strip() or parts:
+                    parts.append(text)
+            parts.append(decoder.decode(b'', final=True))
+            with METRICS.timed('json', 'parse'):
+                data = json.loads(''.join(parts))
+        except UnicodeDecodeError:
+            self.close_connection = True
+            raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Request body is not valid UTF-8") from None
+        except json.JSONDecodeError as e:
+            raise RequestBodyError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {e}") from None
+        except RequestBodyError:
+            self.close_connection = True
+            raise
+        if not isinstance(data, dict):
+            raise RequestBodyError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+        return data
     
-    def send_json_response(self, data):
-        """Send a JSON response."""
+    def serve_static(self):
+        """Serve a static file, from the pre-compressed cache when the client accepts it."""
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?')[0].endswith('/'):
+            path = os.path.join(path, 'index.html')
+        content_type = self.guess_type(path)
+        encodings = accepted_encodings(self.headers.get('Accept-Encoding'))
+        if not encodings or not content_type.startswith(COMPRESSIBLE_TYPES) or not os.path.isfile(path):
+            super().do_GET()
+            return
+        
+        encoding = encodings[0]
+        try:
+            (mtime_ns, size), body = STATIC_CACHE.get(path, encoding)
+        except OSError:
+            super().do_GET()
+            return
+        etag = f"{mtime_ns:x}-{size:x}"
+        if self.not_modified(etag, mtime_ns / 1e9):
+            return
         self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_validators(etag, mtime_ns / 1e9, encoding)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def not_modified(self, etag, last_modified=None):
+        """Send 304 Not Modified and return True if the request's validators still match.
+        
+        ``etag`` is the bare version token; compressed representations carry the
+        coding as a suffix on it. If-None-Match takes precedence over
+        If-Modified-Since, as in RFC 9110.
+        """
+        matched_tag = f"{etag}"
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+            variants = [etag] + [f"{etag}-{coding}" for coding in ('gzip', 'br')]
+            matched = '*' in tags
+            for variant in variants:
+                if f'"{variant}"' in tags:
+                    matched, matched_tag = True, variant
+                    break
+        elif self.headers.get('If-Modified-Since') and last_modified:
+            try:
+                since = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since'])
+                matched = int(last_modified) <= since.timestamp()
+            except (TypeError, ValueError):
+                matched = False
+        else:
+            matched = False
+        
+        if matched:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_validators(matched_tag, last_modified)
+            self.end_headers()
+        return matched
+    
+    def send_validators(self, etag, last_modified=None, encoding=None):
+        """Send the ETag, Last-Modified, Cache-Control and Vary headers for a cacheable response."""
+        self.send_header('ETag', f'"{etag}-{encoding}"' if encoding else f'"{etag}"')
+        if last_modified:
+            self.send_header('Last-Modified', self.date_time_string(int(last_modified)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+    
+    def send_json_response(self, data, status=HTTPStatus.OK, etag=None, last_modified=None):
+        """Send a JSON response.
+        
+        Successful GET responses always carry a strong ETag: the given version
+        token, or else a hash of the body. Bodies of at least
+        ``COMPRESSION_MIN_SIZE`` bytes are compressed when the client accepts it.
+        """
+        with METRICS.timed('json', 'serialize'):
+            body = json.dumps(data).encode('utf-8')
+        self.send_json_body(body, status, etag, last_modified)
+
+    def send_json_body(self, body, status=HTTPStatus.OK, etag=None, last_modified=None):
+        """Send an already encoded JSON body, as ``send_json_response`` does."""
+        encodings = accepted_encodings(self.headers.get('Accept-Encoding'))
+        encoding = encodings[0] if encodings and len(body) >= COMPRESSION_MIN_SIZE else None
+        if etag is None and self.command == 'GET' and status == HTTPStatus.OK:
+            etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+            if self.not_modified(etag):
+                return
+        if encoding:
+            body = compress_body(body, encoding, COMPRESSION_LEVEL)
+        self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_validators(etag, last_modified, encoding)
+        else:
+            self.send_header('Vary', 'Accept-Encoding')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        self.wfile.write(body)
+
+
+class StreamingServerMixin:
+    """Leaves connections taken over by the change feed open after their handler returns."""
+
+    def shutdown_request(self, request):
+        if not CHANGE_FEED.owns(request):
+            super().shutdown_request(request)
+
+
+class ThreadPoolHTTPServer(StreamingServerMixin, socketserver.TCPServer):
+    """TCP server that hands each connection to a bounded pool of worker threads."""
+
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, max_workers=None):
+        self.max_workers = max_workers
+        self.executor = None
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        """Queue the connection for a worker thread instead of handling it inline."""
+        if self.executor is None:
+            # Created lazily so that prefork children get their own pool after fork()
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                               thread_name_prefix="questlog-worker")
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        """Handle one connection on a worker thread."""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+class SingleHTTPServer(StreamingServerMixin, socketserver.TCPServer):
+    """TCP server that handles one request at a time."""
+
+    allow_reuse_address = True
 
 
-def run_server():
-    """Run the HTTP server."""
-    with socketserver.TCPServer(("", PORT), QuestLogHandler) as httpd:
-        print(f"Serving at http://localhost:{PORT}")
+class BufferedRequestHandler(QuestLogHandler):
+    """QuestLogHandler that reads one complete request from bytes and buffers the response.
+
+    The async server does the connection framing itself and runs this in a
+    worker thread, so every route, header and metric behaves exactly as in the
+    threaded server while the event loop never blocks on file I/O.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, raw_request, client_address, server):
+        self.request = None
+        self.client_address = client_address
+        self.server = server
+        self.directory = PUBLIC_DIR
+        self.rfile = io.BytesIO(raw_request)
+        self.buffer = io.BytesIO()
+        self.wfile = CountingWriter(self.buffer)
+        self.close_connection = True
+        self.handle_one_request()
+
+    def response(self):
+        """Return ``(response bytes, whether the connection must close)``."""
+        return self.buffer.getvalue(), self.close_connection
+
+
+class LoopReader(io.RawIOBase):
+    """Blocking reads, for a worker thread, from an asyncio stream reader.
+
+    ``head`` holds bytes already taken from the stream; they are read first.
+    """
+
+    def __init__(self, reader, loop, head=b''):
+        self.reader = reader
+        self.loop = loop
+        self.pending = memoryview(head)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self.pending:
+            read = asyncio.wait_for(self.reader.read(len(b)), ASYNC_KEEPALIVE_TIMEOUT)
+            self.pending = memoryview(asyncio.run_coroutine_threadsafe(read, self.loop).result())
+        size = min(len(b), len(self.pending))
+        b[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+class LoopWriter:
+    """Blocking writes, for a worker thread, to an asyncio stream writer; each waits for the drain."""
+
+    def __init__(self, writer, loop):
+        self.writer = writer
+        self.loop = loop
+
+    async def _write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def write(self, data):
+        asyncio.run_coroutine_threadsafe(self._write(bytes(data)), self.loop).result()
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class StreamingRequestHandler(QuestLogHandler):
+    """QuestLogHandler for the async server's ``STREAMING_ROUTES``.
+
+    Archive exports and imports can be far larger than memory, so instead of
+    buffering, the request body is read from and the response written to the
+    connection while the handler runs, through ``LoopReader`` and
+    ``LoopWriter``. The connection is closed afterwards.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, head, reader, writer, loop, client_address, server):
+        self.request = None
+        self.client_address = client_address
+        self.server = server
+        self.directory = PUBLIC_DIR
+        self.rfile = io.BufferedReader(LoopReader(reader, loop, head), BODY_CHUNK_SIZE)
+        self.wfile = CountingWriter(LoopWriter(writer, loop))
+        self.close_connection = True
+        self.handle_one_request()
+
+
+STREAMING_ROUTES = {('GET', '/api/export'), ('POST', '/api/import')}  # Served by StreamingRequestHandler in async mode
+
+
+def request_body_length(head):
+    """Return the Content-Length declared in a raw request head (0 if none, None if chunked).
+
+    Raises ``ValueError`` with the status to answer for bodies the async server
+    will not frame: unknown transfer codings (501), malformed lengths (400) and
+    bodies over MAX_BODY_BYTES (413), which are refused before being read.
+    """
+    length = 0
+    chunked = False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'transfer-encoding':
+            if value.strip().lower() != b'chunked':
+                raise ValueError(HTTPStatus.NOT_IMPLEMENTED)
+            chunked = True
+        if name == b'content-length':
+            if not value.strip().isdigit():
+                raise ValueError(HTTPStatus.BAD_REQUEST)
+            length = int(value)
+    if chunked:
+        return None
+    if length > MAX_BODY_BYTES:
+        raise ValueError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    return length
+
+
+async def read_chunked_body(reader):
+    """Read a chunked request body, keeping its framing, and return the raw bytes.
+
+    The handler de-chunks it again with ``iter_request_body``; reading it here
+    only finds where the request ends. Raises ``ValueError`` (400/413) like
+    ``request_body_length``.
+    """
+    parts = []
+    total = 0
+    while True:
+        line = await reader.readuntil(b'\r\n')
+        size = parse_chunk_size(line)
+        if size is None:
+            raise ValueError(HTTPStatus.BAD_REQUEST)
+        total += size
+        if total > MAX_BODY_BYTES:
+            raise ValueError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        parts.append(line)
+        if size == 0:
+            break
+        parts.append(await reader.readexactly(size + 2))
+    while True:
+        line = await reader.readuntil(b'\r\n')
+        parts.append(line)
+        if line == b'\r\n':
+            return b''.join(parts)
+
+
+def request_target(head):
+    """Return ``(method, path, headers)`` from a raw request head; header names are lowercased."""
+    lines = head.decode('latin-1').split('\r\n')
+    method, _, rest = lines[0].partition(' ')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    return method, rest.rpartition(' ')[0], headers
+
+
+def simple_response(status):
+    """Return a bodyless response that closes the connection."""
+    status = HTTPStatus(status)
+    return (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Length: 0\r\nConnection: close\r\n\r\n").encode('ascii')
+
+
+def raise_open_file_limit():
+    """Raise the soft descriptor limit to the hard limit so many idle connections fit."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        with contextlib.suppress(ValueError, OSError):
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class AsyncHTTPServer:
+    """HTTP/1.1 server with persistent, pipelined connections on one asyncio event loop.
+
+    The loop only parses request framing and writes responses; each complete
+    request is handled by a ``BufferedRequestHandler`` on a pool of worker
+    threads, so slow disks never stall other connections. Requests pipelined on
+    one connection are answered in order, one at a time, and idle connections
+    cost a socket and a coroutine.
+    """
+
+    def __init__(self, server_address, max_workers=None):
+        self.server_address = server_address
+        self.max_workers = max_workers
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server_close()
+
+    def server_close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def serve_forever(self):
+        """Listen on ``server_address`` and serve until interrupted."""
+        raise_open_file_limit()
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="questlog-worker")
+        host, port = self.server_address
+        listener = await asyncio.start_server(self.handle_connection, host or None, port,
+                                              backlog=ASYNC_BACKLOG, limit=ASYNC_MAX_HEADER_BYTES,
+                                              reuse_address=True)
+        async with listener:
+            await listener.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        """Serve the requests of one connection until either side closes it or it idles out."""
+        loop = asyncio.get_running_loop()
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), ASYNC_KEEPALIVE_TIMEOUT)
+                    method, target, headers = request_target(head)
+                    streaming = (method, target.split('?', 1)[0]) in STREAMING_ROUTES
+                    if not streaming:
+                        length = request_body_length(head)
+                        if length is None:
+                            body = await asyncio.wait_for(read_chunked_body(reader), ASYNC_KEEPALIVE_TIMEOUT)
+                        elif length:
+                            body = await asyncio.wait_for(reader.readexactly(length), ASYNC_KEEPALIVE_TIMEOUT)
+                        else:
+                            body = b''
+                except asyncio.LimitOverrunError:
+                    writer.write(simple_response(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE))
+                    break
+                except ValueError as e:
+                    # Our own refusals carry their status; any other ValueError means a malformed request
+                    status = e.args[0] if e.args and isinstance(e.args[0], HTTPStatus) else HTTPStatus.BAD_REQUEST
+                    writer.write(simple_response(status))
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                if streaming:
+                    try:
+                        await loop.run_in_executor(self.executor, self.respond_streaming,
+                                                   head, reader, writer, loop, peer)
+                    except Exception as e:
+                        print(f"Error handling request from {peer}: {e}")
+                    break
+                if method == 'GET' and target.split('?', 1)[0] == '/api/changes':
+                    await self.stream_changes(target, headers, reader, writer)
+                    break
+                try:
+                    response, close = await loop.run_in_executor(self.executor, self.respond, head + body, peer)
+                except Exception as e:
+                    print(f"Error handling request from {peer}: {e}")
+                    response, close = simple_response(HTTPStatus.INTERNAL_SERVER_ERROR), True
+                writer.write(response)
+                await writer.drain()
+                if close:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def stream_changes(self, target, headers, reader, writer):
+        """Stream change events on this connection until the client goes away."""
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(target).query)
+        last_event_id = headers.get('last-event-id') or query.get('lastEventId', [None])[0]
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-store\r\n"
+                     b"X-Accel-Buffering: no\r\nConnection: close\r\n\r\n")
+        subscriber = StreamSubscriber(asyncio.get_running_loop(), writer)
+        CHANGE_FEED.subscribe(subscriber, last_event_id)
+        try:
+            while await reader.read(4096):
+                pass  # Nothing more is expected from the client; wait for it to disconnect
+        except ConnectionError:
+            pass
+        finally:
+            CHANGE_FEED.unsubscribe(subscriber)
+
+    def respond(self, raw_request, peer):
+        """Handle one request in a worker thread."""
+        return BufferedRequestHandler(raw_request, peer, self).response()
+
+    def respond_streaming(self, head, reader, writer, loop, peer):
+        """Handle one request on a ``STREAMING_ROUTES`` route in a worker thread; the connection closes after it."""
+        StreamingRequestHandler(head, reader, writer, loop, peer, self)
+
+
+def default_workers(mode):
+    """Pick a worker count for ``mode`` from the number of CPUs."""
+    cpus = os.cpu_count() or 1
+    if mode == "prefork":
+        return cpus
+    return min(32, cpus + 4)
+
+
+def run_server(mode=None, workers=None, storage=None):
+    """Run the HTTP server in the given concurrency mode and storage engine."""
+    mode = mode or SERVER_MODE
+    workers = workers or SERVER_WORKERS or default_workers(mode)
+    storage = storage or STORAGE_ENGINE
+    if WRITE_BEHIND_DELAY > 0 and (mode == "prefork" or storage == "sqlite"):
+        raise SystemExit("--write-behind needs one server process and the file or journal storage engine.")
+    configure_storage(storage)
+    ensure_sample_templates()
+    SEARCH_INDEX.build(STORAGE)
+    STATIC_CACHE.warm(PUBLIC_DIR)
+
+    if mode == "single":
+        workers = 1
+        httpd = SingleHTTPServer(("", PORT), QuestLogHandler)
+    elif mode == "threaded":
+        httpd = ThreadPoolHTTPServer(("", PORT), QuestLogHandler, max_workers=workers)
+    elif mode == "prefork":
+        if not hasattr(os, "fork"):
+            raise SystemExit("Prefork mode requires os.fork(); use --mode threaded instead.")
+        httpd = ThreadPoolHTTPServer(("", PORT), QuestLogHandler, max_workers=PREFORK_THREADS)
+    elif mode == "async":
+        httpd = AsyncHTTPServer(("", PORT), max_workers=workers)
+    else:
+        raise ValueError(f"Unknown server mode: {mode}")
+
+    # Turn SIGTERM into SystemExit so the storage is closed (and flushed) on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with httpd:
+        print(f"Serving at http://localhost:{PORT} ({mode}, {workers} workers)")
         print(f"Data directory: {os.path.abspath(DATA_DIR)}")
         try:
-            httpd.serve_forever()
+            if mode == "prefork":
+                serve_prefork(httpd, workers)
+            else:
+                httpd.serve_forever()
         except KeyboardInterrupt:
             print("\nServer stopped.")
+        finally:
+            STORAGE.close()
+
+
+def serve_prefork(httpd, workers):
+    """Fork ``workers`` processes that all accept on the already-bound listening socket."""
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            try:
+                httpd.serve_forever()
+            finally:
+                STORAGE.close()
+                os._exit(0)
+        children.append(pid)
+
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    finally:
+        for pid in children:
+            with contextlib.suppress(OSError):
+                os.kill(pid, signal.SIGTERM)
+        for pid in children:
+            with contextlib.suppress(OSError):
+                os.waitpid(pid, 0)
+
+
+def parse_args(argv=None):
+    """Parse the command line options for running the server."""
+    parser = argparse.ArgumentParser(description="Quest Log server")
+    parser.add_argument("command", nargs="?", default="serve",
+                        choices=["serve", "migrate-sqlite", "migrate-layout", "convert-format"],
+                        help="serve the app (default), bulk-load data/logs into the SQLite database, "
+                             "move data/logs into the --layout directory layout, "
+                             "or rewrite log and template files in the --file-format")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    parser.add_argument("--mode", choices=["single", "threaded", "prefork", "async"], default=SERVER_MODE,
+                        help="concurrency mode (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="worker threads (threaded, async) or processes (prefork)")
+    parser.add_argument("--storage", choices=["file", "journal", "sqlite"], default=STORAGE_ENGINE,
+                        help="storage engine for quest logs (default: %(default)s)")
+    parser.add_argument("--write-behind", type=float, default=WRITE_BEHIND_DELAY, metavar="SECONDS",
+                        help="acknowledge log writes at once and flush them in batches at most this late "
+                             "(file and journal storage, not prefork; default: off)")
+    parser.add_argument("--layout", choices=["flat", "sharded"], default=LOG_LAYOUT,
+                        help="directory layout of the log files (default: %(default)s)")
+    parser.add_argument("--file-format", choices=["json", "pretty", "binary"], default=FILE_FORMAT,
+                        help="encoding of new log and template files; all are read either way "
+                             "(default: %(default)s)")
+    parser.add_argument("--data-dir", default=DATA_DIR,
+                        help="directory holding logs, templates and the database (default: %(default)s)")
+    parser.add_argument("--db", help="SQLite database path (default: questlog.db in the data directory)")
+    parser.add_argument("--max-body-size", type=int, default=MAX_BODY_BYTES,
+                        help="largest request body accepted, in bytes (default: %(default)s)")
+    parser.add_argument("--log-cache-size", type=int, default=LOG_CACHE_BYTES,
+                        help="memory budget of the log cache, in bytes; 0 disables it (default: %(default)s)")
+    parser.add_argument("--compression-level", type=int, choices=range(1, 10), metavar="1-9",
+                        default=COMPRESSION_LEVEL,
+                        help="gzip level / brotli quality for JSON responses (default: %(default)s)")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    # Create sample templates if they don't exist
-    if not os.listdir(TEMPLATES_DIR):
-        print("Creating sample templates...")
-        for template in SAMPLE_TEMPLATES:
-            file_path = os.path.join(TEMPLATES_DIR, f"{template['id']}.quest")
-            with open(file_path, 'w') as f:
-                json.dump(template, f, indent=2)
+    args = parse_args()
+    LOG_LAYOUT = args.layout
+    FILE_FORMAT = args.file_format
+    WRITE_BEHIND_DELAY = args.write_behind
+    configure_data_dir(args.data_dir)
+    PORT = args.port
+    SQLITE_PATH = args.db or SQLITE_PATH
+    COMPRESSION_LEVEL = args.compression_level
+    MAX_BODY_BYTES = args.max_body_size
+    LOG_CACHE_BYTES = args.log_cache_size
     
-    run_server()
+    if args.command == "migrate-sqlite":
+        migrate_to_sqlite()
+    elif args.command == "migrate-layout":
+        migrate_log_layout(args.layout)
+    elif args.command == "convert-format":
+        convert_file_format(args.file_format)
+    else:
+        run_server(args.mode, args.workers, args.storage)